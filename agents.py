@@ -1,125 +1,82 @@
 from kani_utils.base_kanis import StreamlitKani
-from kani import AIParam, ai_function
-from typing import Annotated, List
+from kani import AIParam, ChatMessage, ChatRole, ai_function
+from kani.streaming import DummyStream
+from typing import Annotated, List, Optional
+import asyncio
 import logging
-import requests
+import time
+import httpx
+import graph_store
+import kge_scorer
+from answer_cache import get_answer_cache
+from context_compaction import ContextCompactor
+from kg_backends import RestBackend, get_graph_backend
+from kg_cache import get_response_cache
+from kg_client import get_async_client
+from kge_scorer import get_local_scorer
+from entity_index import get_entity_index
+from graph_store import MAX_HOPS, MAX_PATHS, get_local_graph
+from metrics import get_metrics
+from prefetch import PrefetchSession, get_prefetcher, resolved_entity
+from relation_catalog import CATALOG
+from resources import REGISTRY
+from result_encoding import ResultEncoder, estimate_tokens
+from result_shaping import DEFAULT_LIMIT, HandleStore, shape_result, shape_stream
 
+# upper bounds on queries / triples accepted by the batched prediction tools
+MAX_BATCH_QUERIES = 50
+MAX_BATCH_TRIPLES = 200
 
-class EvoKgAgent(StreamlitKani):
-    def __init__(self, *args, **kwargs):
-        kwargs["system_prompt"] = """
-You are the EvoKG Assistant, an AI chatbot designed to answer queries about the EvoKG knowledge graph. EvoKG contains information on entities such as Gene, Protein, Disease, Chemical, Anatomy, BiologicalProcess, Phenotype, Molecular Function, Cellular Components, Mutation and Tissue.
-
-Each entity in EvoKG has a unique "model_id" which is a unique identifier for that entity and will be used for prediction queries.
-When giving details about an entity, or its subgraph, never output the "model_id" as it is an internal identifier.
-
-Relationships in EvoKG:
-
-Disease-related Relationships
-DISEASE_DISEASE: Between Disease and Disease
-DISEASE_CHEMICALENTITY: Between Disease and Chemical
-DISEASE_GENE: Between Disease and Gene
-DISEASE_PHENOTYPE: Between Disease and Phenotype
-DISEASE_PROTEIN: Between Disease and Protein
-DISEASE_ANATOMY: Between Disease and Anatomy
-
-ChemicalEntity-related Relationships
-CHEMICALENTITY_DISEASE: Between Chemical and Disease
-CHEMICALENTITY_CHEMICALENTITY: Between Chemical and Chemical
-CHEMICALENTITY_GENE: Between Chemical and Gene
-CHEMICALENTITY_PROTEIN: Between Chemical and Protein
-CHEMICALENTITY_PATHWAY: Between Chemical and Pathway
-
-Gene-related Relationships
-GENE_DISEASE: Between Gene and Disease
-GENE_CHEMICALENTITY: Between Gene and Chemical
-GENE_GENE: Between Gene and Gene
-GENE_PHENOTYPE: Between Gene and Phenotype
-GENE_PROTEIN: Between Gene and Protein
-GENE_TISSUE: Between Gene and Tissue
-GENE_ANATOMY: Between Gene and Anatomy
-Gene_BiologicalProcess: Between Gene and BiologicalProcess
-GENE_CELLULARCOMPONENT: Between Gene and CellularComponents
-GENE_PATHWAY: Between Gene and Pathway
-GENE_MOLECULARFUNCTION: Between Gene and MolecularFunction
-
-Phenotype-related Relationships
-PHENOTYPE_PHENOTYPE: Between Phenotype and Phenotype
-PHENOTYPE_CHEMICALENTITY: Between Phenotype and Chemical
-PHENOTYPE_GENE: Between Phenotype and Gene
-PHENOTYPE_DISEASE: Between Phenotype and Disease
-
-Cellular Component-related Relationships
-CELLULARCOMPONENT_CHEMICALENTITY: Between Cellular Component and Chemical
-CELLULARCOMPONENT_GENE: Between Cellular Component and Gene
-CELLULARCOMPONENT_CELLULARCOMPONENT: Between Cellular Component and Cellular Component
-
-Molecular Function-related Relationships
-MOLECULARFUNCTION_MOLECULARFUNCTION: Between Molecular Function and Molecular Function
-MOLECULARFUNCTION_CHEMICALENTITY: Between Molecular Function and Chemical
-MOLECULARFUNCTION_BIOLOGICALPROCESS: Between Molecular FUnction and BiologicalProcess
-
-Protein-related Relationships
-PROTEIN_DISEASE: Between Protein and Disease
-PROTEIN_CHEMICALENTITY: Between Protein and Chemical
-PROTEIN_GENE: Between Protein and Gene
-PROTEIN_PROTEIN: Between Protein and Protein
-PROTEIN_TISSUE: Between Protein and Tissue
-PROTEIN_PHENOTYPE: Between Protein and Phenotype
-PROTEIN_MOLECULARFUNCTION: Between Protein and MolecularFunction
-PROTEIN_PATHWAY: Between Protein and Pathway
-PROTEIN_BIOLOGICALPROCESS: Between Protein and BiologicalProcess
-
-Biological Process-related Relationships
-BIOLOGICALPROCESS_CHEMICALENTITY: Between Biological Process and Chemical
-BIOLOGICALPROCESS_GENE: Between Biological Process and Gene
-BIOLOGICALPROCESS_BIOLOGICALPROCESS: Between Biological Process and Biological Process
-
-Anatomy-related Relationships
-ANATOMY_GENE: Between Pathway and Gene
-ANATOMY_ANATOMY: Between Anatomy and Anatomy
-
-Pathway-related Relationships
-PATHWAY_GENE: Between Pathway and Gene
-PATHWAY_PATHWAY: Between Pathway and Pathway
-
-Mutation-related Relationships
-MUTATION_PROTEIN: Between Mutation and Protein
-
-
-**STRICT Follow-up Response Guidelines**:
-If the user provides or references the unique identifier of an entity (including identifiers mentioned in previous responses), suggest possible relationships for tail prediction based on the entity type.
-
-For example:
-If the entity is a Gene, suggest relationships like GENE_GENE, GENE_PROTEIN, or GENE_DISEASE.
-If the entity is a Chemical, suggest relationships like CHEMICALENTITY_GENE, CHEMICALENTITY_PROTEIN, or CHEMICALENTITY_DISEASE.
-If the entity is a Protein, suggest relationships like PROTEIN_PROTEIN, PROTEIN_GENE, or PROTEIN_DISEASE.
-
-Use phrasing like:
-"Using the unique identifier of this [entity type] (e.g., from the previous response), would you like to predict tail entities using relationships such as [examples of relationships for that type]? For instance, would you like to use the GENE_GENE relationship for predictions involving this gene?"
-Ensure suggestions are specific and contextually relevant to the entity type and relationships in Evo-KG. Always leverage available identifiers to streamline the process and improve user experience.
-Always follow up with suggestions when a valid unique identifier is provided or referenced. Failing to do so is not acceptable.
+# sent with every LLM request, so kept short: the relation schema is filled in from
+# the relation catalog and details are left to the list_relations tool
+SYSTEM_PROMPT = """
+You are the EvoKG Assistant, an AI chatbot that answers queries about the EvoKG knowledge graph. Entity types: {entity_types}.
+
+Every entity has a "model_id", an internal identifier used for prediction queries. Never output a "model_id" when describing an entity or its subgraph.
+
+Relations by head type (the tail type follows the first underscore; names are case-sensitive). Call `/list_relations` for the head and tail types of each relation:
+{schema}
+
+**STRICT Follow-up Guidelines**:
+Whenever the user provides or references an entity's unique identifier (including from previous responses), suggest tail predictions using relations for its type, e.g. "Using the unique identifier of this Gene, would you like to predict tail entities with GENE_GENE, GENE_PROTEIN or GENE_DISEASE?" Suggestions must be specific to the entity type. Failing to follow up is not acceptable.
 
 **STRICT General Guidelines**:
-For `/search_biological_entities` endpoint:
-  - Always use this before any other endpoint to fetch general information about the entity.
-  - The user asks for a biological entity by its name, id or mentions a term that might match a Gene, Protein, Anatomy, BiologicalProcess, ChemicalEntity, Disease, Phenotype or Tissue by name name (e.g., "What diseases are related to 'lung'?" or "Show me tissues containing 'lung'").
-  - The user query involves partial or fuzzy matching of names.
-  - Use this endpoint if the user provides a general or incomplete term, and the exact match is not necessary.
-
-For '/predict_tail' and '/get_prediction_rank' endpoints:
-    -Always output the scores and briefly tell the user that the scores closer to zero (less negative) indicate a stronger prediction.
-    -Always ensure that the provided head, relation, and tail (if applicable) match the model_id and relationship names as defined in the EvoKG by first using the `/search_biological_entities` endpoint.
-    -If the user provides ambiguous or partial input, clarify or guide them to provide exact identifiers before using these endpoints.
-    -If the requested entity or relationship is not found in Evo-KG, return an appropriate error message or clarification request rather than invoking the endpoint.
-
-Follow-up: **STRICTLY** FOLLOW THE FOLLOW-UP RESPONSE GUIDELINES.
-Large Outputs: For extensive data (e.g., Gene sequence, SMILES), ask users before displaying full details:
-"The requested data is large. Display fully or summarize?"
-Seek confirmation if the data is large.
-Clarity: ALWAYS SPECIFY IF ANSWER IS EvoKG DATA AND GPT GENERATED ("generated by GPT-4o-mini").
-Relevance: Limit responses to Evo-KG-related questions or relevant supplementary GPT-4o-mini insights.
-Interaction: Keep responses concise and offer summaries or options for large datasets.""".strip()
+`/search_biological_entities`: always use it first to get information about an entity named, identified or partially described by the user.
+`/predict_tail`, `/get_prediction_rank`:
+  - Always show the scores and say that scores closer to zero (less negative) indicate stronger predictions.
+  - Use the model_id and relation names from EvoKG (via `/search_biological_entities`); ask for clarification on ambiguous input instead of calling the endpoint.
+  - Use `/predict_tails` and `/get_prediction_ranks` once for several heads, relations, tails or triples instead of repeated single calls.
+`/find_paths`: to explain how two entities are connected, call it once with both ids instead of chaining `/check_relationship`, `/get_entity_relationships` and `/get_subgraph`.
+Large outputs: lists of records come back as tables ("columns" and "rows"), long lists paged with a summary, and large values (e.g. sequences, SMILES) as a preview with a cursor. Before reading more with `/fetch_more`, ask "The requested data is large. Display fully or summarize?"
+Clarity: ALWAYS SPECIFY IF ANSWER IS EvoKG DATA OR GPT GENERATED ("generated by GPT-4o-mini").
+Relevance: Limit responses to EvoKG-related questions or relevant GPT-4o-mini insights.
+Interaction: Keep responses concise and offer summaries or options for large datasets."""
+
+
+def build_system_prompt(catalog=CATALOG) -> str:
+    """
+    Render SYSTEM_PROMPT with the entity types and relation schema of a catalog
+
+    Args:
+      catalog: The relation_catalog.RelationCatalog to describe
+
+    Returns:
+      str: The system prompt
+    """
+    return SYSTEM_PROMPT.format(
+        entity_types=", ".join(catalog.entity_types),
+        schema="\n".join(catalog.schema_lines()),
+    ).strip()
+
+
+class EvoKgAgent(StreamlitKani):
+    def __init__(
+        self, *args, persistent_cache=None, scorer=None, backend=None, **kwargs
+    ):
+        # rendered once per process and shared by every session
+        kwargs.setdefault(
+            "system_prompt", REGISTRY.get("system_prompt", build_system_prompt)
+        )
 
         super().__init__(*args, **kwargs)
 
@@ -146,18 +103,368 @@ Interaction: Keep responses concise and offer summaries or options for large dat
         self.user_avatar = "👤"
         self.name = "EvoKG Assistant"
 
-        self.api_base = "http://192.168.24.13:1026"
+        # shared, connection-pooled async client (one per process, reused by every
+        # agent) so parallel tool calls in one round run concurrently
+        self.client = get_async_client()
+        self.api_base = self.client.config.api_base
+        # where api_call sends requests: the REST service, unless a direct graph
+        # backend (kg_backends.Neo4jBackend, EVOKG_BACKEND=neo4j) serves the
+        # endpoint
+        self.rest = RestBackend(self.client)
+        self.backend = backend if backend is not None else get_graph_backend()
+        # TTL/LRU cache for read-only endpoints, shared across sessions
+        self.cache = get_response_cache()
+        # optional on-disk tier (kg_store.PersistentCache) so restarts start warm
+        self.persistent_cache = persistent_cache
+        # optional in-process KGE scorer (kge_scorer.EmbeddingScorer); when set,
+        # prediction endpoints are answered locally instead of by the PyKEEN server
+        self.scorer = scorer if scorer is not None else get_local_scorer()
+        # optional local name index (entity_index.EntityIndex) tried before the
+        # remote search_biological_entities endpoint
+        self.entity_index = get_entity_index()
+        # optional in-process adjacency index (graph_store.CsrGraph); when set,
+        # find_paths and the neighbourhood endpoints (graph_store.ENDPOINTS) are
+        # answered from it, falling back to the remote server for entities or
+        # lookup properties it does not have
+        self.graph = get_local_graph()
+        # (head_type, relation, tail_type) schema used to reject bad relation
+        # names and type mismatches before any backend round trip
+        self.catalog = CATALOG
+        # full values behind paged or elided tool results of this session, read
+        # back through fetch_more
+        self.handles = HandleStore()
+        # process-wide latency/size/token metrics (metrics.MetricsRegistry) and
+        # the running totals of the current chat turn
+        self.metrics = get_metrics()
+        self._turn = self._new_turn()
+        # optional process-wide answer cache (answer_cache.AnswerCache) replaying
+        # the stored round of a near-identical opening question
+        self.answer_cache = get_answer_cache()
+        # digests old tool results and trims tool exchanges so the history sent
+        # with each request stays within a token budget
+        self.compactor = ContextCompactor()
+        # tables, rounded scores and per-tool token budgets for the results the
+        # AI functions return
+        self.encoder = ResultEncoder()
+        # speculative predict_tail calls for the relations suggested after an
+        # entity lookup (prefetch.Prefetcher); their results are only kept by the
+        # response cache, so nothing is prefetched for a local scorer
+        prefetcher = get_prefetcher()
+        self.prefetch = None
+        if (
+            prefetcher is not None
+            and self.scorer is None
+            and self.cache.is_cacheable("predict_tail")
+        ):
+            self.prefetch = PrefetchSession(prefetcher)
 
     # helper function to make API calls
-    def api_call(self, endpoint, timeout=30, **kwargs):
-        url = f"{self.api_base}/{endpoint}"
+    async def api_call(self, endpoint, timeout=None, **kwargs):
+        start = time.perf_counter()
+        if self.scorer is not None and endpoint in kge_scorer.ENDPOINTS:
+            logging.info(f"############ local scorer: {endpoint}, kwargs={kwargs}")
+            response = await asyncio.to_thread(getattr(self.scorer, endpoint), **kwargs)
+            self.observe_kg(endpoint, "local", start)
+            return response
+        if self.serves_locally(endpoint):
+            response = await asyncio.to_thread(getattr(self.graph, endpoint), **kwargs)
+            # None: the entity or lookup property is not in the local graph
+            if response is not None:
+                self.observe_kg(endpoint, "local", start)
+                return response
+
+        url = self.client.url_for(endpoint)
         logging.info(f"############ api_call: url={url}, kwargs={kwargs}")
-        response = requests.get(url, params=kwargs, timeout=timeout)
-        response.raise_for_status()
-        return response.json()
+        fetched = False
+
+        async def fetch():
+            nonlocal fetched
+            fetched = True
+            backend = self.backend_for(endpoint)
+            return await backend.query(endpoint, kwargs, timeout=timeout)
+
+        response = await self.cache.get_or_fetch(
+            endpoint, kwargs, fetch, store=self.persistent_cache
+        )
+        self.observe_kg(endpoint, "remote" if fetched else "cache", start)
+        return response
+
+    def backend_for(self, endpoint):
+        if self.backend is not None and self.backend.serves(endpoint):
+            return self.backend
+        return self.rest
+
+    def serves_locally(self, endpoint) -> bool:
+        return self.graph is not None and endpoint in graph_store.ENDPOINTS
+
+    def observe_kg(self, endpoint, source, start):
+        self.metrics.observe(
+            "evokg_kg_request_duration_seconds",
+            time.perf_counter() - start,
+            endpoint=endpoint,
+            source=source,
+        )
+
+    # helper function for batched endpoints: per-query results are cached under
+    # cache_endpoint and only the misses are sent, in one POST to endpoint (or as
+    # single cache_endpoint calls when the server has no such endpoint)
+    async def batch_api_call(self, endpoint, cache_endpoint, queries, timeout=None):
+        logging.info(
+            f"############ batch_api_call: endpoint={endpoint}, n={len(queries)}"
+        )
+
+        async def fetch_many(missing):
+            return await self.post_batch(
+                endpoint,
+                missing,
+                lambda queries: self.single_calls(cache_endpoint, queries),
+                timeout=timeout,
+            )
+
+        start = time.perf_counter()
+        results = await self.cache.get_many(
+            cache_endpoint, queries, fetch_many, store=self.persistent_cache
+        )
+        self.observe_kg(endpoint, "batch", start)
+        return results
+
+    # send one batched request, to the local scorer when it serves the endpoint;
+    # REST servers without the batch endpoint (404/405) get the queries through
+    # fallback, a coroutine function returning results in the same shape
+    async def post_batch(self, endpoint, queries, fallback=None, timeout=None):
+        if self.scorer is not None and endpoint in kge_scorer.ENDPOINTS:
+            return await asyncio.to_thread(getattr(self.scorer, endpoint), queries)
+        if endpoint not in self.client.unsupported:
+            try:
+                response = await self.client.post_json(
+                    endpoint, {"queries": queries}, timeout=timeout
+                )
+                return response["results"]
+            except httpx.HTTPStatusError as e:
+                if fallback is None or e.response.status_code not in (404, 405):
+                    raise
+                logging.warning(
+                    f"KG backend has no {endpoint} endpoint "
+                    f"({e.response.status_code}), sending single requests instead"
+                )
+                self.client.unsupported.add(endpoint)
+        return await fallback(queries)
+
+    # concurrent single (cached) calls standing in for a batch endpoint; a failed
+    # query gets an error result, as it would inside a batch
+    async def single_calls(self, endpoint, queries):
+        async def call(params):
+            try:
+                return await self.api_call(endpoint, **params)
+            except Exception as e:
+                logging.error(f"Error calling {endpoint} endpoint: {str(e)}")
+                return {"error": f"Failed to call {endpoint}: {str(e)}"}
+
+        return await asyncio.gather(*(call(params) for params in queries))
+
+    # call an endpoint returning large lists and page/summarize its result; bodies
+    # of endpoints configured for streaming are parsed as they arrive and never
+    # held (or cached) whole
+    async def shaped_call(self, endpoint, limit, offset, **kwargs):
+        config = self.client.config
+        streamed = (
+            endpoint in config.stream_endpoints
+            and not self.serves_locally(endpoint)
+            and self.backend_for(endpoint) is self.rest
+        )
+        if not streamed:
+            response = await self.api_call(endpoint, **kwargs)
+            return shape_result(response, self.handles, limit, offset)
+
+        logging.info(f"############ stream_call: endpoint={endpoint}, kwargs={kwargs}")
+        start = time.perf_counter()
+        events = self.client.stream_items(endpoint, params=kwargs)
+        shaped = await shape_stream(
+            events, self.handles, limit, offset, config.stream_max_items
+        )
+        self.observe_kg(endpoint, "stream", start)
+        return shaped
+
+    # instrumentation: kani hooks are wrapped to time tool calls and completions
+    # and to total each chat turn's LLM and tool time and token usage
+    @staticmethod
+    def _new_turn():
+        return {"start": time.perf_counter(), "llm": 0.0, "tools": 0.0, "tokens": {}}
+
+    async def do_function_call(self, call, tool_call_id=None):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = await super().do_function_call(call, tool_call_id=tool_call_id)
+            text = result.message.text or ""
+            if not text.startswith('{"error"'):
+                status = "ok"
+            self.metrics.observe(
+                "evokg_tool_result_bytes", len(text.encode()), tool=call.name
+            )
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            self._turn["tools"] += elapsed
+            self.metrics.observe("evokg_tool_duration_seconds", elapsed, tool=call.name)
+            self.metrics.inc("evokg_tool_calls_total", tool=call.name, status=status)
+
+    # kani trims self.chat_history to the model's context in get_prompt; it is
+    # swapped for the compacted copy for that call only, the stored history
+    # (and what the UI shows) keeps the full tool results
+    async def get_prompt(self, include_functions=True, **kwargs):
+        history = self.chat_history
+        self.chat_history = self.compactor.compact(history)
+        if self.compactor.config.enabled:
+            self.observe_compaction(*self.compactor.last)
+        try:
+            return await super().get_prompt(include_functions, **kwargs)
+        finally:
+            self.chat_history = history
+
+    def observe_compaction(self, raw, compacted):
+        self.metrics.observe("evokg_context_tokens", raw, stage="raw")
+        self.metrics.observe("evokg_context_tokens", compacted, stage="compacted")
+        if raw > compacted:
+            self.metrics.inc("evokg_context_tokens_saved_total", raw - compacted)
+
+    async def get_model_completion(self, include_functions=True, **kwargs):
+        start = time.perf_counter()
+        completion = await super().get_model_completion(include_functions, **kwargs)
+        self.observe_completion(completion, start)
+        return completion
+
+    async def get_model_stream(self, include_functions=True, **kwargs):
+        start = time.perf_counter()
+        async for elem in super().get_model_stream(include_functions, **kwargs):
+            if not isinstance(elem, str):
+                self.observe_completion(elem, start)
+            yield elem
+
+    def observe_completion(self, completion, start):
+        elapsed = time.perf_counter() - start
+        self._turn["llm"] += elapsed
+        self.metrics.observe("evokg_llm_duration_seconds", elapsed)
+        for kind in ("prompt", "completion"):
+            tokens = getattr(completion, f"{kind}_tokens", None)
+            if tokens:
+                self.metrics.inc("evokg_llm_tokens_total", tokens, kind=kind)
+                self._turn["tokens"][kind] = self._turn["tokens"].get(kind, 0) + tokens
+
+    async def full_round(self, query, **kwargs):
+        self._turn = self._new_turn()
+        try:
+            replayed = await self.replay_round(query)
+            if replayed is not None:
+                for message in replayed:
+                    yield message
+                return
+            start = len(self.chat_history)
+            async for message in super().full_round(query, **kwargs):
+                yield message
+            self.store_round(query, start)
+        finally:
+            self.observe_turn()
+
+    async def full_round_stream(self, query, **kwargs):
+        self._turn = self._new_turn()
+        try:
+            replayed = await self.replay_round(query)
+            if replayed is not None:
+                for message in replayed:
+                    yield DummyStream(message)
+                return
+            start = len(self.chat_history)
+            async for stream in super().full_round_stream(query, **kwargs):
+                yield stream
+            self.store_round(query, start)
+        finally:
+            self.observe_turn()
+
+    # answer cache: only a session's opening question is looked up and stored,
+    # since a later one may refer back to earlier turns
+    def opens_session(self, query, start) -> bool:
+        return (
+            self.answer_cache is not None
+            and isinstance(query, str)
+            and not any(m.role == ChatRole.USER for m in self.chat_history[:start])
+        )
+
+    async def replay_round(self, query):
+        if not self.opens_session(query, len(self.chat_history)):
+            return None
+        messages = self.answer_cache.lookup(query, self.handles)
+        self.metrics.inc(
+            "evokg_answer_cache_lookups_total",
+            result="miss" if messages is None else "hit",
+        )
+        if messages is None:
+            return None
+        async with self.lock:
+            await self.add_to_history(ChatMessage.user(query))
+            for message in messages:
+                await self.add_to_history(message)
+        llm_calls = sum(1 for m in messages if m.role == ChatRole.ASSISTANT)
+        self.metrics.inc("evokg_answer_cache_llm_calls_saved_total", llm_calls)
+        return messages
+
+    def store_round(self, query, start):
+        if self.opens_session(query, start):
+            self.answer_cache.store(query, self.chat_history[start + 1 :], self.handles)
+
+    def observe_turn(self):
+        turn = self._turn
+        phases = {
+            "total": time.perf_counter() - turn["start"],
+            "llm": turn["llm"],
+            "tools": turn["tools"],
+        }
+        for phase, seconds in phases.items():
+            self.metrics.observe("evokg_turn_duration_seconds", seconds, phase=phase)
+        for kind, tokens in turn["tokens"].items():
+            self.metrics.observe("evokg_turn_tokens", tokens, kind=kind)
+
+    # queue predictions for the relations the follow-up guidelines will suggest
+    # for a resolved entity
+    def prefetch_followups(self, entity):
+        if self.prefetch is None or not isinstance(entity, dict):
+            return
+
+        async def fetch(head, relation, top_k):
+            await self.api_call(
+                "predict_tail", head=head, relation=relation, top_k_predictions=top_k
+            )
+
+        self.prefetch.schedule(entity, fetch)
+
+    # compact encoding of an AI function's result (see result_encoding); rows cut
+    # by the tool's token budget are kept in self.handles for fetch_more
+    def encode_result(self, tool, value):
+        encoded = self.encoder.encode(tool, value, self.handles)
+        if encoded is not value:
+            raw, compact = estimate_tokens(value), estimate_tokens(encoded)
+            self.metrics.observe(
+                "evokg_tool_result_tokens", raw, tool=tool, stage="raw"
+            )
+            self.metrics.observe(
+                "evokg_tool_result_tokens", compact, tool=tool, stage="encoded"
+            )
+            if raw > compact:
+                self.metrics.inc(
+                    "evokg_tool_result_tokens_saved_total", raw - compact, tool=tool
+                )
+        return encoded
+
+    # validate a prediction's relation, and its head type when the local entity
+    # index knows the head; returns an error dict, or None when valid
+    def check_prediction(self, head, relation):
+        head_type = None
+        if self.entity_index is not None:
+            head_type = self.entity_index.label_for_model_id(head)
+        return self.catalog.check_relation(relation, head_type)
 
     @ai_function
-    def hello_world(self) -> dict:
+    async def hello_world(self) -> dict:
         """
         A simple test endpoint that returns 'Hello, World!'
 
@@ -165,14 +472,14 @@ Interaction: Keep responses concise and offer summaries or options for large dat
           dict: A simple greeting message
         """
         try:
-            response = self.api_call("hello_world")
+            response = await self.api_call("hello_world")
             return response
         except Exception as e:
             logging.error(f"Error calling hello_world endpoint: {str(e)}")
             return {"error": f"Failed to get hello world message: {str(e)}"}
 
     @ai_function
-    def get_sample_triples(
+    async def get_sample_triples(
         self,
         rel_type: Annotated[
             str,
@@ -191,14 +498,17 @@ Interaction: Keep responses concise and offer summaries or options for large dat
           List[dict]: A list of triples with head, relation, and tail
         """
         try:
-            response = self.api_call("sample_triples", rel_type=rel_type)
-            return response
+            error = self.catalog.check_relation(rel_type)
+            if error:
+                return error
+            response = await self.api_call("sample_triples", rel_type=rel_type)
+            return self.encode_result("get_sample_triples", response)
         except Exception as e:
             logging.error(f"Error calling sample_triples endpoint: {str(e)}")
             return {"error": f"Failed to retrieve sample triples: {str(e)}"}
 
     @ai_function
-    def get_nodes_by_label(
+    async def get_nodes_by_label(
         self,
         label: Annotated[
             str,
@@ -218,14 +528,16 @@ Interaction: Keep responses concise and offer summaries or options for large dat
           List[dict]: A list of up to 10 nodes with their primary identifiers
         """
         try:
-            response = self.api_call("get_nodes_by_label", label=label)
-            return response
+            response = await self.api_call(
+                "get_nodes_by_label", label=self.catalog.graph_label(label)
+            )
+            return self.encode_result("get_nodes_by_label", response)
         except Exception as e:
             logging.error(f"Error calling get_nodes_by_label endpoint: {str(e)}")
             return {"error": f"Failed to retrieve nodes by label: {str(e)}"}
 
     @ai_function
-    def get_subgraph(
+    async def get_subgraph(
         self,
         property_name: Annotated[
             str,
@@ -236,28 +548,53 @@ Interaction: Keep responses concise and offer summaries or options for large dat
         property_value: Annotated[
             str, AIParam(desc="Value of the property to search for")
         ],
+        limit: Annotated[
+            int,
+            AIParam(
+                desc=f"Maximum nodes/relationships returned (default {DEFAULT_LIMIT})"
+            ),
+        ] = DEFAULT_LIMIT,
+        offset: Annotated[
+            int, AIParam(desc="Index of the first node/relationship returned")
+        ] = 0,
+        cursor: Annotated[
+            Optional[str],
+            AIParam(desc="next_cursor from a previous call, to continue paging"),
+        ] = None,
     ) -> dict:
         """
-        Retrieve a subgraph of related nodes by specifying the property and value of the start node
+        Retrieve a subgraph of related nodes by specifying the property and value of the start node. Long lists are paged and summarized with counts per type
 
         Args:
           property_name: Property name of the start node to search for
           property_value: Value of the property to search for
+          limit: Maximum nodes/relationships returned
+          offset: Index of the first node/relationship returned
+          cursor: next_cursor from a previous call, to continue paging
 
         Returns:
-          dict: A subgraph of nodes related to the specified node
+          dict: A page of the subgraph of nodes related to the specified node, with a summary
         """
         try:
-            response = self.api_call(
-                "subgraph", property_name=property_name, property_value=property_value
+            if cursor:
+                return self.encode_result(
+                    "get_subgraph", self.handles.page(cursor, limit)
+                )
+            response = await self.shaped_call(
+                "subgraph",
+                limit,
+                offset,
+                property_name=property_name,
+                property_value=property_value,
             )
-            return response
+            self.prefetch_followups(response.get("start_node"))
+            return self.encode_result("get_subgraph", response)
         except Exception as e:
             logging.error(f"Error calling subgraph endpoint: {str(e)}")
             return {"error": f"Failed to retrieve subgraph: {str(e)}"}
 
     @ai_function
-    def search_biological_entities(
+    async def search_biological_entities(
         self,
         targetTerm: Annotated[
             str,
@@ -277,10 +614,15 @@ Interaction: Keep responses concise and offer summaries or options for large dat
           List[dict]: A list of entity types with their top 3 matching entities
         """
         try:
-            response = self.api_call(
-                "search_biological_entities", targetTerm=targetTerm
-            )
-            return response
+            response = None
+            if self.entity_index is not None:
+                response = self.entity_index.search(targetTerm)
+            if not response:
+                response = await self.api_call(
+                    "search_biological_entities", targetTerm=targetTerm
+                )
+            self.prefetch_followups(resolved_entity(targetTerm, response))
+            return self.encode_result("search_biological_entities", response)
         except Exception as e:
             logging.error(
                 f"Error calling search_biological_entities endpoint: {str(e)}"
@@ -288,7 +630,7 @@ Interaction: Keep responses concise and offer summaries or options for large dat
             return {"error": f"Failed to search biological entities: {str(e)}"}
 
     @ai_function
-    def get_entity_relationships(
+    async def get_entity_relationships(
         self,
         entity_type: Annotated[
             str,
@@ -309,36 +651,89 @@ Interaction: Keep responses concise and offer summaries or options for large dat
                 desc="The type of relationship to filter by (e.g., GENE_DISEASE, PROTEIN_PROTEIN)"
             ),
         ] = None,
+        limit: Annotated[
+            int,
+            AIParam(
+                desc=f"Maximum related entities returned (default {DEFAULT_LIMIT})"
+            ),
+        ] = DEFAULT_LIMIT,
+        offset: Annotated[
+            int, AIParam(desc="Index of the first related entity returned")
+        ] = 0,
+        cursor: Annotated[
+            Optional[str],
+            AIParam(desc="next_cursor from a previous call, to continue paging"),
+        ] = None,
     ) -> dict:
         """
-        Retrieve the count and list of related entities for a specified entity and optionally by relationship type
+        Retrieve the count and list of related entities for a specified entity and optionally by relationship type. Long lists are paged and summarized with counts per relationship type
 
         Args:
           entity_type: The type of entity to search for (e.g., Gene, Protein)
           property_name: The property used to identify the entity (e.g., id, name)
           property_value: The value of the property for the entity
           relationship_type: The type of relationship to filter by (optional)
+          limit: Maximum related entities returned
+          offset: Index of the first related entity returned
+          cursor: next_cursor from a previous call, to continue paging
 
         Returns:
-          dict: The count and details of related entities, optionally filtered by relationship type
+          dict: The count and a page of related entities, optionally filtered by relationship type, with a summary
         """
         try:
+            if cursor:
+                return self.encode_result(
+                    "get_entity_relationships", self.handles.page(cursor, limit)
+                )
+            error = self.catalog.check_entity_relation(entity_type, relationship_type)
+            if error:
+                return error
             params = {
-                "entity_type": entity_type,
+                "entity_type": self.catalog.graph_label(entity_type),
                 "property_name": property_name,
                 "property_value": property_value,
             }
             if relationship_type:
                 params["relationship_type"] = relationship_type
 
-            response = self.api_call("entity_relationships", **params)
-            return response
+            response = await self.shaped_call(
+                "entity_relationships", limit, offset, **params
+            )
+            return self.encode_result("get_entity_relationships", response)
         except Exception as e:
             logging.error(f"Error calling entity_relationships endpoint: {str(e)}")
             return {"error": f"Failed to retrieve entity relationships: {str(e)}"}
 
     @ai_function
-    def check_relationship(
+    async def fetch_more(
+        self,
+        cursor: Annotated[
+            str,
+            AIParam(
+                desc="A next_cursor or cursor from an earlier result (e.g. 'h3:25')"
+            ),
+        ],
+        limit: Annotated[
+            Optional[int],
+            AIParam(
+                desc="Items to return, or characters for a large value such as a sequence or SMILES"
+            ),
+        ] = None,
+    ) -> dict:
+        """
+        Continue a paged list, or read a large value (sequence, SMILES) that was replaced by a preview, from its cursor without querying EvoKG again
+
+        Args:
+          cursor: A next_cursor or cursor from an earlier result
+          limit: Items, or characters for a large value, to return
+
+        Returns:
+          dict: The next items or text and the cursor of the following page
+        """
+        return self.encode_result("fetch_more", self.handles.page(cursor, limit))
+
+    @ai_function
+    async def check_relationship(
         self,
         entity1_type: Annotated[
             str, AIParam(desc="The type of the first entity (e.g., Gene, Protein)")
@@ -381,21 +776,108 @@ Interaction: Keep responses concise and offer summaries or options for large dat
         """
         try:
             params = {
-                "entity1_type": entity1_type,
+                "entity1_type": self.catalog.graph_label(entity1_type),
                 "entity1_property_name": entity1_property_name,
                 "entity1_property_value": entity1_property_value,
-                "entity2_type": entity2_type,
+                "entity2_type": self.catalog.graph_label(entity2_type),
                 "entity2_property_name": entity2_property_name,
                 "entity2_property_value": entity2_property_value,
             }
-            response = self.api_call("check_relationship", **params)
-            return response
+            response = await self.api_call("check_relationship", **params)
+            return self.encode_result("check_relationship", response)
         except Exception as e:
             logging.error(f"Error calling check_relationship endpoint: {str(e)}")
             return {"error": f"Failed to check relationship: {str(e)}"}
 
     @ai_function
-    def predict_tail(
+    async def find_paths(
+        self,
+        source: Annotated[
+            str,
+            AIParam(
+                desc="EvoKG id of the start entity (the 'id' from search_biological_entities)"
+            ),
+        ],
+        target: Annotated[str, AIParam(desc="EvoKG id of the end entity")],
+        max_hops: Annotated[
+            int, AIParam(desc=f"Longest path to search for (1 to {MAX_HOPS})")
+        ] = 3,
+        allowed_relations: Annotated[
+            Optional[List[str]],
+            AIParam(
+                desc="Only follow these relations (e.g., ['GENE_DISEASE', 'CHEMICALENTITY_GENE']); all when omitted"
+            ),
+        ] = None,
+    ) -> dict:
+        """
+        Find the shortest paths connecting two entities, following relations in either direction, in one call. Use it for questions like "how is X connected to Y?" instead of exploring hop by hop
+
+        Args:
+          source: EvoKG id of the start entity
+          target: EvoKG id of the end entity
+          max_hops: Longest path to search for
+          allowed_relations: Only follow these relations (optional)
+
+        Returns:
+          dict: The number of hops and up to MAX_PATHS shortest paths, each a list of head/relation/tail edges from source to target
+        """
+        try:
+            for relation in allowed_relations or []:
+                error = self.catalog.check_relation(relation)
+                if error:
+                    return error
+            max_hops = max(1, min(int(max_hops), MAX_HOPS))
+
+            if self.graph is not None:
+                start = time.perf_counter()
+                response = await asyncio.to_thread(
+                    self.graph.shortest_paths,
+                    source,
+                    target,
+                    max_hops,
+                    allowed_relations,
+                    MAX_PATHS,
+                )
+                # None: an end is not in the local graph, so ask the backend
+                if response is not None:
+                    self.observe_kg("find_paths", "local", start)
+                    return self.encode_result("find_paths", response)
+
+            params = {"source": source, "target": target, "max_hops": max_hops}
+            if allowed_relations:
+                params["allowed_relations"] = ",".join(allowed_relations)
+            response = await self.api_call("find_paths", **params)
+            return self.encode_result("find_paths", response)
+        except Exception as e:
+            logging.error(f"Error calling find_paths endpoint: {str(e)}")
+            return {"error": f"Failed to find paths: {str(e)}"}
+
+    @ai_function
+    async def list_relations(
+        self,
+        entity_type: Annotated[
+            str,
+            AIParam(
+                desc="The entity type whose relations to list (e.g., Gene, Protein, ChemicalEntity)"
+            ),
+        ],
+    ) -> dict:
+        """
+        List the relations starting at an entity type (with their tail types) and ending at it (with their head types), as used for predictions
+
+        Args:
+          entity_type: The entity type whose relations to list
+
+        Returns:
+          dict: The outgoing and incoming relations of the entity type
+        """
+        error = self.catalog.check_entity_relation(entity_type)
+        if error:
+            return error
+        return self.catalog.describe(entity_type)
+
+    @ai_function
+    async def predict_tail(
         self,
         head: Annotated[
             str, AIParam(desc="model_id for the head entity for the prediction")
@@ -420,19 +902,79 @@ Interaction: Keep responses concise and offer summaries or options for large dat
           dict: Head entity, relation, and a list of predicted tail entities with scores
         """
         try:
+            error = self.check_prediction(head, relation)
+            if error:
+                return error
+            if self.prefetch is not None:
+                self.prefetch.lookup(head, relation, top_k_predictions)
             params = {
                 "head": head,
                 "relation": relation,
                 "top_k_predictions": top_k_predictions,
             }
-            response = self.api_call("predict_tail", **params)
-            return response
+            response = await self.api_call("predict_tail", **params)
+            return self.encode_result("predict_tail", response)
         except Exception as e:
             logging.error(f"Error calling predict_tail endpoint: {str(e)}")
             return {"error": f"Failed to predict tail entities: {str(e)}"}
 
     @ai_function
-    def get_prediction_rank(
+    async def predict_tails(
+        self,
+        queries: Annotated[
+            List[dict],
+            AIParam(
+                desc="List of predictions to run, each an object with 'head' (model_id of the head entity), 'relation' and optional 'top_k_predictions' (default 10)"
+            ),
+        ],
+    ) -> dict:
+        """
+        Predict the top K tail entities for many head/relation pairs in a single batched call using a PyKEEN KGE model
+
+        Args:
+          queries: List of objects with 'head' (model_id), 'relation' and optional 'top_k_predictions'
+
+        Returns:
+          dict: Predicted tail entities with scores, keyed by "head|relation" for each query
+        """
+        try:
+            if len(queries) > MAX_BATCH_QUERIES:
+                return {
+                    "error": f"At most {MAX_BATCH_QUERIES} queries can be predicted in one call"
+                }
+
+            # one query per (head, relation), keeping the largest requested k;
+            # queries failing catalog validation are answered without I/O
+            batch, invalid = {}, {}
+            for query in queries:
+                key = f"{query['head']}|{query['relation']}"
+                error = self.check_prediction(query["head"], query["relation"])
+                if error:
+                    invalid[key] = error
+                    continue
+                top_k = int(query.get("top_k_predictions", 10))
+                if self.prefetch is not None:
+                    self.prefetch.lookup(query["head"], query["relation"], top_k)
+                if key not in batch or batch[key]["top_k_predictions"] < top_k:
+                    batch[key] = {
+                        "head": str(query["head"]),
+                        "relation": query["relation"],
+                        "top_k_predictions": top_k,
+                    }
+
+            results = []
+            if batch:
+                results = await self.batch_api_call(
+                    "predict_tail_batch", "predict_tail", list(batch.values())
+                )
+            response = {"results": {**dict(zip(batch.keys(), results)), **invalid}}
+            return self.encode_result("predict_tails", response)
+        except Exception as e:
+            logging.error(f"Error calling predict_tail_batch endpoint: {str(e)}")
+            return {"error": f"Failed to predict tail entities: {str(e)}"}
+
+    @ai_function
+    async def get_prediction_rank(
         self,
         head: Annotated[
             str, AIParam(desc="model_id for head entity for the prediction")
@@ -457,9 +999,184 @@ Interaction: Keep responses concise and offer summaries or options for large dat
           dict: The rank, score, and maximum score of the prediction
         """
         try:
+            error = self.check_prediction(head, relation)
+            if error:
+                return error
             params = {"head": head, "relation": relation, "tail": tail}
-            response = self.api_call("get_prediction_rank", **params)
-            return response
+            response = await self.api_call("get_prediction_rank", **params)
+            return self.encode_result("get_prediction_rank", response)
         except Exception as e:
             logging.error(f"Error calling get_prediction_rank endpoint: {str(e)}")
             return {"error": f"Failed to get prediction rank: {str(e)}"}
+
+    @ai_function
+    async def get_prediction_ranks(
+        self,
+        head: Annotated[
+            str,
+            AIParam(desc="model_id for head entity, used together with 'tails'"),
+        ] = None,
+        relation: Annotated[
+            str,
+            AIParam(desc="Relation for the prediction, used together with 'tails'"),
+        ] = None,
+        tails: Annotated[
+            List[str],
+            AIParam(
+                desc="model_ids of the tail entities to rank for head and relation"
+            ),
+        ] = None,
+        triples: Annotated[
+            List[dict],
+            AIParam(
+                desc="Alternatively, a list of objects with 'head', 'relation' and 'tail' model_ids to rank"
+            ),
+        ] = None,
+    ) -> dict:
+        """
+        Get the rank and score of many tail entities in one call, either for one head and relation or for a list of triples, along with the maximum score of each head and relation.
+
+        Args:
+          head: model_id for head entity, used together with tails
+          relation: Relation for the prediction, used together with tails
+          tails: model_ids of the tail entities to rank
+          triples: Alternatively, a list of objects with 'head', 'relation' and 'tail'
+
+        Returns:
+          dict: Per head and relation, the maximum score and the rank and score of each tail
+        """
+        try:
+            items = [
+                {
+                    "head": str(t["head"]),
+                    "relation": t["relation"],
+                    "tail": str(t["tail"]),
+                }
+                for t in triples or []
+            ]
+            if tails:
+                if not head or not relation:
+                    return {"error": "'head' and 'relation' are required with 'tails'"}
+                items += [
+                    {"head": str(head), "relation": relation, "tail": str(tail)}
+                    for tail in tails
+                ]
+            if not items:
+                return {"error": "Provide 'head', 'relation' and 'tails', or 'triples'"}
+            if len(items) > MAX_BATCH_TRIPLES:
+                return {
+                    "error": f"At most {MAX_BATCH_TRIPLES} triples can be ranked in one call"
+                }
+
+            # (head, relation) pairs failing catalog validation are reported
+            # once each and never sent to the backend
+            invalid = {}
+            for item in items:
+                key = (item["head"], item["relation"])
+                if key not in invalid:
+                    invalid[key] = self.check_prediction(*key)
+            invalid = {key: error for key, error in invalid.items() if error}
+            items = [i for i in items if (i["head"], i["relation"]) not in invalid]
+
+            async def rank_singly(queries):
+                # servers without prediction_rank_batch: one get_prediction_rank
+                # call per triple, regrouped into the batch endpoint's results
+                triples = [
+                    {"head": q["head"], "relation": q["relation"], "tail": tail}
+                    for q in queries
+                    for tail in q["tails"]
+                ]
+                ranks = await self.single_calls("get_prediction_rank", triples)
+                results = {
+                    (q["head"], q["relation"]): {
+                        "head": q["head"],
+                        "relation": q["relation"],
+                        "max_score": None,
+                        "ranks": [],
+                    }
+                    for q in queries
+                }
+                for triple, rank in zip(triples, ranks):
+                    result = results[(triple["head"], triple["relation"])]
+                    if "error" in rank:
+                        result["ranks"].append({"tail": triple["tail"], **rank})
+                        continue
+                    result["max_score"] = rank["max_score"]
+                    result["ranks"].append(
+                        {k: rank[k] for k in ("tail", "rank", "score")}
+                    )
+                return list(results.values())
+
+            async def fetch_many(missing):
+                # one query per distinct (head, relation), so each is scored once
+                groups = {}
+                for item in missing:
+                    key = (item["head"], item["relation"])
+                    groups.setdefault(key, []).append(item["tail"])
+                queries = [
+                    {"head": h, "relation": r, "tails": t}
+                    for (h, r), t in groups.items()
+                ]
+                by_triple = {}
+                results = await self.post_batch(
+                    "prediction_rank_batch", queries, rank_singly
+                )
+                for result in results:
+                    key = (result["head"], result["relation"])
+                    if "error" in result:
+                        for tail in groups.get(key, []):
+                            by_triple[key + (tail,)] = {"error": result["error"]}
+                        continue
+                    for rank in result["ranks"]:
+                        if "error" in rank:
+                            by_triple[key + (str(rank["tail"]),)] = {
+                                "error": rank["error"]
+                            }
+                            continue
+                        by_triple[key + (str(rank["tail"]),)] = {
+                            "max_score": result["max_score"],
+                            **rank,
+                        }
+                return [
+                    by_triple.get(
+                        (item["head"], item["relation"], item["tail"]),
+                        {"error": "No rank returned for this triple"},
+                    )
+                    for item in missing
+                ]
+
+            logging.info(f"############ get_prediction_ranks: n={len(items)}")
+            results = []
+            if items:
+                results = await self.cache.get_many(
+                    "prediction_rank_batch",
+                    items,
+                    fetch_many,
+                    store=self.persistent_cache,
+                )
+
+            grouped = {}
+            for item, result in zip(items, results):
+                key = f"{item['head']}|{item['relation']}"
+                group = grouped.setdefault(
+                    key,
+                    {
+                        "head": item["head"],
+                        "relation": item["relation"],
+                        "max_score": None,
+                        "ranks": [],
+                    },
+                )
+                if "max_score" in result:
+                    group["max_score"] = result["max_score"]
+                rank = {k: v for k, v in result.items() if k != "max_score"}
+                group["ranks"].append({"tail": item["tail"], **rank})
+            errors = [
+                {"head": head, "relation": relation, **error}
+                for (head, relation), error in invalid.items()
+            ]
+            response = {"results": list(grouped.values()) + errors}
+            return self.encode_result("get_prediction_ranks", response)
+        except Exception as e:
+            logging.error(f"Error calling prediction_rank_batch endpoint: {str(e)}")
+            return {"error": f"Failed to get prediction ranks: {str(e)}"}
@@ -0,0 +1,276 @@
+import argparse
+import json
+import logging
+import pathlib
+from typing import List, Optional
+
+import numpy as np
+
+from relation_catalog import type_key
+
+CENTROIDS = "centroids.npy"
+OFFSETS = "offsets.npy"
+MEMBERS = "members.npy"
+ENTITY_TYPES = "entity_types.npy"
+META = "meta.json"
+
+
+class IvfIndex:
+    """
+    Inverted-file (IVF) index over tail embeddings for approximate top-k prediction.
+
+    Entities are clustered offline with k-means; a query only scores the tails in
+    the `nprobe` clusters whose centroids rank best for it, then re-ranks those
+    candidates exactly with the scorer. For TransE the probe uses L2 distance to
+    h + r; for DistMult/ComplEx it uses the inner product with the query vector.
+    Per-entity type codes allow restricting candidates to the relation's tail type
+    (e.g. only Disease tails for *_DISEASE relations). All arrays are saved as .npy
+    and memory-mapped on load.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        members: np.ndarray,
+        metric: str,
+        entity_types: Optional[np.ndarray] = None,
+        type_names: Optional[List[str]] = None,
+        nprobe: int = 8,
+    ):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.members = members
+        self.metric = metric
+        self.entity_types = entity_types
+        self.type_names = list(type_names or [])
+        self.type_codes = {name: code for code, name in enumerate(self.type_names)}
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        scorer,
+        nlist: Optional[int] = None,
+        entity_types: Optional[List[str]] = None,
+        nprobe: Optional[int] = None,
+        iterations: int = 15,
+        sample_size: Optional[int] = None,
+        seed: int = 0,
+        chunk_size: int = 65536,
+    ):
+        """
+        Cluster the scorer's tail embeddings into an IVF index
+
+        Args:
+          scorer: The kge_scorer.EmbeddingScorer whose tails are indexed
+          nlist: Number of clusters (default 4 * sqrt(n_entities))
+          entity_types: Optional label per entity, in embedding-row order
+          nprobe: Default clusters probed per query (default nlist / 32)
+          iterations: k-means iterations
+          sample_size: Entities sampled to train the centroids (default 64 * nlist)
+          seed: RNG seed
+          chunk_size: Entities assigned per block, bounding peak memory
+
+        Returns:
+          IvfIndex: The index
+        """
+        tails = scorer.tail_matrix()
+        n = len(tails)
+        nlist = min(nlist or int(4 * np.sqrt(n)), n)
+        nprobe = nprobe or max(1, nlist // 32)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n, sample_size or 64 * nlist)
+        sample = np.sort(rng.choice(n, sample_size, replace=False))
+        centroids = _kmeans(
+            np.asarray(tails[sample], dtype=np.float32), nlist, iterations, rng
+        )
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, chunk_size):
+            block = np.asarray(tails[start : start + chunk_size], dtype=np.float32)
+            assign[start : start + len(block)] = _nearest(block, centroids)
+        members = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+
+        codes, names = None, None
+        if entity_types is not None:
+            names = sorted({type_key(t) for t in entity_types})
+            lookup = {name: code for code, name in enumerate(names)}
+            codes = np.array(
+                [lookup[type_key(t)] for t in entity_types], dtype=np.int16
+            )
+
+        logging.info(f"Built IVF index: {n} entities, nlist={nlist}, nprobe={nprobe}")
+        return cls(centroids, offsets, members, scorer.metric, codes, names, nprobe)
+
+    def save(self, directory):
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / CENTROIDS, self.centroids)
+        np.save(directory / OFFSETS, self.offsets)
+        np.save(directory / MEMBERS, self.members)
+        if self.entity_types is not None:
+            np.save(directory / ENTITY_TYPES, self.entity_types)
+        meta = {
+            "metric": self.metric,
+            "nprobe": self.nprobe,
+            "type_names": self.type_names,
+        }
+        (directory / META).write_text(json.dumps(meta))
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Open an index written by save(), memory-mapping its arrays
+
+        Args:
+          directory: The index directory
+
+        Returns:
+          IvfIndex: The index
+        """
+        directory = pathlib.Path(directory)
+        meta = json.loads((directory / META).read_text())
+        entity_types = None
+        if (directory / ENTITY_TYPES).exists():
+            entity_types = np.load(directory / ENTITY_TYPES, mmap_mode="r")
+        return cls(
+            np.load(directory / CENTROIDS),
+            np.load(directory / OFFSETS),
+            np.load(directory / MEMBERS, mmap_mode="r"),
+            meta["metric"],
+            entity_types,
+            meta.get("type_names"),
+            meta.get("nprobe", 8),
+        )
+
+    def candidates(self, query, nprobe=None, tail_type=None) -> np.ndarray:
+        """
+        Entity indices in the clusters probed for a query, optionally type-filtered
+
+        Args:
+          query: A (D,) query vector from scorer.query_vectors()
+          nprobe: Clusters to probe (default self.nprobe)
+          tail_type: Keep only entities of this type, if the index has types
+
+        Returns:
+          np.ndarray: Sorted candidate entity indices
+        """
+        if self.metric == "ip":
+            centroid_scores = self.centroids @ query
+        else:
+            centroid_scores = -((self.centroids - query) ** 2).sum(axis=1)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        candidates = np.concatenate(
+            [self.members[self.offsets[p] : self.offsets[p + 1]] for p in probe]
+        )
+
+        code = self.type_codes.get(type_key(tail_type)) if tail_type else None
+        if code is not None and self.entity_types is not None:
+            candidates = candidates[np.asarray(self.entity_types[candidates]) == code]
+        candidates.sort()
+        return candidates
+
+    def search(self, scorer, query, k, nprobe=None, tail_type=None):
+        """
+        Approximate top-k tails for one query vector
+
+        Args:
+          scorer: The EmbeddingScorer used to score candidates exactly
+          query: A (D,) query vector from scorer.query_vectors()
+          k: Number of tails to return
+          nprobe: Clusters to probe (default self.nprobe)
+          tail_type: Keep only entities of this type, if the index has types
+
+        Returns:
+          tuple: (entity indices, scores), best first
+        """
+        candidates = self.candidates(query, nprobe=nprobe, tail_type=tail_type)
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = scorer.score_candidates(query, candidates)
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+
+def _nearest(points, centroids, chunk_size=16384):
+    # ||x||^2 is constant per row, so argmin ||x - c||^2 = argmin ||c||^2 - 2 x.c;
+    # rows are processed in chunks to bound the (chunk, nlist) distance matrix
+    c_sq = (centroids * centroids).sum(axis=1)
+    assign = np.empty(len(points), dtype=np.int32)
+    for start in range(0, len(points), chunk_size):
+        block = points[start : start + chunk_size]
+        assign[start : start + len(block)] = np.argmin(
+            c_sq - 2 * (block @ centroids.T), axis=1
+        )
+    return assign
+
+
+def _kmeans(sample, nlist, iterations, rng):
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(sample, centroids)
+        counts = np.bincount(assign, minlength=nlist)
+        sums = np.stack(
+            [
+                np.bincount(assign, weights=sample[:, j], minlength=nlist)
+                for j in range(sample.shape[1])
+            ],
+            axis=1,
+        )
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # re-seed empty clusters from random sample points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[
+                rng.choice(len(sample), len(empty), replace=False)
+            ]
+    return centroids.astype(np.float32)
+
+
+def main():
+    from kge_scorer import EmbeddingScorer
+
+    parser = argparse.ArgumentParser(
+        description="Build an IVF index from an exported embedding directory"
+    )
+    parser.add_argument("--embeddings", required=True, help="kge_scorer export dir")
+    parser.add_argument("--out", required=True, help="Output index directory")
+    parser.add_argument("--model", default=None, help="Override meta.json model")
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument(
+        "--types",
+        default=None,
+        help="JSON list of entity labels in embedding-row order "
+        "(default: entity_types.json in the embedding dir, if present)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    scorer = EmbeddingScorer.load(args.embeddings, model=args.model)
+    types_path = pathlib.Path(
+        args.types or pathlib.Path(args.embeddings) / "entity_types.json"
+    )
+    entity_types = None
+    if types_path.exists():
+        entity_types = json.loads(types_path.read_text())
+    index = IvfIndex.build(
+        scorer, nlist=args.nlist, nprobe=args.nprobe, entity_types=entity_types
+    )
+    index.save(args.out)
+
+
+if __name__ == "__main__":
+    main()
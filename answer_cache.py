@@ -0,0 +1,348 @@
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from kani import ChatMessage, ChatRole
+
+from entity_index import get_entity_index
+from resources import REGISTRY
+from result_shaping import HandleStore
+
+# a fetch_more cursor ("h<id>:<offset>") in a tool result; the handle belongs to
+# the session's result_shaping.HandleStore
+SESSION_CURSOR = re.compile(r'("(?:next_)?cursor": ?")(h\d+):')
+
+# words ignored when comparing the key terms of two questions
+STOPWORDS = frozenset(
+    "a about an and any are can could do does for from get give in info "
+    "information is list me of on please show tell the to what which who with "
+    "would you".split()
+)
+
+
+@dataclass
+class AnswerCacheConfig:
+    """Matching threshold and size of the answer cache."""
+
+    enabled: bool = False
+    # cosine similarity of question vectors needed to replay an answer
+    threshold: float = 0.8
+    max_entries: int = 1024
+    # dimensions of the hashed n-gram vectors
+    dim: int = 2048
+    # answers are only replayed for the KG (and KGE model) they were computed on
+    version: str = "default/default"
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a config from EVOKG_ANSWER_CACHE* / version environment variables
+
+        Returns:
+          AnswerCacheConfig: The resolved configuration
+        """
+        return cls(
+            enabled=os.environ.get("EVOKG_ANSWER_CACHE", "0") == "1",
+            threshold=float(os.environ.get("EVOKG_ANSWER_CACHE_THRESHOLD", 0.8)),
+            max_entries=int(os.environ.get("EVOKG_ANSWER_CACHE_MAX_ENTRIES", 1024)),
+            version=(
+                f"{os.environ.get('EVOKG_KG_VERSION', 'default')}/"
+                f"{os.environ.get('EVOKG_MODEL_VERSION', 'default')}"
+            ),
+        )
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase a question and reduce it to space-separated words."""
+    return " ".join(re.sub(r"[^0-9a-z_]+", " ", str(text).lower()).split())
+
+
+def key_terms(text: str) -> frozenset:
+    """The words of a question that are not stopwords, without a plural "s"."""
+    return frozenset(
+        word[:-1] if len(word) > 3 and word.endswith("s") else word
+        for word in normalize_question(text).split()
+        if word not in STOPWORDS
+    )
+
+
+def same_terms(a: frozenset, b: frozenset, resolve=None) -> bool:
+    """
+    Whether two questions name the same things
+
+    Hashed vectors of "Get details about the gene TP53" and "... TP63", or of
+    "hypertension" and "hypotension", are nearly identical, so a cache hit also
+    needs the key terms of both questions to be equal. Spelling is not
+    guessed: with `resolve` (term -> entity id, see entity_resolver) the terms
+    only in one question may still match those only in the other when both
+    sets resolve to the same entities.
+    """
+    only_a, only_b = a - b, b - a
+    if not only_a and not only_b:
+        return True
+    if resolve is None or not only_a or not only_b:
+        return False
+    ids_a = {resolve(term) for term in only_a}
+    ids_b = {resolve(term) for term in only_b}
+    return None not in ids_a and ids_a == ids_b
+
+
+def entity_resolver(index):
+    """
+    Resolve a key term to the id of its best entity_index.EntityIndex match
+
+    Args:
+      index: The local entity index
+
+    Returns:
+      Callable: term -> entity id, or None when nothing matches
+    """
+
+    def resolve(term):
+        entities = [e for group in index.search(term, 1) for e in group["entities"]]
+        if not entities:
+            return None
+        return max(entities, key=lambda e: e["score"])["id"]
+
+    return resolve
+
+
+def embed(text: str, dim: int = 2048) -> np.ndarray:
+    """
+    Hashed n-gram vector of a question, L2-normalized
+
+    Word unigrams and bigrams carry the meaning; character trigrams of each word
+    absorb typos and inflections ("neoplasm" vs "neoplasms"). Features are hashed
+    with crc32 so vectors are stable across processes.
+
+    Args:
+      text: The question
+      dim: Vector dimensions
+
+    Returns:
+      np.ndarray: float32 vector of length dim
+    """
+    words = normalize_question(text).split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"#{word}#"
+        features += [padded[i : i + 3] for i in range(len(padded) - 2)]
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        vector[zlib.crc32(feature.encode()) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def replayable(messages: List[ChatMessage]) -> bool:
+    """
+    Whether a chat round can be replayed to another session
+
+    The round must end with an answer, and no tool call may have failed.
+    """
+    if not messages or messages[-1].role != ChatRole.ASSISTANT:
+        return False
+    if messages[-1].tool_calls or not messages[-1].text:
+        return False
+    for message in messages:
+        if message.role != ChatRole.FUNCTION:
+            continue
+        text = message.text or ""
+        if message.is_tool_call_error or text.startswith('{"error"'):
+            return False
+    return True
+
+
+class AnswerCache:
+    """
+    Process-wide cache of whole chat rounds, looked up by question similarity.
+
+    Many sessions open with the same few questions (e.g. the greeting's samples),
+    each costing several LLM completions and KG calls. A round's messages (tool
+    calls, tool results and the final answer) are stored under the hashed n-gram
+    vector of the question; a later question whose cosine similarity to a stored
+    one reaches the threshold, with the same key terms (see same_terms) and under
+    the same KG/model version, gets the stored messages replayed instead. Values
+    behind fetch_more cursors in the tool results are stored too, and put in the
+    replaying session's HandleStore with the cursors rewritten, so paging still
+    works. Vectors are rows of one dense matrix, so a lookup is a single
+    matrix-vector product; when full, the least recently used entry is replaced.
+    """
+
+    def __init__(self, config: Optional[AnswerCacheConfig] = None, resolve=None):
+        self.config = config or AnswerCacheConfig.from_env()
+        # optional term -> entity id for same_terms, e.g. entity_resolver
+        self.resolve = resolve
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, self.config.dim), dtype=np.float32)
+        # (question, key terms, version, [message JSON], {handle: value JSON})
+        self._entries = []
+        self._last_used = []
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.llm_calls_saved = 0
+        self.tool_calls_saved = 0
+
+    def _match(self, vector, terms) -> tuple:
+        # (row, similarity) of the closest matching entry, or (None, 0.0)
+        if not self._entries:
+            return None, 0.0
+        similarities = self._vectors[: len(self._entries)] @ vector
+        for row in np.argsort(-similarities).tolist():
+            if similarities[row] < self.config.threshold:
+                break
+            _, stored_terms, version, _, _ = self._entries[row]
+            if version == self.config.version and same_terms(
+                terms, stored_terms, self.resolve
+            ):
+                return row, float(similarities[row])
+        return None, 0.0
+
+    def lookup(
+        self, question: str, handles: HandleStore
+    ) -> Optional[List[ChatMessage]]:
+        """
+        Find the stored round of a question similar enough to this one
+
+        Args:
+          question: The user's question
+          handles: The replaying session's HandleStore, for the round's cursors
+
+        Returns:
+          Optional[list]: Fresh copies of the stored round's messages, or None
+        """
+        vector = embed(question, self.config.dim)
+        terms = key_terms(question)
+        with self._lock:
+            row, similarity = self._match(vector, terms)
+            if row is None:
+                self.misses += 1
+                return None
+            self._clock += 1
+            self._last_used[row] = self._clock
+            stored, _, _, texts, values = self._entries[row]
+            messages = [ChatMessage.model_validate_json(text) for text in texts]
+            self.hits += 1
+            self.llm_calls_saved += sum(
+                1 for m in messages if m.role == ChatRole.ASSISTANT
+            )
+            self.tool_calls_saved += sum(
+                1 for m in messages if m.role == ChatRole.FUNCTION
+            )
+        logging.info(f"Answer cache hit ({similarity:.3f}): {question!r} ~ {stored!r}")
+        if not values:
+            return messages
+
+        renamed = {old: handles.put(json.loads(value)) for old, value in values.items()}
+
+        def rename(match):
+            return f"{match.group(1)}{renamed[match.group(2)]}:"
+
+        return [
+            message.copy_with(content=SESSION_CURSOR.sub(rename, message.text))
+            if message.role == ChatRole.FUNCTION
+            else message
+            for message in messages
+        ]
+
+    def store(
+        self, question: str, messages: List[ChatMessage], handles: HandleStore
+    ) -> bool:
+        """
+        Store a completed round, replacing a stored near-duplicate question
+
+        Args:
+          question: The user's question
+          messages: The round's messages after the user's
+          handles: The session's HandleStore, holding the values behind cursors
+
+        Returns:
+          bool: Whether the round was stored
+        """
+        if not replayable(messages):
+            return False
+        values = {}
+        for message in messages:
+            if message.role != ChatRole.FUNCTION:
+                continue
+            for match in SESSION_CURSOR.finditer(message.text):
+                value = handles.get(match.group(2))
+                if value is None:
+                    return False
+                values[match.group(2)] = json.dumps(value)
+        vector = embed(question, self.config.dim)
+        terms = key_terms(question)
+        texts = [m.model_dump_json() for m in messages]
+        with self._lock:
+            row, _ = self._match(vector, terms)
+            if row is None and len(self._entries) < self.config.max_entries:
+                row = self._append_row()
+            elif row is None:
+                row = int(np.argmin(self._last_used))
+            self._clock += 1
+            self._vectors[row] = vector
+            self._entries[row] = (question, terms, self.config.version, texts, values)
+            self._last_used[row] = self._clock
+        return True
+
+    def _append_row(self) -> int:
+        # grow the vector matrix by doubling, up to max_entries rows
+        row = len(self._entries)
+        self._entries.append(None)
+        self._last_used.append(0)
+        if row >= len(self._vectors):
+            rows = min(max(2 * row, 16), self.config.max_entries)
+            grown = np.zeros((rows, self.config.dim), dtype=np.float32)
+            grown[:row] = self._vectors[:row]
+            self._vectors = grown
+        return row
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._last_used = []
+
+    def stats(self) -> dict:
+        """
+        Report the hit rate and the work replayed answers saved
+
+        Returns:
+          dict: Entries, hits, misses, hit rate, and LLM completions and tool
+                calls saved
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "llm_calls_saved": self.llm_calls_saved,
+                "tool_calls_saved": self.tool_calls_saved,
+            }
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """
+    Return the process-wide answer cache, or None unless EVOKG_ANSWER_CACHE=1
+
+    Returns:
+      Optional[AnswerCache]: The shared cache
+    """
+    config = AnswerCacheConfig.from_env()
+    if not config.enabled:
+        return None
+
+    def create():
+        index = get_entity_index()
+        resolve = entity_resolver(index) if index is not None else None
+        return AnswerCache(config, resolve)
+
+    return REGISTRY.get("answer_cache", create)
@@ -0,0 +1,98 @@
+"""
+Recall and latency of IVF approximate top-k against exact predict_tail.
+
+Builds a synthetic clustered embedding set (or loads an exported one), indexes it
+with ann_index.IvfIndex and reports recall@k and per-query latency for a range of
+nprobe values. Usage (from the repository root):
+
+    python -m benchmarks.bench_ann --entities 200000 --model TransE
+    python -m benchmarks.bench_ann --embeddings /path/to/export --index /path/to/ivf
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import IvfIndex
+from kge_scorer import EmbeddingScorer
+
+RELATIONS = ["GENE_DISEASE", "GENE_GENE", "CHEMICALENTITY_DISEASE", "PROTEIN_PROTEIN"]
+
+
+def synthetic_scorer(args):
+    # mixture of Gaussians, so the embeddings have cluster structure like trained ones
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+    labels = rng.integers(0, args.clusters, args.entities)
+    noise = rng.standard_normal((args.entities, args.dim), dtype=np.float32)
+    entities = centers[labels] + 0.3 * noise
+    relations = 0.3 * rng.standard_normal((len(RELATIONS), args.dim), dtype=np.float32)
+    entity_ids = [f"E{i}" for i in range(args.entities)]
+    return EmbeddingScorer(
+        args.model, entity_ids, entities, RELATIONS, relations, norm=args.norm
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--embeddings", default=None, help="kge_scorer export dir")
+    parser.add_argument("--index", default=None, help="Prebuilt IvfIndex dir")
+    parser.add_argument("--model", default="TransE")
+    parser.add_argument("--norm", type=int, default=2)
+    parser.add_argument("--entities", type=int, default=100_000)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        scorer = EmbeddingScorer.load(args.embeddings)
+    else:
+        scorer = synthetic_scorer(args)
+
+    start = time.perf_counter()
+    index = (
+        IvfIndex.load(args.index)
+        if args.index
+        else IvfIndex.build(scorer, nlist=args.nlist)
+    )
+    build = time.perf_counter() - start
+
+    rng = np.random.default_rng(args.seed + 1)
+    heads = rng.integers(0, len(scorer.entity_ids), args.queries)
+    rels = rng.integers(0, len(scorer.relations), args.queries)
+    queries = scorer.query_vectors(heads, rels)
+
+    start = time.perf_counter()
+    exact = []
+    for h, r in zip(heads, rels):
+        scores = scorer.score_tails([h], [r])[0]
+        exact.append(set(np.argpartition(-scores, args.k - 1)[: args.k].tolist()))
+    exact_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+    print(
+        f"{scorer.model} {len(scorer.entity_ids)} entities, nlist={index.nlist}, "
+        f"k={args.k}, {args.queries} queries, index build/load {build:.1f} s"
+    )
+    print(f"  exact            : recall 1.000  {exact_ms:7.2f} ms/query")
+    nprobe = 1
+    while nprobe <= index.nlist:
+        start = time.perf_counter()
+        hits = 0
+        for query, truth in zip(queries, exact):
+            found, _ = index.search(scorer, query, args.k, nprobe=nprobe)
+            hits += len(truth.intersection(found.tolist()))
+        ms = (time.perf_counter() - start) * 1000 / args.queries
+        recall = hits / (args.k * args.queries)
+        print(f"  ivf nprobe={nprobe:<5d}: recall {recall:.3f}  {ms:7.2f} ms/query")
+        if recall >= 0.999:
+            break
+        nprobe *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+End-to-end load benchmark: N concurrent scripted conversations through EvoKgAgent.
+
+The KG backend is benchmarks.mock_backend mounted on the agent's async client and
+the LLM is benchmarks.fake_engine replaying benchmarks/conversations.json, so no
+EvoKG server or OpenAI key is needed and runs are reproducible. Reports p50, p95
+and p99 turn latency, throughput, KG requests, LLM tokens and peak memory; use
+--json to save a baseline for later comparison. The disease_investigation script
+runs ten turns, so its older tool results are digested by context compaction;
+--keep-turns sets how many recent turns are kept whole (EVOKG_CONTEXT_KEEP_TURNS)
+and --script runs one script only. --backend neo4j answers the graph lookups
+with kg_backends.Neo4jBackend over benchmarks.mock_neo4j's in-memory driver and
+reports its round trips and unmatched rows. Usage (from the repository root):
+
+    python -m benchmarks.bench_conversations --conversations 50
+    python -m benchmarks.bench_conversations --conversations 200 --no-cache --json base.json
+    python -m benchmarks.bench_conversations --conversations 50 --answer-cache --stagger 0.5
+    python -m benchmarks.bench_conversations --conversations 50 --no-encoding
+    python -m benchmarks.bench_conversations --script disease_investigation --keep-turns 1
+    python -m benchmarks.bench_conversations --conversations 50 --backend neo4j
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import resource
+import time
+import tracemalloc
+
+import httpx
+import numpy as np
+
+from benchmarks.fake_engine import ScriptedEngine
+from benchmarks.mock_backend import MockKgBackend
+
+SCRIPTS = pathlib.Path(__file__).with_name("conversations.json")
+MOCK_API_BASE = "http://mock-evokg"
+
+
+async def converse(agent, script, latencies, delay=0.0):
+    await asyncio.sleep(delay)
+    for turn in script["turns"]:
+        start = time.perf_counter()
+        async for _ in agent.full_round(turn["user"]):
+            pass
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(args):
+    # the agent reads its backend and cache settings from the environment
+    os.environ["EVOKG_API_BASE"] = MOCK_API_BASE
+    if args.no_cache:
+        os.environ["EVOKG_CACHE"] = "0"
+    if args.answer_cache:
+        os.environ["EVOKG_ANSWER_CACHE"] = "1"
+    if args.no_encoding:
+        os.environ["EVOKG_RESULT_ENCODING"] = "0"
+    if args.keep_turns is not None:
+        os.environ["EVOKG_CONTEXT_KEEP_TURNS"] = str(args.keep_turns)
+    if args.backend == "neo4j":
+        os.environ["EVOKG_BACKEND"] = "neo4j"
+    from agents import EvoKgAgent
+    from kg_client import ClientConfig, get_async_client
+    from metrics import get_metrics
+    from resources import REGISTRY
+
+    backend = MockKgBackend(
+        args.entities, latency_scale=args.kg_latency_scale, seed=args.seed
+    )
+    client = get_async_client(
+        ClientConfig.from_env(), transport=httpx.MockTransport(backend.handle)
+    )
+    driver = None
+    if args.backend == "neo4j":
+        from benchmarks.mock_neo4j import InMemoryNeo4jDriver, synthetic_graph
+        from kg_backends import Neo4jBackend, Neo4jConfig
+
+        # a LAN round trip to the database, scaled like the REST latencies
+        driver = InMemoryNeo4jDriver(
+            synthetic_graph(backend, seed=args.seed),
+            latency=0.02 * args.kg_latency_scale,
+        )
+        REGISTRY.set(
+            "graph_backend",
+            Neo4jBackend(Neo4jConfig.from_env(), driver_factory=lambda c: driver),
+        )
+    scripts = json.loads(SCRIPTS.read_text())
+    if args.script:
+        scripts = [s for s in scripts if s["name"] == args.script]
+        if not scripts:
+            raise SystemExit(f"No script named {args.script} in {SCRIPTS.name}")
+    agents = [
+        EvoKgAgent(
+            ScriptedEngine(
+                scripts[i % len(scripts)], latency_scale=args.llm_latency_scale
+            )
+        )
+        for i in range(args.conversations)
+    ]
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            converse(agent, scripts[i % len(scripts)], latencies, i * args.stagger)
+            for i, agent in enumerate(agents)
+        )
+    )
+    wall = time.perf_counter() - start
+
+    counters = get_metrics().snapshot()["counters"]
+    tokens = {
+        row["labels"]["kind"]: row["value"]
+        for row in counters
+        if row["name"] == "evokg_llm_tokens_total"
+    }
+    prefetch = {
+        row["labels"]["result"]: row["value"]
+        for row in counters
+        if row["name"] == "evokg_prefetch_lookups_total"
+    }
+    result_tokens = {"raw": 0, "encoded": 0}
+    for row in get_metrics().snapshot()["histograms"]:
+        if row["name"] == "evokg_tool_result_tokens":
+            result_tokens[row["labels"]["stage"]] += row["sum"]
+    context = {}
+    for agent in agents:
+        for key, value in agent.compactor.stats().items():
+            context[key] = context.get(key, 0) + value
+    context["saved_ratio"] = round(
+        context["tokens_saved"] / context["tokens_in"] if context["tokens_in"] else 0, 3
+    )
+    answers = REGISTRY.peek("answer_cache")
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    results = {
+        "conversations": args.conversations,
+        "turns": len(latencies),
+        "wall_seconds": round(wall, 3),
+        "turns_per_second": round(len(latencies) / wall, 2),
+        "turn_latency_p50": round(float(p50), 4),
+        "turn_latency_p95": round(float(p95), 4),
+        "turn_latency_p99": round(float(p99), 4),
+        "kg_requests": dict(sorted(backend.requests.items())),
+        "kg_pool": client.pool_stats(),
+        "llm_tokens": tokens,
+        "context_compaction": context,
+        "tool_result_tokens": result_tokens,
+        "prefetch_lookups": prefetch,
+        "answer_cache": answers.stats() if answers is not None else None,
+        "neo4j": None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+    }
+    if driver is not None:
+        results["neo4j"] = dict(
+            REGISTRY.peek("graph_backend").stats(),
+            rows=driver.rows,
+            misses=driver.misses,
+        )
+    if args.tracemalloc:
+        results["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20)
+        tracemalloc.stop()
+
+    print(
+        f"{results['conversations']} conversations, {results['turns']} turns in "
+        f"{wall:.2f} s ({results['turns_per_second']} turns/s)"
+    )
+    print(
+        f"  turn latency p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, "
+        f"p99 {p99 * 1000:.0f} ms"
+    )
+    print(f"  KG requests: {sum(backend.requests.values())} {results['kg_requests']}")
+    if driver is not None:
+        stats = results["neo4j"]
+        print(
+            f"  Neo4j: {stats['queries']} lookups in {stats['round_trips']} round "
+            f"trips ({stats['rows_per_round_trip']} rows each), "
+            f"{stats['misses']} without a matching node"
+        )
+    print(f"  LLM tokens: {tokens}")
+    print(
+        f"  history tokens {context['tokens_in']} -> {context['tokens_out']} after "
+        f"compaction ({context['saved_ratio']:.1%} saved)"
+    )
+    if result_tokens["raw"]:
+        encoded_ratio = 1 - result_tokens["encoded"] / result_tokens["raw"]
+        print(
+            f"  tool result tokens {result_tokens['raw']:.0f} -> "
+            f"{result_tokens['encoded']:.0f} after encoding ({encoded_ratio:.1%} saved)"
+        )
+    if prefetch:
+        hits = prefetch.get("hit", 0) + prefetch.get("inflight", 0)
+        print(
+            f"  predict_tail prefetch: {hits}/{sum(prefetch.values())} served "
+            f"early {prefetch}"
+        )
+    if answers is not None:
+        stats = results["answer_cache"]
+        print(
+            f"  answer cache: {stats['hits']}/{stats['hits'] + stats['misses']} "
+            f"opening questions replayed, {stats['llm_calls_saved']} LLM calls and "
+            f"{stats['tool_calls_saved']} tool calls saved"
+        )
+    print(f"  peak RSS {results['peak_rss_mb']} MB")
+    if args.tracemalloc:
+        print(f"  peak traced Python memory {results['peak_traced_mb']} MB")
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--entities", type=int, default=20000)
+    parser.add_argument("--kg-latency-scale", type=float, default=1.0)
+    parser.add_argument("--llm-latency-scale", type=float, default=1.0)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--answer-cache", action="store_true")
+    parser.add_argument("--no-encoding", action="store_true")
+    parser.add_argument(
+        "--backend",
+        choices=("rest", "neo4j"),
+        default="rest",
+        help="Backend for the graph lookups (neo4j: in-memory driver)",
+    )
+    parser.add_argument(
+        "--keep-turns",
+        type=int,
+        default=None,
+        help="Recent turns whose tool results are kept whole (default: 2)",
+    )
+    parser.add_argument(
+        "--script", default=None, help="Run only the script with this name"
+    )
+    parser.add_argument(
+        "--stagger",
+        type=float,
+        default=0.0,
+        help="Seconds between conversation starts (default: all at once)",
+    )
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Write the results here")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
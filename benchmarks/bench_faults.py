@@ -0,0 +1,184 @@
+"""
+Fault-injection benchmark for the KG client's traffic layer (kg_traffic).
+
+Runs a fixed load of concurrent KG lookups through AsyncKgClient and the shared
+response cache against benchmarks.mock_backend.FaultyReplicas, once with the
+traffic layer (replica routing, adaptive limits, circuit breakers, hedging) and
+once without it (everything sent to the first replica), under each scenario:
+
+  slow      two replicas, 2% of requests stall for 1 s
+  outage    every replica answers 503 during the middle third of the run
+  down      the first replica refuses connections
+  overload  replicas serve 4 requests at a time and queue the rest
+
+Reports answered requests (stale ones separately), errors, requests failed fast,
+p50/p95/p99 latency and backend requests. Usage (from the repository root):
+
+    python -m benchmarks.bench_faults --requests 600 --concurrency 32
+    python -m benchmarks.bench_faults --scenario outage
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.mock_backend import FaultProfile, FaultyReplicas, MockKgBackend
+from kg_cache import CacheConfig, ResponseCache
+from kg_client import AsyncKgClient, ClientConfig
+from kg_traffic import BackendUnavailable, TrafficConfig
+from relation_catalog import CATALOG
+
+REPLICAS = ("http://replica-a", "http://replica-b")
+SCENARIOS = ("slow", "outage", "down", "overload")
+
+
+def profiles_for(scenario) -> dict:
+    if scenario == "slow":
+        profile = FaultProfile(slow_rate=0.02, slow_seconds=1.0)
+        return {"replica-a": profile, "replica-b": profile}
+    if scenario == "down":
+        return {"replica-a": FaultProfile(down=True), "replica-b": FaultProfile()}
+    if scenario == "overload":
+        profile = FaultProfile(capacity=4)
+        return {"replica-a": profile, "replica-b": profile}
+    return {"replica-a": FaultProfile(), "replica-b": FaultProfile()}
+
+
+def workload(n, seed) -> list:
+    # a few hundred distinct lookups, so some repeat past their (short) TTL
+    rng = np.random.default_rng(seed)
+    relation = list(CATALOG.relations)[0]
+    types = list(CATALOG.entity_types)
+    calls = []
+    for i in rng.integers(0, 300, n).tolist():
+        kind = i % 3
+        if kind == 0:
+            calls.append(("search_biological_entities", {"targetTerm": f"Entity {i}"}))
+        elif kind == 1:
+            calls.append(("get_nodes_by_label", {"label": types[i % len(types)]}))
+        else:
+            calls.append(
+                (
+                    "predict_tail",
+                    {"head": str(i), "relation": relation, "top_k_predictions": 10},
+                )
+            )
+    return calls
+
+
+async def run_once(args, scenario, traffic) -> dict:
+    backend = MockKgBackend(
+        args.entities, latency_scale=args.latency_scale, seed=args.seed
+    )
+    replicas = FaultyReplicas(backend, profiles_for(scenario), seed=args.seed)
+    config = ClientConfig(
+        api_base=REPLICAS[0],
+        replicas=REPLICAS if traffic else (),
+        # short timeouts keep a run to seconds; the ratios are what matter
+        endpoint_timeouts={},
+        default_timeout=2.0,
+        traffic=TrafficConfig(enabled=traffic, open_seconds=1.0, max_wait=0.5),
+    )
+    client = AsyncKgClient(config, transport=httpx.MockTransport(replicas.handle))
+    cache = ResponseCache(
+        CacheConfig(
+            ttls={
+                endpoint: args.ttl
+                for endpoint in (
+                    "search_biological_entities",
+                    "get_nodes_by_label",
+                    "predict_tail",
+                )
+            },
+        )
+    )
+    calls = workload(args.requests, args.seed)
+    queue = asyncio.Queue()
+    for call in calls:
+        queue.put_nowait(call)
+    latencies, results = [], {"ok": 0, "error": 0, "fast_fail": 0}
+    start = time.perf_counter()
+    outage = (args.duration / 3, 2 * args.duration / 3)
+
+    async def worker():
+        while not queue.empty():
+            endpoint, params = queue.get_nowait()
+            if scenario == "outage":
+                elapsed = time.perf_counter() - start
+                failing = outage[0] <= elapsed < outage[1]
+                for profile in replicas.profiles.values():
+                    profile.error_rate = 1.0 if failing else 0.0
+            sent = time.perf_counter()
+            try:
+                await cache.get_or_fetch(
+                    endpoint,
+                    params,
+                    lambda: client.get_json(endpoint, params=params),
+                )
+                results["ok"] += 1
+            except BackendUnavailable:
+                results["fast_fail"] += 1
+            except Exception:
+                results["error"] += 1
+            latencies.append(time.perf_counter() - sent)
+            # spread the load over about args.duration seconds
+            await asyncio.sleep(args.duration * args.concurrency / args.requests)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return dict(
+        results,
+        stale=cache.stats()["stale"],
+        p50=p50,
+        p95=p95,
+        p99=p99,
+        elapsed=elapsed,
+        backend=sum(c.get("requests", 0) for c in replicas.counts.values()),
+        traffic=client.traffic.stats(),
+    )
+
+
+async def run(args):
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    print(
+        f"{args.requests} lookups, {args.concurrency} concurrent, "
+        f"~{args.duration:.0f} s per run, cache TTL {args.ttl:.1f} s"
+    )
+    print(
+        f"  {'scenario':9} {'traffic':8} {'ok':>5} {'stale':>5} {'error':>5} "
+        f"{'fast':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'backend':>8}"
+    )
+    for scenario in scenarios:
+        for traffic in (False, True):
+            r = await run_once(args, scenario, traffic)
+            print(
+                f"  {scenario:9} {'on' if traffic else 'off':8} {r['ok']:5d} "
+                f"{r['stale']:5d} {r['error']:5d} {r['fast_fail']:5d} "
+                f"{r['p50']:8.1f} {r['p95']:8.1f} {r['p99']:8.1f} {r['backend']:8d}"
+            )
+            if traffic and args.verbose:
+                for key, stats in r["traffic"]["endpoints"].items():
+                    print(f"      {key}: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", choices=("all", *SCENARIOS), default="all")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=6.0)
+    parser.add_argument("--ttl", type=float, default=1.0)
+    parser.add_argument("--entities", type=int, default=5000)
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
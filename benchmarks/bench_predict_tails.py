@@ -0,0 +1,85 @@
+"""
+Compare N single predict_tail requests with one predict_tail_batch request.
+
+Runs against the in-process LocalKgBackend mounted on the async KG client, so no
+EvoKG server is needed. Usage (from the repository root):
+
+    python -m benchmarks.bench_predict_tails --queries 20 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+from kg_client import AsyncKgClient, ClientConfig
+from local_backend import LocalKgBackend
+
+RELATIONS = ["CHEMICALENTITY_DISEASE", "GENE_DISEASE", "GENE_GENE", "PROTEIN_PROTEIN"]
+
+
+async def run(args):
+    backend = LocalKgBackend.random(
+        args.entities, args.dim, RELATIONS, latency=args.latency
+    )
+    client = AsyncKgClient(
+        ClientConfig(api_base="http://local-backend"),
+        transport=httpx.MockTransport(backend.handle),
+    )
+    rng = np.random.default_rng(1)
+    queries = [
+        {
+            "head": backend.entity_ids[i],
+            "relation": RELATIONS[j],
+            "top_k_predictions": args.k,
+        }
+        for i, j in zip(
+            rng.integers(0, args.entities, args.queries),
+            rng.integers(0, len(RELATIONS), args.queries),
+        )
+    ]
+
+    start = time.perf_counter()
+    for query in queries:
+        await client.get_json("predict_tail", params=query)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(client.get_json("predict_tail", params=query) for query in queries)
+    )
+    concurrent = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = await client.post_json("predict_tail_batch", {"queries": queries})
+    batched = time.perf_counter() - start
+    assert len(response["results"]) == len(queries)
+
+    start = time.perf_counter()
+    backend.scorer.predict_tail_batch(queries)
+    scoring = time.perf_counter() - start
+
+    print(
+        f"{args.queries} queries, {args.entities} entities x {args.dim} dims, "
+        f"k={args.k}, simulated latency {args.latency * 1000:.0f} ms/request"
+    )
+    print(f"  sequential predict_tail : {sequential * 1000:8.1f} ms")
+    print(f"  concurrent predict_tail : {concurrent * 1000:8.1f} ms")
+    print(f"  one predict_tail_batch  : {batched * 1000:8.1f} ms")
+    print(f"  batch scoring only      : {scoring * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--entities", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare the scripted-conversation benchmark with and without result encoding.
+
+Runs benchmarks.bench_conversations twice in fresh processes, with compact tool
+result encoding (result_encoding) off and then on, and reports the LLM prompt
+tokens and turn latency per conversation and what encoding saved. Usage (from
+the repository root):
+
+    python -m benchmarks.bench_result_encoding --conversations 50
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+
+
+def bench(args, encoding: bool) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as out:
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.bench_conversations",
+            "--conversations",
+            str(args.conversations),
+            "--kg-latency-scale",
+            str(args.kg_latency_scale),
+            "--llm-latency-scale",
+            str(args.llm_latency_scale),
+            "--json",
+            out.name,
+        ]
+        if not encoding:
+            command.append("--no-encoding")
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(out.name) as f:
+            return json.load(f)
+
+
+def per_conversation(results) -> dict:
+    n = results["conversations"]
+    return {
+        "prompt_tokens": results["llm_tokens"].get("prompt", 0) / n,
+        "history_tokens": results["context_compaction"]["tokens_out"] / n,
+        "turn_latency_p50": results["turn_latency_p50"] * 1000,
+        "turn_latency_p95": results["turn_latency_p95"] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--kg-latency-scale", type=float, default=1.0)
+    parser.add_argument("--llm-latency-scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    raw = per_conversation(bench(args, encoding=False))
+    encoded = per_conversation(bench(args, encoding=True))
+    print(f"{args.conversations} conversations, per conversation:")
+    print(f"  {'':18} {'raw':>10} {'encoded':>10} {'saved':>8}")
+    for key, unit in (
+        ("prompt_tokens", ""),
+        ("history_tokens", ""),
+        ("turn_latency_p50", " ms"),
+        ("turn_latency_p95", " ms"),
+    ):
+        before, after = raw[key], encoded[key]
+        saved = 1 - after / before if before else 0.0
+        print(f"  {key + unit:18} {before:10.1f} {after:10.1f} {saved:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
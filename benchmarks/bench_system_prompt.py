@@ -0,0 +1,141 @@
+"""
+Compare the per-request prompt size and latency of the legacy and generated system prompts.
+
+The legacy prompt (benchmarks/legacy_system_prompt.txt) inlined the whole relation
+listing; the current one is built from the relation catalog and leaves details to
+the list_relations tool. Tokens are counted with tiktoken's o200k_base encoding
+(gpt-4o-mini) when it is installed, otherwise estimated as characters / 4. With
+--live and OPENAI_API_KEY set, each prompt is also sent to gpt-4o-mini to measure
+time to a one-token answer and the prompt tokens billed. Usage (from the
+repository root):
+
+    python -m benchmarks.bench_system_prompt --turns 10 --requests-per-turn 3
+    python -m benchmarks.bench_system_prompt --live --trials 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import statistics
+import time
+
+from kani import ChatMessage
+from kani.engines.base import BaseEngine
+
+from agents import EvoKgAgent, build_system_prompt
+
+LEGACY_PROMPT = pathlib.Path(__file__).with_name("legacy_system_prompt.txt")
+QUESTION = "Get details about the disease Stomach Neoplasms."
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+
+    TOKENIZER = "tiktoken o200k_base"
+except ImportError:
+
+    def count_tokens(text: str) -> int:
+        return (len(text) + 3) // 4
+
+    TOKENIZER = "estimate (chars / 4)"
+
+
+class _NullEngine(BaseEngine):
+    # only used to construct the agent and read its function schemas
+    max_context_size = 128000
+
+    def message_len(self, message):
+        return 0
+
+    def prompt_len(self, messages, functions=None, **kwargs):
+        return 0
+
+    async def predict(self, messages, functions=None, **hyperparams):
+        raise NotImplementedError
+
+
+def function_tokens(functions) -> int:
+    return count_tokens(
+        json.dumps(
+            [
+                {"name": f.name, "description": f.desc, "parameters": f.json_schema}
+                for f in functions
+            ]
+        )
+    )
+
+
+async def time_live(system_prompt, functions, trials):
+    from kani.engines.openai import OpenAIEngine
+
+    engine = OpenAIEngine(os.environ["OPENAI_API_KEY"], model="gpt-4o-mini")
+    messages = [ChatMessage.system(system_prompt), ChatMessage.user(QUESTION)]
+    latencies, prompt_tokens = [], None
+    try:
+        for _ in range(trials):
+            start = time.perf_counter()
+            completion = await engine.predict(messages, functions, max_tokens=1)
+            latencies.append(time.perf_counter() - start)
+            prompt_tokens = completion.prompt_tokens
+    finally:
+        await engine.close()
+    return statistics.median(latencies), prompt_tokens
+
+
+async def run(args):
+    agent = EvoKgAgent(_NullEngine())
+    functions = list(agent.functions.values())
+    legacy_functions = [f for f in functions if f.name != "list_relations"]
+    variants = {
+        "legacy": (LEGACY_PROMPT.read_text().strip(), legacy_functions),
+        "generated": (build_system_prompt(), functions),
+    }
+
+    print(f"tokenizer: {TOKENIZER}")
+    totals = {}
+    for name, (prompt, funcs) in variants.items():
+        prompt_tokens = count_tokens(prompt)
+        tool_tokens = function_tokens(funcs)
+        totals[name] = prompt_tokens + tool_tokens
+        print(
+            f"  {name:9s}: {len(prompt):5d} chars, {prompt_tokens:5d} prompt tokens "
+            f"+ {tool_tokens:5d} tool-schema tokens = {totals[name]:5d} per request"
+        )
+
+    requests = args.turns * args.requests_per_turn
+    saved = totals["legacy"] - totals["generated"]
+    print(
+        f"  saved per request: {saved} tokens "
+        f"({100 * saved / totals['legacy']:.1f}%); over {args.turns} turns x "
+        f"{args.requests_per_turn} requests: {saved * requests} tokens"
+    )
+
+    if args.live:
+        if not os.environ.get("OPENAI_API_KEY"):
+            print("--live needs OPENAI_API_KEY; skipping latency measurement")
+            return
+        for name, (prompt, funcs) in variants.items():
+            latency, billed = await time_live(prompt, funcs, args.trials)
+            print(
+                f"  {name:9s}: median {latency * 1000:7.1f} ms to first token, "
+                f"{billed} prompt tokens billed"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--requests-per-turn", type=int, default=3)
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--trials", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
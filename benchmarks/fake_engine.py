@@ -0,0 +1,98 @@
+"""
+Scripted stand-in for the OpenAI engine, replaying recorded tool-call sequences.
+
+A script is a list of turns; each turn has the user's message and the model's
+steps, where a step is either a list of tool calls ({"name", "arguments"}) issued
+together or the final answer text. The engine is stateless: the step to replay is
+derived from the chat history it is given (turn = number of user messages, step =
+assistant messages since the last one), so any number of agents can share a
+script. Latency follows a simple time-to-first-token + per-token model with token
+counts estimated as characters / 4.
+"""
+
+import asyncio
+import json
+
+from kani import ChatMessage, ChatRole
+from kani.engines.base import BaseEngine, Completion
+from kani.models import FunctionCall, ToolCall
+
+
+def estimate_tokens(text) -> int:
+    return (len(text or "") + 3) // 4
+
+
+class ScriptedEngine(BaseEngine):
+    max_context_size = 128000
+
+    def __init__(
+        self,
+        script: dict,
+        ttft: float = 0.35,
+        prompt_token_latency: float = 2e-5,
+        output_token_latency: float = 0.01,
+        latency_scale: float = 1.0,
+    ):
+        self.script = script
+        self.ttft = ttft
+        self.prompt_token_latency = prompt_token_latency
+        self.output_token_latency = output_token_latency
+        self.latency_scale = latency_scale
+        self._function_tokens = None
+
+    def message_len(self, message: ChatMessage) -> int:
+        tokens = estimate_tokens(message.text) + 4
+        for call in message.tool_calls or []:
+            tokens += estimate_tokens(call.function.name + call.function.arguments)
+        return tokens
+
+    def function_tokens(self, functions) -> int:
+        if self._function_tokens is None:
+            self._function_tokens = estimate_tokens(
+                json.dumps(
+                    [
+                        {"name": f.name, "desc": f.desc, "parameters": f.json_schema}
+                        for f in functions or []
+                    ]
+                )
+            )
+        return self._function_tokens
+
+    def prompt_len(self, messages, functions=None, **kwargs) -> int:
+        return sum(map(self.message_len, messages)) + self.function_tokens(functions)
+
+    def next_step(self, messages):
+        users = [i for i, m in enumerate(messages) if m.role == ChatRole.USER]
+        turns = self.script["turns"]
+        turn = turns[(len(users) - 1) % len(turns)]
+        since_user = messages[users[-1] + 1 :] if users else messages
+        step = sum(1 for m in since_user if m.role == ChatRole.ASSISTANT)
+        return turn["steps"][min(step, len(turn["steps"]) - 1)]
+
+    async def predict(self, messages, functions=None, **hyperparams) -> Completion:
+        step = self.next_step(messages)
+        if isinstance(step, str):
+            message = ChatMessage.assistant(step)
+        else:
+            message = ChatMessage.assistant(
+                None,
+                tool_calls=[
+                    ToolCall.from_function_call(
+                        FunctionCall.with_args(call["name"], **call["arguments"])
+                    )
+                    for call in step
+                ],
+            )
+        prompt_tokens = self.prompt_len(messages, functions)
+        completion_tokens = self.message_len(message)
+        await asyncio.sleep(
+            self.latency_scale
+            * (
+                self.ttft
+                + prompt_tokens * self.prompt_token_latency
+                + completion_tokens * self.output_token_latency
+            )
+        )
+        return Completion(
+            message, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
@@ -0,0 +1,345 @@
+"""
+Mock EvoKG backend implementing every endpoint the agent calls.
+
+Latencies and payload sizes are drawn from log-normal distributions whose medians
+and spreads follow what the production server shows for each endpoint (e.g. a few
+tens of ms for search, hundreds for subgraph; hub entities with thousands of
+neighbours). Payloads are deterministic per request parameters, so repeated runs
+are reproducible. Prediction endpoints are served by local_backend.LocalKgBackend.
+
+Mount in-process with httpx.MockTransport(backend.handle), or serve over HTTP.
+FaultyReplicas serves one backend as several replicas with injected faults.
+
+
+    python -m benchmarks.mock_backend --port 1026
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+
+from kge_scorer import ENDPOINTS, EmbeddingScorer
+from local_backend import LocalKgBackend
+from relation_catalog import CATALOG
+
+# endpoint -> (median latency in seconds, log-normal sigma)
+LATENCIES = {
+    "hello_world": (0.005, 0.2),
+    "search_biological_entities": (0.04, 0.5),
+    "get_nodes_by_label": (0.06, 0.5),
+    "sample_triples": (0.05, 0.4),
+    "check_relationship": (0.08, 0.5),
+    "subgraph": (0.25, 0.8),
+    "entity_relationships": (0.15, 0.8),
+    "find_paths": (0.3, 0.7),
+    "predict_tail": (0.12, 0.4),
+    "predict_tail_batch": (0.2, 0.4),
+    "get_prediction_rank": (0.12, 0.4),
+    "prediction_rank_batch": (0.2, 0.4),
+}
+# neighbourhood sizes: log-normal with this median and sigma, capped
+NEIGHBOURS = (120, 1.2, 5000)
+SEQUENCE_CHANCE = 0.2
+
+
+def _seed(*parts) -> int:
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8)
+    return int.from_bytes(digest.digest(), "little")
+
+
+class MockKgBackend:
+    """httpx.MockTransport handler standing in for the EvoKG REST server."""
+
+    def __init__(
+        self,
+        n_entities=20000,
+        dim=64,
+        latency_scale=1.0,
+        seed=0,
+    ):
+        self.types = list(CATALOG.entity_types)
+        # model_ids are the entity indices, as in entity() below
+        rng = np.random.default_rng(seed)
+        relations = list(CATALOG.relations)
+        scorer = EmbeddingScorer(
+            "DistMult",
+            [str(i) for i in range(n_entities)],
+            rng.standard_normal((n_entities, dim), dtype=np.float32),
+            relations,
+            rng.standard_normal((len(relations), dim), dtype=np.float32),
+        )
+        self.predictions = LocalKgBackend(scorer)
+        self.n_entities = n_entities
+        self.latency_scale = latency_scale
+        self.rng = np.random.default_rng(seed)
+        self.requests = {}
+
+    def entity(self, i, rng=None) -> dict:
+        i = int(i) % self.n_entities
+        entity = {
+            "id": f"EVO:{i:07d}",
+            "name": f"Entity {i}",
+            "label": self.types[i % len(self.types)],
+            "model_id": str(i),
+            "description": f"Synthetic description of entity {i}. " * 4,
+        }
+        if rng is not None and rng.random() < SEQUENCE_CHANCE:
+            entity["sequence"] = "".join(rng.choice(list("ACGT"), 2000))
+        return entity
+
+    def index_of(self, value) -> int:
+        # names/ids map onto entities deterministically
+        digits = "".join(ch for ch in str(value) if ch.isdigit())
+        return int(digits) if digits else _seed(value) % self.n_entities
+
+    def neighbours(self, rng):
+        median, sigma, cap = NEIGHBOURS
+        return int(min(cap, rng.lognormal(np.log(median), sigma)))
+
+    def relations_of(self, label):
+        return CATALOG.relations_for(label, "any") or list(CATALOG.relations)
+
+    def body(self, endpoint, params) -> dict:
+        rng = np.random.default_rng(_seed(endpoint, sorted(params.items())))
+        if endpoint == "hello_world":
+            return {"message": "Hello, World!"}
+
+        if endpoint == "search_biological_entities":
+            # entity i has label types[i % 12]; list the three closest per label,
+            # the searched entity's label (and so the entity itself) first
+            match = self.index_of(params["targetTerm"])
+            base = match - match % len(self.types)
+            others = [t for t in range(len(self.types)) if t != match % len(self.types)]
+            labels = [match % len(self.types), *rng.choice(others, 2, replace=False)]
+            return [
+                {
+                    "label": self.types[label],
+                    "entities": [
+                        {
+                            k: v
+                            for k, v in self.entity(
+                                base + label + j * len(self.types)
+                            ).items()
+                            if k != "description"
+                        }
+                        for j in range(3)
+                    ],
+                }
+                for label in labels
+            ]
+
+        if endpoint == "get_nodes_by_label":
+            start = int(rng.integers(self.n_entities))
+            label = params["label"]
+            if label in self.types:
+                start += self.types.index(label) - start % len(self.types)
+            return [self.entity(start + len(self.types) * j, rng) for j in range(25)]
+
+        if endpoint == "sample_triples":
+            relation = CATALOG.get(params["rel_type"])
+            return [
+                {
+                    "head": self.entity(rng.integers(self.n_entities))["name"],
+                    "relation": params["rel_type"],
+                    "tail": self.entity(rng.integers(self.n_entities))["name"],
+                    "tail_type": relation.tail if relation else None,
+                }
+                for _ in range(10)
+            ]
+
+        if endpoint == "check_relationship":
+            exists = bool(rng.random() < 0.5)
+            relations = CATALOG.relations_for(params["entity1_type"], "head")
+            return {
+                "exists": exists,
+                "relationship_types": list(rng.choice(relations, 1)) if exists else [],
+            }
+
+        if endpoint == "find_paths":
+            # a few shortest paths through random intermediate entities
+            ends = [self.entity(self.index_of(params[k])) for k in ("source", "target")]
+            hops = int(rng.integers(1, int(params.get("max_hops", 3)) + 1))
+            relations = params.get("allowed_relations", "").split(",")
+            if not relations[0]:
+                relations = list(CATALOG.relations)
+            paths = []
+            for _ in range(int(rng.integers(1, 6))):
+                middle = [
+                    self.entity(i) for i in rng.integers(self.n_entities, size=hops - 1)
+                ]
+                nodes = [ends[0]] + middle + [ends[1]]
+                paths.append(
+                    [
+                        {
+                            "head": a["id"],
+                            "relation": str(rng.choice(relations)),
+                            "tail": b["id"],
+                        }
+                        for a, b in zip(nodes, nodes[1:])
+                    ]
+                )
+            return {
+                "source": ends[0]["id"],
+                "target": ends[1]["id"],
+                "hops": hops,
+                "paths": paths,
+            }
+
+        if endpoint in ("subgraph", "entity_relationships"):
+            center = self.entity(self.index_of(params["property_value"]))
+            n = self.neighbours(rng)
+            relations = self.relations_of(params.get("entity_type", center["label"]))
+            if params.get("relationship_type"):
+                relations = [params["relationship_type"]]
+            others = rng.integers(self.n_entities, size=n)
+            types = rng.choice(relations, n)
+            if endpoint == "subgraph":
+                return {
+                    "start_node": center,
+                    "nodes": [self.entity(i, rng) for i in others],
+                    "relationships": [
+                        {"type": t, "start": center["id"], "end": self.entity(i)["id"]}
+                        for i, t in zip(others, types)
+                    ],
+                }
+            return {
+                "entity": center["name"],
+                "count": n,
+                "relationships": [
+                    {"relationship_type": t, "related_entity": self.entity(i, rng)}
+                    for i, t in zip(others, types)
+                ],
+            }
+        return None
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        endpoint = request.url.path.strip("/")
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        median, sigma = LATENCIES.get(endpoint, (0.05, 0.5))
+        if self.latency_scale:
+            delay = self.rng.lognormal(np.log(median), sigma) * self.latency_scale
+            await asyncio.sleep(delay)
+
+        if endpoint in ENDPOINTS:
+            return await self.predictions.handle(request)
+        try:
+            body = self.body(endpoint, dict(request.url.params))
+        except KeyError as e:
+            return httpx.Response(422, json={"detail": f"Missing parameter {e}"})
+        if body is None:
+            return httpx.Response(404, json={"detail": f"Unknown endpoint {endpoint}"})
+        return httpx.Response(200, json=body)
+
+
+@dataclass
+class FaultProfile:
+    """Faults injected into one replica's responses."""
+
+    # share of requests answered 503
+    error_rate: float = 0.0
+    # share of requests delayed by slow_seconds (a GC pause, a cold cache)
+    slow_rate: float = 0.0
+    slow_seconds: float = 1.0
+    # connections refused
+    down: bool = False
+    # requests served concurrently; the rest queue (0: unlimited)
+    capacity: int = 0
+
+
+class FaultyReplicas:
+    """
+    httpx.MockTransport handler serving a MockKgBackend as several replicas.
+
+    Requests are routed by URL host ("http://<replica>/<endpoint>"), and each
+    replica injects the faults of its FaultProfile, which can be changed while a
+    benchmark runs. Per-replica request and fault counts are kept in `counts`.
+    """
+
+    def __init__(self, backend: MockKgBackend, profiles: dict, seed=0):
+        self.backend = backend
+        self.profiles = dict(profiles)
+        self.rng = np.random.default_rng(seed)
+        self.counts = {name: {} for name in self.profiles}
+        self._slots = {}
+
+    def _count(self, replica, what):
+        counts = self.counts.setdefault(replica, {})
+        counts[what] = counts.get(what, 0) + 1
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        replica = request.url.host
+        profile = self.profiles.get(replica, FaultProfile())
+        self._count(replica, "requests")
+        if profile.down:
+            self._count(replica, "refused")
+            raise httpx.ConnectError("Connection refused", request=request)
+        slots = self._slots.get(replica)
+        if slots is None and profile.capacity:
+            slots = self._slots[replica] = asyncio.Semaphore(profile.capacity)
+        if slots is None:
+            return await self._serve(replica, profile, request)
+        async with slots:
+            return await self._serve(replica, profile, request)
+
+    async def _serve(self, replica, profile, request):
+        if self.rng.random() < profile.slow_rate:
+            self._count(replica, "slow")
+            await asyncio.sleep(profile.slow_seconds)
+        if self.rng.random() < profile.error_rate:
+            self._count(replica, "503")
+            return httpx.Response(503, json={"detail": "Injected failure"})
+        return await self.backend.handle(request)
+
+
+def serve_http(backend: MockKgBackend, port: int, host: str = "127.0.0.1"):
+    """Serve the mock over real HTTP (one event loop per request thread)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _forward(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            request = httpx.Request(
+                method,
+                f"http://{host}:{port}{self.path}",
+                content=self.rfile.read(length) if length else b"",
+            )
+            response = asyncio.run(backend.handle(request))
+            body = response.read()
+            self.send_response(response.status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._forward("GET")
+
+        def do_POST(self):
+            self._forward("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    logging.info(f"Mock EvoKG backend on http://{host}:{port}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=1026)
+    parser.add_argument("--entities", type=int, default=20000)
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    backend = MockKgBackend(args.entities, latency_scale=args.latency_scale)
+    serve_http(backend, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+In-memory stand-in for a neo4j.AsyncDriver, for exercising kg_backends.Neo4jBackend
+without a database.
+
+Only the Cypher templates of kg_backends are understood: each starts with a
+"// evokg:<endpoint> key=value ..." comment naming the template and its labels and
+properties, and the UNWIND rows are answered from a graph_store.CsrGraph with
+the records the real query returns. Every execute_query call is one round trip,
+with an optional simulated latency, so tests can check batching. Usage:
+
+    graph = CsrGraph.from_tsv("edges.tsv", "nodes.tsv")
+    backend = Neo4jBackend(config, driver_factory=lambda c: InMemoryNeo4jDriver(graph))
+
+synthetic_graph() builds a graph over benchmarks.mock_backend's entities, and
+`python -m benchmarks.bench_conversations --backend neo4j` runs the scripted
+conversations with their graph lookups answered this way, reporting round trips.
+
+Against a real database instead, run a local container and point EVOKG_NEO4J_URI
+at it:
+
+    docker run -p 7687:7687 -e NEO4J_AUTH=neo4j/password neo4j:5
+"""
+
+import asyncio
+
+import numpy as np
+
+from benchmarks.mock_backend import MockKgBackend
+from graph_store import CsrGraph
+from relation_catalog import CATALOG
+
+
+class Record(dict):
+    """The part of neo4j.Record that Neo4jBackend uses."""
+
+    def data(self) -> dict:
+        return dict(self)
+
+
+def parse_tag(query) -> tuple:
+    # "// evokg:subgraph property=name" -> ("subgraph", {"property": "name"})
+    words = query.split("\n", 1)[0].replace("\\", " ").split()
+    if len(words) < 2 or not words[1].startswith("evokg:"):
+        raise ValueError("Not a kg_backends query template")
+    return words[1][len("evokg:") :], dict(w.split("=", 1) for w in words[2:])
+
+
+def synthetic_graph(backend: MockKgBackend, degree=8, seed=0) -> CsrGraph:
+    """
+    A graph over a MockKgBackend's entities, with the same ids, names and labels
+
+    Args:
+      backend: The mock REST backend whose entities become the nodes
+      degree: Edges starting at each entity
+      seed: RNG seed
+
+    Returns:
+      CsrGraph: Edges of catalog relations from each entity to random entities of
+                the relation's tail type
+    """
+    rng = np.random.default_rng(seed)
+    types = backend.types
+    n = backend.n_entities
+    nodes, triples = [], []
+    for i in range(n):
+        entity = backend.entity(i)
+        nodes.append((entity["id"], entity["name"], entity["label"]))
+        relations = CATALOG.relations_for(entity["label"], "head")
+        if not relations:
+            continue
+        for relation in rng.choice(relations, degree):
+            # entity j has label types[j % len(types)]
+            offset = types.index(CATALOG.tail_type(relation))
+            j = int(rng.integers((n - offset - 1) // len(types) + 1)) * len(types)
+            triples.append(
+                (entity["id"], str(relation), backend.entity(j + offset)["id"])
+            )
+    return CsrGraph.from_triples(triples, nodes)
+
+
+class InMemoryNeo4jDriver:
+    def __init__(self, graph: CsrGraph, latency: float = 0.0):
+        self.graph = graph
+        self.latency = latency
+        self.round_trips = 0
+        self.rows = 0
+        # rows without a matching node (answered with a LookupError)
+        self.misses = 0
+        self.closed = False
+
+    async def execute_query(self, query, parameters_=None, **kwargs):
+        endpoint, spec = parse_tag(query)
+        parameters = parameters_ or {}
+        limit = parameters.get("max_neighbours")
+        self.round_trips += 1
+        self.rows += len(parameters["rows"])
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        records = []
+        for row in parameters["rows"]:
+            data = self.answer(endpoint, spec, row, limit)
+            if data is None:
+                self.misses += 1
+            else:
+                records.append(Record(data, i=row["i"]))
+        return records, None, list(records[0]) if records else []
+
+    def answer(self, endpoint, spec, row, limit):
+        graph = self.graph
+        if endpoint == "subgraph":
+            data = graph.subgraph(spec["property"], row["value"])
+            if data is not None:
+                data["nodes"] = data["nodes"][:limit]
+                data["relationships"] = data["relationships"][:limit]
+            return data
+        if endpoint == "entity_relationships":
+            data = graph.entity_relationships(
+                spec["label"], spec["property"], row["value"], row["relationship_type"]
+            )
+            if data is not None:
+                data["relationships"] = data["relationships"][:limit]
+            return data
+        if endpoint == "check_relationship":
+            data = graph.check_relationship(
+                spec["label1"],
+                spec["property1"],
+                row["value1"],
+                spec["label2"],
+                spec["property2"],
+                row["value2"],
+            )
+            return {"relationship_types": (data or {}).get("relationship_types", [])}
+        raise ValueError(f"Unknown template {endpoint}")
+
+    async def close(self):
+        self.closed = True
@@ -0,0 +1,282 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from kani import ChatMessage, ChatRole
+
+from result_encoding import is_table
+
+# scalar keys kept in a digest: identifiers the follow-up guidelines reuse
+# (model_id, id, name), scores and ranks, counts and paging cursors
+KEEP_KEYS = {
+    "id",
+    "name",
+    "model_id",
+    "label",
+    "type",
+    "entity",
+    "head",
+    "relation",
+    "tail",
+    "source",
+    "target",
+    "start",
+    "end",
+    "relationship_type",
+    "relationship_types",
+    "exists",
+    "score",
+    "rank",
+    "hops",
+    "total",
+    "count",
+    "returned",
+    "seen",
+    "next_cursor",
+    "next_offset",
+    "cursor",
+    "error",
+}
+DIGEST_PREFIX = "[older tool result, compacted; call the tool again for full data] "
+
+
+@dataclass
+class CompactionConfig:
+    """Token budget and digest sizes for a session's chat history."""
+
+    enabled: bool = True
+    # estimated tokens of chat history sent with each LLM request
+    budget: int = 8000
+    # most recent user turns (the current one included) whose tool results are
+    # sent as is while the history fits the budget
+    keep_turns: int = 2
+    # list items and string characters kept per value in a digest
+    digest_items: int = 3
+    digest_chars: int = 80
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a config from EVOKG_CONTEXT_* environment variables
+
+        Returns:
+          CompactionConfig: The resolved configuration
+        """
+        return cls(
+            enabled=os.environ.get("EVOKG_CONTEXT_COMPACTION", "1") != "0",
+            budget=int(os.environ.get("EVOKG_CONTEXT_BUDGET", 8000)),
+            keep_turns=int(os.environ.get("EVOKG_CONTEXT_KEEP_TURNS", 2)),
+            digest_items=int(os.environ.get("EVOKG_CONTEXT_DIGEST_ITEMS", 3)),
+        )
+
+
+def estimate_tokens(message: ChatMessage) -> int:
+    """Rough token count of a message: characters / 4 plus per-message overhead."""
+    chars = len(message.text or "")
+    for call in message.tool_calls or []:
+        chars += len(call.function.name) + len(call.function.arguments)
+    return chars // 4 + 4
+
+
+def digest_value(value, items: int = 3, chars: int = 80):
+    """
+    Reduce a decoded tool result to the fields later turns refer back to
+
+    Dicts keep only KEEP_KEYS scalars and the non-empty digests of their nested
+    lists and dicts, lists their first `items` elements (results are ranked, so
+    these carry the top scores) followed by a "+N more" marker, and strings their
+    first `chars` characters. Tables (see result_encoding) keep their KEEP_KEYS
+    columns and first `items` rows. Descriptions, sequences and other free text
+    are dropped.
+
+    Args:
+      value: The decoded JSON value
+      items: List elements kept per list
+      chars: Characters kept per string
+
+    Returns:
+      The digest, or None if nothing worth keeping is left
+    """
+    if is_table(value):
+        return digest_table(value, items, chars)
+    if isinstance(value, dict):
+        digest = {}
+        for key, item in value.items():
+            if isinstance(item, (dict, list)):
+                item = digest_value(item, items, chars)
+                if item:
+                    digest[key] = item
+            elif key in KEEP_KEYS:
+                digest[key] = digest_value(item, items, chars)
+        return digest or None
+    if isinstance(value, list):
+        digest = [digest_value(v, items, chars) for v in value[:items]]
+        digest = [d for d in digest if d is not None]
+        if len(value) > items:
+            digest.append(f"+{len(value) - items} more")
+        return digest or None
+    if isinstance(value, str) and len(value) > chars:
+        return value[:chars] + "..."
+    if isinstance(value, float):
+        return round(value, 4)
+    return value
+
+
+def digest_table(table: dict, items: int = 3, chars: int = 80):
+    """digest_value of a {"columns", "rows"} table."""
+    kept = [
+        i
+        for i, column in enumerate(table["columns"])
+        if column.rsplit(".", 1)[-1] in KEEP_KEYS
+    ]
+    if not kept:
+        return None
+    rows = table["rows"]
+    digest = {
+        "columns": [table["columns"][i] for i in kept],
+        "rows": [
+            [digest_value(row[i], items, chars) for i in kept] for row in rows[:items]
+        ],
+    }
+    if len(rows) > items:
+        digest["rows"].append(f"+{len(rows) - items} more")
+    for key, value in table.items():
+        if key not in ("columns", "rows") and key in KEEP_KEYS:
+            digest[key] = value
+    return digest
+
+
+def digest_text(text: str, items: int = 3, chars: int = 80) -> str:
+    """The compacted form of a tool result message's text."""
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return DIGEST_PREFIX + text[: items * chars]
+    digest = digest_value(value, items, chars)
+    return DIGEST_PREFIX + json.dumps(digest, separators=(",", ":"))
+
+
+class ContextCompactor:
+    """
+    Per-session view of the chat history that fits a token budget.
+
+    kani resends the whole history, raw JSON tool results included, with every
+    request. compact() returns a copy in which tool results of turns older than
+    keep_turns are replaced by digests (identifiers, top scores, counts and
+    cursors; see digest_value). If the history is still over budget, the tool
+    results of every earlier turn are digested too, and then the tool exchanges
+    of the oldest turns are dropped, keeping the user's questions and the final
+    answers. The current turn is never changed; whatever still does not fit is
+    left to kani's own truncation. The stored history is not modified, and
+    digests and token counts are computed once per message.
+    """
+
+    def __init__(self, config: Optional[CompactionConfig] = None):
+        self.config = config or CompactionConfig.from_env()
+        # id(message) -> (message, tokens, digest message, digest tokens); the
+        # message is kept to detect a reused id
+        self._entries = {}
+        self.prompts = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.digested = 0
+        self.dropped = 0
+        # estimated (raw, compacted) tokens of the last compacted history
+        self.last = (0, 0)
+
+    def _entry(self, message: ChatMessage):
+        entry = self._entries.get(id(message))
+        if entry is None or entry[0] is not message:
+            entry = (message, estimate_tokens(message), None, None)
+            self._entries[id(message)] = entry
+        return entry
+
+    def _digest(self, message: ChatMessage):
+        entry = self._entry(message)
+        if entry[2] is None:
+            text = digest_text(
+                message.text or "", self.config.digest_items, self.config.digest_chars
+            )
+            digest = message.copy_with(content=text)
+            entry = (message, entry[1], digest, estimate_tokens(digest))
+            self._entries[id(message)] = entry
+            self.digested += 1
+        return entry
+
+    def compact(self, history: List[ChatMessage]) -> List[ChatMessage]:
+        """
+        Return the messages to send in place of history
+
+        Args:
+          history: The session's full chat history (not modified)
+
+        Returns:
+          list: The compacted history
+        """
+        starts = [i for i, m in enumerate(history) if m.role == ChatRole.USER]
+        if not self.config.enabled or not starts:
+            return list(history)
+        # forget messages no longer in the history
+        self._entries = {id(m): self._entry(m) for m in history}
+        tokens = [self._entries[id(m)][1] for m in history]
+        raw = sum(tokens)
+        messages = list(history)
+
+        def digest(i):
+            if messages[i].role == ChatRole.FUNCTION and messages[i] is history[i]:
+                _, _, messages[i], digest_tokens = self._digest(history[i])
+                tokens[i] = digest_tokens
+
+        keep_turns = max(self.config.keep_turns, 1)
+        keep = starts[-keep_turns] if keep_turns <= len(starts) else 0
+        for i in range(keep):
+            digest(i)
+        # still over budget: digest every earlier turn's tool results
+        current = starts[-1]
+        if sum(tokens) > self.config.budget:
+            for i in range(keep, current):
+                digest(i)
+
+        # then drop earlier turns' tool calls and results, oldest turn first and
+        # a whole turn at a time so every result keeps its call
+        dropped = set()
+        for start, end in zip(starts, starts[1:]):
+            if sum(tokens) <= self.config.budget:
+                break
+            for i in range(start, end):
+                message = messages[i]
+                if message.role == ChatRole.FUNCTION or (
+                    message.role == ChatRole.ASSISTANT and message.tool_calls
+                ):
+                    dropped.add(i)
+                    tokens[i] = 0
+        if dropped:
+            messages = [m for i, m in enumerate(messages) if i not in dropped]
+            self.dropped += len(dropped)
+
+        self.last = (raw, sum(tokens))
+        self.prompts += 1
+        self.tokens_in += raw
+        self.tokens_out += self.last[1]
+        return messages
+
+    def stats(self) -> dict:
+        """
+        Report the tokens saved in this session
+
+        Returns:
+          dict: Prompts compacted, estimated history tokens before and after
+                compaction, messages digested and dropped
+        """
+        return {
+            "prompts": self.prompts,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "tokens_saved": self.tokens_in - self.tokens_out,
+            "saved_ratio": (
+                1 - self.tokens_out / self.tokens_in if self.tokens_in else 0.0
+            ),
+            "digested": self.digested,
+            "dropped": self.dropped,
+        }
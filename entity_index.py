@@ -0,0 +1,204 @@
+import bisect
+import json
+import logging
+import os
+import sys
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from resources import REGISTRY
+
+# matches scoring below this dice similarity are not considered hits
+MIN_SIMILARITY = 0.5
+TOP_PER_LABEL = 3
+MAX_PREFIX_MATCHES = 200
+
+
+def normalize(term: str) -> str:
+    return " ".join(str(term).casefold().split())
+
+
+def trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class EntityIndex:
+    """
+    In-process name/id/synonym index answering search_biological_entities locally.
+
+    Built from a dump of entity records ({"id", "name", "label", "model_id",
+    "synonyms"}). Every name, id and synonym becomes a normalized search key; keys
+    are kept in one sorted list (exact and prefix lookups via bisect) and their
+    character trigrams in a single int32 postings array with per-trigram offsets
+    (fuzzy lookups by dice similarity). Labels and record fields are interned
+    strings in parallel lists, so the index stays compact and a lookup takes
+    microseconds. Results are grouped per label, best TOP_PER_LABEL each.
+    """
+
+    def __init__(self, records: Iterable[dict]):
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.labels: List[str] = []
+        self.model_ids: List[Optional[str]] = []
+
+        pairs = []
+        for record in records:
+            i = len(self.ids)
+            self.ids.append(sys.intern(str(record["id"])))
+            self.names.append(str(record.get("name") or record["id"]))
+            self.labels.append(sys.intern(str(record["label"])))
+            model_id = record.get("model_id")
+            self.model_ids.append(None if model_id is None else str(model_id))
+            terms = {record["id"], record.get("name"), *(record.get("synonyms") or [])}
+            for term in terms:
+                if term:
+                    pairs.append((normalize(term), i))
+        pairs.sort()
+
+        self.keys: List[str] = [sys.intern(key) for key, _ in pairs]
+        self.key_records = np.array([i for _, i in pairs], dtype=np.int32)
+        self._build_trigrams()
+        self._labels_by_model_id = None
+
+    def _build_trigrams(self):
+        postings = {}
+        sizes = np.empty(len(self.keys), dtype=np.int16)
+        for k, key in enumerate(self.keys):
+            grams = trigrams(key)
+            sizes[k] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(k)
+
+        self.trigram_sizes = sizes
+        self.trigram_offsets = {}
+        flat = np.empty(sum(len(p) for p in postings.values()), dtype=np.int32)
+        start = 0
+        for gram, keys in postings.items():
+            flat[start : start + len(keys)] = keys
+            self.trigram_offsets[sys.intern(gram)] = (start, start + len(keys))
+            start += len(keys)
+        self.trigram_postings = flat
+
+    @classmethod
+    def load(cls, path):
+        """
+        Build an index from a JSON-lines (one record per line) or JSON-list dump
+
+        Args:
+          path: Path to the dump
+
+        Returns:
+          EntityIndex: The index
+        """
+        with open(path) as f:
+            if str(path).endswith(".jsonl"):
+                records = [json.loads(line) for line in f if line.strip()]
+            else:
+                records = json.load(f)
+        return cls(records)
+
+    def label_for_model_id(self, model_id) -> Optional[str]:
+        """Label of the entity with this model_id, if the dump contains it."""
+        if self._labels_by_model_id is None:
+            self._labels_by_model_id = {
+                m: label
+                for m, label in zip(self.model_ids, self.labels)
+                if m is not None
+            }
+        return self._labels_by_model_id.get(str(model_id))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _exact(self, key):
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_right(self.keys, key, lo)
+        return self.key_records[lo:hi]
+
+    def _prefix(self, key):
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_left(self.keys, key + "\uffff", lo)
+        hi = min(hi, lo + MAX_PREFIX_MATCHES)
+        return lo, hi
+
+    def _fuzzy(self, key):
+        grams = trigrams(key)
+        spans = [self.trigram_offsets[g] for g in grams if g in self.trigram_offsets]
+        if not spans:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        hits = np.concatenate([self.trigram_postings[a:b] for a, b in spans])
+        candidates, shared = np.unique(hits, return_counts=True)
+        dice = 2 * shared / (len(grams) + self.trigram_sizes[candidates])
+        keep = dice >= MIN_SIMILARITY
+        return candidates[keep], dice[keep]
+
+    def search(self, term: str, top_per_label: int = TOP_PER_LABEL) -> List[dict]:
+        """
+        Exact, prefix and trigram matching of a name, id or synonym
+
+        Args:
+          term: The search term
+          top_per_label: Matches kept per entity label
+
+        Returns:
+          List[dict]: Per label, its best matching entities; empty on a miss
+        """
+        key = normalize(term)
+        if not key:
+            return []
+
+        # best score per record: exact 1.0, prefix 0.8-0.9, fuzzy up to 0.8
+        best = {}
+        for record in self._exact(key).tolist():
+            best[record] = 1.0
+        lo, hi = self._prefix(key)
+        for k in range(lo, hi):
+            score = 0.8 + 0.1 * len(key) / len(self.keys[k])
+            record = int(self.key_records[k])
+            best[record] = max(best.get(record, 0), score)
+        # fuzzy matching is only needed when the term is not a known key
+        if not best or max(best.values()) < 1.0:
+            keys, dice = self._fuzzy(key)
+            for k, similarity in zip(keys.tolist(), dice.tolist()):
+                record = int(self.key_records[k])
+                best[record] = max(best.get(record, 0), 0.8 * similarity)
+
+        by_label = {}
+        for record, score in sorted(best.items(), key=lambda item: -item[1]):
+            matches = by_label.setdefault(self.labels[record], [])
+            if len(matches) < top_per_label:
+                matches.append(self._entity(record, score))
+        return [
+            {"label": label, "entities": matches}
+            for label, matches in sorted(
+                by_label.items(), key=lambda item: -item[1][0]["score"]
+            )
+        ]
+
+    def _entity(self, record, score) -> dict:
+        entity = {"id": self.ids[record], "name": self.names[record]}
+        if self.model_ids[record] is not None:
+            entity["model_id"] = self.model_ids[record]
+        entity["score"] = round(score, 3)
+        return entity
+
+
+def get_entity_index() -> Optional[EntityIndex]:
+    """
+    Return the process-wide entity index if EVOKG_ENTITY_INDEX points at a dump
+
+    Returns:
+      Optional[EntityIndex]: The shared index, or None to always search remotely
+    """
+    path = os.environ.get("EVOKG_ENTITY_INDEX")
+    if not path:
+        return None
+
+    def load():
+        index = EntityIndex.load(path)
+        logging.info(f"Loaded local entity index from {path} ({len(index)} entities)")
+        return index
+
+    return REGISTRY.get("entity_index", load)
@@ -0,0 +1,584 @@
+import argparse
+import gzip
+import itertools
+import json
+import logging
+import os
+import pathlib
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from relation_catalog import type_key
+from resources import REGISTRY
+
+# longest path find_paths searches for, and the most paths it returns
+MAX_HOPS = 4
+MAX_PATHS = 10
+
+# endpoints a CsrGraph answers in-process (methods of the same name and params)
+ENDPOINTS = ("subgraph", "entity_relationships", "check_relationship")
+# node properties a CsrGraph can look entities up by
+LOOKUP_PROPERTIES = ("id", "name")
+
+INDPTR = "indptr.npy"
+NEIGHBORS = "neighbors.npy"
+RELATIONS = "relations.npy"
+REVERSE = "reverse.npy"
+NODE_TYPES = "node_types.npy"
+META = "meta.json"
+
+
+def read_rows(path, header) -> Iterator[tuple]:
+    """
+    Read tab-separated rows from an export, skipping a header row equal to
+    `header`; .gz files are decompressed
+    """
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < len(header) or parts[: len(header)] == list(header):
+                continue
+            yield tuple(parts[: len(header)])
+
+
+def read_triples(path) -> Iterator[tuple]:
+    """(head, relation, tail) id rows of an edge dump (PyKEEN's triples format)."""
+    return read_rows(path, ("head", "relation", "tail"))
+
+
+def read_nodes(path) -> Iterator[tuple]:
+    """(id, name, label) rows of a node export."""
+    return read_rows(path, ("id", "name", "label"))
+
+
+def _mmap(path) -> np.ndarray:
+    # a plain ndarray view of the mapping: same shared pages, without
+    # numpy.memmap's per-indexing overhead on the many small lookups made here
+    return np.load(path, mmap_mode="r").view(np.ndarray)
+
+
+class StringColumn:
+    """
+    Array of strings stored as one UTF-8 blob plus offsets, with a sorted
+    permutation for exact lookups by binary search.
+
+    All three arrays are plain .npy files, so a saved column is memory-mapped
+    rather than unpacked into per-process Python objects.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, order: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        self.order = order
+
+    @classmethod
+    def from_strings(cls, values: List[str]):
+        encoded = [value.encode() for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        order = sorted(range(len(encoded)), key=encoded.__getitem__)
+        return cls(blob, offsets, np.array(order, dtype=np.int32))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _bytes(self, i) -> bytes:
+        start, end = self.offsets[i : i + 2].tolist()
+        return self.blob[start:end].tobytes()
+
+    def __getitem__(self, i) -> str:
+        return self._bytes(i).decode()
+
+    def find(self, value: str) -> List[int]:
+        """Indices of every entry equal to value."""
+        key = value.encode()
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(int(self.order[mid])) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        matches = []
+        while lo < len(self.order) and self._bytes(int(self.order[lo])) == key:
+            matches.append(int(self.order[lo]))
+            lo += 1
+        return matches
+
+    def save(self, directory, prefix):
+        np.save(directory / f"{prefix}_blob.npy", self.blob)
+        np.save(directory / f"{prefix}_offsets.npy", self.offsets)
+        np.save(directory / f"{prefix}_order.npy", self.order)
+
+    @classmethod
+    def load(cls, directory, prefix):
+        return cls(
+            *(
+                _mmap(directory / f"{prefix}_{part}.npy")
+                for part in ("blob", "offsets", "order")
+            )
+        )
+
+
+class CsrGraph:
+    """
+    In-process adjacency index of EvoKG in compressed-sparse-row form.
+
+    Every edge head -[relation]-> tail is stored from both ends so it can be
+    followed either way: `indptr[i]:indptr[i + 1]` spans node i's entries in
+    `neighbors` (the node at the other end), `relations` (the relation code) and
+    `reverse` (True where node i is the edge's tail). Entries of a node are sorted
+    by neighbour, so existence checks are a binary search and degrees, typed
+    neighbour lists and relation counts are vectorized scans of one slice.
+    Node ids, names and type codes (`node_types`) are parallel columns.
+
+    save() writes every array as .npy and load() memory-maps them, so Streamlit
+    worker processes on one host share the page cache instead of each holding a
+    copy; only the relation and type name lists are unpacked.
+    """
+
+    def __init__(
+        self,
+        ids: StringColumn,
+        relation_names: List[str],
+        indptr: np.ndarray,
+        neighbors: np.ndarray,
+        relations: np.ndarray,
+        reverse: np.ndarray,
+        names: Optional[StringColumn] = None,
+        node_types: Optional[np.ndarray] = None,
+        type_names: Optional[List[str]] = None,
+    ):
+        self.ids = ids
+        self.names = names
+        self.node_types = node_types
+        self.type_names = list(type_names or [])
+        self.type_codes = {type_key(t): i for i, t in enumerate(self.type_names)}
+        self.relation_names = list(relation_names)
+        self.relation_codes = {name: i for i, name in enumerate(self.relation_names)}
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.relations = relations
+        self.reverse = reverse
+
+    @classmethod
+    def from_triples(cls, triples: Iterable[tuple], nodes: Iterable[tuple] = ()):
+        """
+        Build the index from (head, relation, tail) id triples
+
+        Args:
+          triples: The edges
+          nodes: Optional (id, name, label) rows naming and typing the nodes
+
+        Returns:
+          CsrGraph: The index
+        """
+        node_index, relation_codes, type_codes = {}, {}, {}
+        names, labels = [], []
+        for node, name, label in nodes:
+            if node in node_index:
+                continue
+            node_index[node] = len(node_index)
+            names.append(name)
+            labels.append(type_codes.setdefault(label, len(type_codes)))
+        heads, relations, tails = [], [], []
+        for head, relation, tail in triples:
+            heads.append(node_index.setdefault(head, len(node_index)))
+            relations.append(relation_codes.setdefault(relation, len(relation_codes)))
+            tails.append(node_index.setdefault(tail, len(node_index)))
+
+        n = len(node_index)
+        heads = np.array(heads, dtype=np.int32)
+        tails = np.array(tails, dtype=np.int32)
+        relations = np.array(relations, dtype=np.int16)
+        # both directions of every edge, grouped by the node they leave from and
+        # sorted by neighbour within each node
+        sources = np.concatenate([heads, tails])
+        neighbors = np.concatenate([tails, heads])
+        relations = np.concatenate([relations, relations])
+        order = np.lexsort((relations, neighbors, sources))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+
+        node_types = None
+        if names:
+            # nodes only seen in edges have no name or type
+            names += [""] * (n - len(names))
+            node_types = np.full(n, -1, dtype=np.int8)
+            node_types[: len(labels)] = labels
+        return cls(
+            StringColumn.from_strings(list(node_index)),
+            list(relation_codes),
+            indptr,
+            neighbors[order],
+            relations[order],
+            np.repeat([False, True], len(heads))[order],
+            StringColumn.from_strings(names) if names else None,
+            node_types,
+            list(type_codes),
+        )
+
+    @classmethod
+    def from_tsv(cls, edges_path, nodes_path=None):
+        """Build the index from read_triples / read_nodes exports."""
+        nodes = read_nodes(nodes_path) if nodes_path else ()
+        return cls.from_triples(read_triples(edges_path), nodes)
+
+    def save(self, directory):
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / INDPTR, self.indptr)
+        np.save(directory / NEIGHBORS, self.neighbors)
+        np.save(directory / RELATIONS, self.relations)
+        np.save(directory / REVERSE, self.reverse)
+        self.ids.save(directory, "ids")
+        if self.names is not None:
+            self.names.save(directory, "names")
+            np.save(directory / NODE_TYPES, self.node_types)
+        meta = {
+            "relation_names": self.relation_names,
+            "type_names": self.type_names,
+            "n_nodes": self.n_nodes,
+            "n_edges": self.n_edges,
+        }
+        (directory / META).write_text(json.dumps(meta))
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Open an index written by save(), memory-mapping its arrays
+
+        Args:
+          directory: The index directory
+
+        Returns:
+          CsrGraph: The index
+        """
+        directory = pathlib.Path(directory)
+        meta = json.loads((directory / META).read_text())
+        names = node_types = None
+        if (directory / NODE_TYPES).exists():
+            names = StringColumn.load(directory, "names")
+            node_types = _mmap(directory / NODE_TYPES)
+        return cls(
+            StringColumn.load(directory, "ids"),
+            meta["relation_names"],
+            _mmap(directory / INDPTR),
+            _mmap(directory / NEIGHBORS),
+            _mmap(directory / RELATIONS),
+            _mmap(directory / REVERSE),
+            names,
+            node_types,
+            meta.get("type_names"),
+        )
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.neighbors) // 2
+
+    # node lookups and per-node queries, on node indices
+
+    def node(self, property_name, property_value, entity_type=None) -> Optional[int]:
+        """
+        Index of the node whose id or name equals property_value
+
+        Args:
+          property_name: "id" or "name"
+          property_value: The value to match exactly
+          entity_type: Only match nodes of this type, if given and types are known
+
+        Returns:
+          Optional[int]: The node index, or None if not found or the property
+                         cannot be looked up locally
+        """
+        if property_name not in LOOKUP_PROPERTIES:
+            return None
+        column = self.ids if property_name == "id" else self.names
+        if column is None:
+            return None
+        matches = column.find(str(property_value))
+        if entity_type and self.node_types is not None:
+            code = self.type_codes.get(type_key(entity_type), -2)
+            matches = [i for i in matches if self.node_types[i] == code]
+        return matches[0] if matches else None
+
+    def entity(self, node: int) -> dict:
+        entity = {"id": self.ids[node]}
+        if self.names is not None:
+            entity["name"] = self.names[node]
+            code = self.node_types[node]
+            entity["label"] = self.type_names[code] if code >= 0 else None
+        return entity
+
+    def entries(self, node: int, relation: Optional[str] = None) -> np.ndarray:
+        """
+        CSR entry positions of a node's edges, optionally of one relation
+
+        Args:
+          node: The node index
+          relation: Relation name to keep (default: all)
+
+        Returns:
+          np.ndarray: Positions into neighbors/relations/reverse
+        """
+        entries = np.arange(self.indptr[node], self.indptr[node + 1])
+        if relation is not None:
+            code = self.relation_codes.get(relation, -1)
+            entries = entries[self.relations[entries] == code]
+        return entries
+
+    def degree(self, node: int, relation: Optional[str] = None) -> int:
+        if relation is None:
+            return int(self.indptr[node + 1] - self.indptr[node])
+        return len(self.entries(node, relation))
+
+    def relation_counts(self, node: int) -> dict:
+        """Number of a node's edges per relation name."""
+        codes = self.relations[self.indptr[node] : self.indptr[node + 1]]
+        counts = np.bincount(codes, minlength=len(self.relation_names))
+        return {
+            self.relation_names[code]: int(counts[code])
+            for code in np.flatnonzero(counts)
+        }
+
+    def relations_between(self, a: int, b: int) -> List[str]:
+        """Names of the relations on edges between two nodes, in either direction."""
+        start, end = self.indptr[a], self.indptr[a + 1]
+        neighbors = self.neighbors[start:end]
+        lo = np.searchsorted(neighbors, b, side="left")
+        hi = np.searchsorted(neighbors, b, side="right")
+        codes = self.relations[start + lo : start + hi]
+        return [self.relation_names[code] for code in np.unique(codes)]
+
+    def has_edge(self, a: int, b: int, relation: Optional[str] = None) -> bool:
+        found = self.relations_between(a, b)
+        return relation in found if relation else bool(found)
+
+    # REST endpoint equivalents; None means "ask the remote server instead"
+
+    def subgraph(self, property_name, property_value) -> Optional[dict]:
+        center = self.node(property_name, property_value)
+        if center is None:
+            return None
+        entries = self.entries(center)
+        others = self.neighbors[entries]
+        center_id = self.ids[center]
+        relationships = []
+        for entry, other in zip(entries, others):
+            ends = (self.ids[other], center_id)
+            start, end = ends if self.reverse[entry] else ends[::-1]
+            relation = self.relation_names[self.relations[entry]]
+            relationships.append({"type": relation, "start": start, "end": end})
+        return {
+            "start_node": self.entity(center),
+            "nodes": [self.entity(other) for other in np.unique(others)],
+            "relationships": relationships,
+        }
+
+    def entity_relationships(
+        self, entity_type, property_name, property_value, relationship_type=None
+    ) -> Optional[dict]:
+        center = self.node(property_name, property_value, entity_type)
+        if center is None:
+            return None
+        entries = self.entries(center, relationship_type)
+        entity = self.entity(center)
+        return {
+            "entity": entity.get("name", entity["id"]),
+            "count": len(entries),
+            "relationships": [
+                {
+                    "relationship_type": self.relation_names[self.relations[entry]],
+                    "direction": "incoming" if self.reverse[entry] else "outgoing",
+                    "related_entity": self.entity(self.neighbors[entry]),
+                }
+                for entry in entries
+            ],
+        }
+
+    def check_relationship(
+        self,
+        entity1_type,
+        entity1_property_name,
+        entity1_property_value,
+        entity2_type,
+        entity2_property_name,
+        entity2_property_value,
+    ) -> Optional[dict]:
+        a = self.node(entity1_property_name, entity1_property_value, entity1_type)
+        b = self.node(entity2_property_name, entity2_property_value, entity2_type)
+        if a is None or b is None:
+            return None
+        relations = self.relations_between(a, b)
+        return {"exists": bool(relations), "relationship_types": relations}
+
+    # path search
+
+    def _step(self, entry: int, node: int) -> dict:
+        # the stored edge behind CSR entry `entry` of `node`, in its own direction
+        other = self.ids[self.neighbors[entry]]
+        here = self.ids[node]
+        head, tail = (other, here) if self.reverse[entry] else (here, other)
+        relation = self.relation_names[self.relations[entry]]
+        return {"head": head, "relation": relation, "tail": tail}
+
+    def _frontier_entries(self, nodes: np.ndarray) -> np.ndarray:
+        # positions of all CSR entries of `nodes`, concatenated
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return offsets + np.arange(counts.sum())
+
+    def _allowed_mask(self, allowed_relations) -> Optional[np.ndarray]:
+        if not allowed_relations:
+            return None
+        mask = np.zeros(len(self.relation_names), dtype=bool)
+        for name in allowed_relations:
+            if name in self.relation_codes:
+                mask[self.relation_codes[name]] = True
+        return mask
+
+    def _walks(self, node, dist, allowed) -> Iterator[list]:
+        # every walk from the search root to `node` along strictly rising distance
+        if dist[node] == 0:
+            yield []
+            return
+        entries = self.entries(node)
+        entries = entries[dist[self.neighbors[entries]] == dist[node] - 1]
+        if allowed is not None:
+            entries = entries[allowed[self.relations[entries]]]
+        for entry in entries:
+            for walk in self._walks(self.neighbors[entry], dist, allowed):
+                yield walk + [self._step(entry, node)]
+
+    def shortest_paths(
+        self,
+        source: str,
+        target: str,
+        max_hops: int = 3,
+        allowed_relations: Optional[List[str]] = None,
+        max_paths: int = MAX_PATHS,
+    ) -> Optional[dict]:
+        """
+        Shortest paths between two nodes by bidirectional breadth-first search
+
+        Edges are followed in either direction. Each step expands whichever
+        frontier has the smaller total degree, so hubs are crossed from the cheaper
+        side, and the search stops at the first level where the two sides meet.
+
+        Args:
+          source: Id of the start node
+          target: Id of the end node
+          max_hops: Longest path searched
+          allowed_relations: Only follow these relations (default: all)
+          max_paths: Most paths returned
+
+        Returns:
+          Optional[dict]: The path length ("hops", None if no path within
+                max_hops) and the paths as lists of head/relation/tail edges from
+                source to target, or None if either node is not in the graph
+        """
+        ends = [self.node("id", source), self.node("id", target)]
+        if None in ends:
+            return None
+        result = {"source": source, "target": target, "hops": None, "paths": []}
+        if source == target:
+            result.update(hops=0, paths=[[]])
+            return result
+
+        allowed = self._allowed_mask(allowed_relations)
+        dist = [np.full(self.n_nodes, -1, dtype=np.int8) for _ in ends]
+        frontiers = [np.array([end]) for end in ends]
+        for side, end in enumerate(ends):
+            dist[side][end] = 0
+        depth = [0, 0]
+        met = np.array([], dtype=np.int32)
+        while not len(met) and sum(depth) < max_hops:
+            cost = [
+                (self.indptr[frontier + 1] - self.indptr[frontier]).sum()
+                for frontier in frontiers
+            ]
+            side = int(cost[1] < cost[0])
+            entries = self._frontier_entries(frontiers[side])
+            if allowed is not None:
+                entries = entries[allowed[self.relations[entries]]]
+            reached = np.unique(self.neighbors[entries])
+            reached = reached[dist[side][reached] < 0]
+            if not len(reached):
+                return result
+            depth[side] += 1
+            dist[side][reached] = depth[side]
+            frontiers[side] = reached
+            met = reached[dist[1 - side][reached] >= 0]
+        if not len(met):
+            return result
+
+        # the sides' searched balls were disjoint before this level, so every
+        # shortest path crosses exactly one of the nodes that just met
+        result["hops"] = sum(depth)
+        paths = (
+            head + tail[::-1]
+            for node in met
+            for head in self._walks(node, dist[0], allowed)
+            for tail in self._walks(node, dist[1], allowed)
+        )
+        result["paths"] = list(itertools.islice(paths, max_paths))
+        return result
+
+
+def get_local_graph() -> Optional[CsrGraph]:
+    """
+    Return the process-wide adjacency index if EVOKG_GRAPH_DIR or
+    EVOKG_GRAPH_EDGES is set
+
+    EVOKG_GRAPH_DIR memory-maps an index written by save() (see main()); otherwise
+    EVOKG_GRAPH_EDGES (and optionally EVOKG_GRAPH_NODES) is read into memory.
+
+    Returns:
+      Optional[CsrGraph]: The shared index, or None to query the remote server
+    """
+    directory = os.environ.get("EVOKG_GRAPH_DIR")
+    edges = os.environ.get("EVOKG_GRAPH_EDGES")
+    if not directory and not edges:
+        return None
+
+    def load():
+        if directory:
+            graph = CsrGraph.load(directory)
+        else:
+            graph = CsrGraph.from_tsv(edges, os.environ.get("EVOKG_GRAPH_NODES"))
+        logging.info(
+            f"Loaded local graph from {directory or edges} ({graph.n_nodes} "
+            f"nodes, {graph.n_edges} edges)"
+        )
+        return graph
+
+    return REGISTRY.get("local_graph", load)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a memory-mapped CSR graph index from an edge-list export"
+    )
+    parser.add_argument(
+        "--edges", required=True, help="TSV of head, relation, tail ids"
+    )
+    parser.add_argument("--nodes", default=None, help="TSV of id, name, label")
+    parser.add_argument("--out", required=True, help="Output index directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    graph = CsrGraph.from_tsv(args.edges, args.nodes)
+    graph.save(args.out)
+    logging.info(f"Wrote {graph.n_nodes} nodes and {graph.n_edges} edges to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import json
+import re
+from typing import AsyncIterator, List, Optional
+
+# structural characters outside strings, and the rest of a string after its
+# opening quote (escaped characters included)
+_STRUCTURE = re.compile(rb'["{}\[\]]')
+_STRING_END = re.compile(rb'(?:[^"\\]|\\.)*"', re.DOTALL)
+_SCALAR_END = re.compile(rb"[,\]}\s]")
+_SPACE = re.compile(rb"\s*")
+
+ROOT_LIST_KEY = "results"
+
+# parser states
+_START, _KEY, _COLON, _VALUE, _AFTER_VALUE, _ITEM, _AFTER_ITEM, _DONE = range(8)
+
+
+class ItemStream:
+    """
+    Incremental parser for a JSON object whose large members are lists.
+
+    Bytes are fed as they arrive; each complete element of a top-level list is
+    decoded on its own and returned as ("item", key, element) as soon as its last
+    byte is in, followed by ("end", key, count) when the list closes. Other
+    top-level members come back whole as ("value", key, value). Only the element
+    being scanned is buffered, so memory stays bounded by the largest single
+    element however long the lists are. A top-level list is reported under
+    ROOT_LIST_KEY.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+        self._state = _START
+        self._key: Optional[str] = None
+        self._count = 0
+        self._root_list = False
+        # resumable scan of the element starting at _pos
+        self._scan = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def feed(self, data: bytes) -> List[tuple]:
+        """
+        Parse another chunk of the body
+
+        Args:
+          data: The next bytes of the body
+
+        Returns:
+          List[tuple]: The events completed by this chunk
+        """
+        self._buf += data
+        events = []
+        while self._state != _DONE and self._step(events):
+            pass
+        # drop consumed bytes so the buffer only holds the unfinished element
+        if self._pos:
+            if self._scan is not None:
+                self._scan[0] -= self._pos
+            del self._buf[: self._pos]
+            self._pos = 0
+        return events
+
+    def close(self):
+        """Check that the whole body was parsed."""
+        if self._state != _DONE:
+            raise ValueError("Truncated JSON body")
+
+    def _skip_space(self) -> bool:
+        self._pos = _SPACE.match(self._buf, self._pos).end()
+        return self._pos < len(self._buf)
+
+    def _expect(self, chars: bytes) -> Optional[int]:
+        if not self._skip_space():
+            return None
+        ch = self._buf[self._pos]
+        if ch not in chars:
+            raise ValueError(
+                f"Unexpected {chr(ch)!r} at byte {self._pos} of the JSON body"
+            )
+        self._pos += 1
+        return ch
+
+    def _step(self, events) -> bool:
+        state = self._state
+        if state == _START:
+            ch = self._expect(b"{[")
+            if ch is None:
+                return False
+            if ch == ord("["):
+                self._root_list = True
+                self._start_list(ROOT_LIST_KEY)
+            else:
+                self._state = _KEY
+            return True
+
+        if state == _KEY:
+            if not self._skip_space():
+                return False
+            if self._buf[self._pos] == ord("}"):
+                self._pos += 1
+                self._state = _DONE
+                return True
+            key = self._element()
+            if key is None:
+                return False
+            self._key = json.loads(key)
+            self._state = _COLON
+            return True
+
+        if state == _COLON:
+            if self._expect(b":") is None:
+                return False
+            self._state = _VALUE
+            return True
+
+        if state == _VALUE:
+            if not self._skip_space():
+                return False
+            if self._buf[self._pos] == ord("["):
+                self._pos += 1
+                self._start_list(self._key)
+                return True
+            value = self._element()
+            if value is None:
+                return False
+            events.append(("value", self._key, json.loads(value)))
+            self._state = _AFTER_VALUE
+            return True
+
+        if state == _AFTER_VALUE:
+            ch = self._expect(b",}")
+            if ch is None:
+                return False
+            self._state = _KEY if ch == ord(",") else _DONE
+            return True
+
+        if state == _ITEM:
+            if not self._skip_space():
+                return False
+            if self._count == 0 and self._buf[self._pos] == ord("]"):
+                self._pos += 1
+                self._end_list(events)
+                return True
+            item = self._element()
+            if item is None:
+                return False
+            events.append(("item", self._key, json.loads(item)))
+            self._count += 1
+            self._state = _AFTER_ITEM
+            return True
+
+        if state == _AFTER_ITEM:
+            ch = self._expect(b",]")
+            if ch is None:
+                return False
+            if ch == ord(","):
+                self._state = _ITEM
+            else:
+                self._end_list(events)
+            return True
+        return False
+
+    def _start_list(self, key):
+        self._key = key
+        self._count = 0
+        self._state = _ITEM
+
+    def _end_list(self, events):
+        events.append(("end", self._key, self._count))
+        self._state = _DONE if self._root_list else _AFTER_VALUE
+
+    def _element(self) -> Optional[bytes]:
+        # bytes of the complete element at _pos, or None until more data arrives;
+        # containers are scanned incrementally, resuming where the last chunk ended
+        buf = self._buf
+        start = self._pos
+        first = buf[start]
+        if first in b"{[":
+            scan_pos, depth = (
+                (self._scan[0], self._scan[1]) if self._scan else (start, 0)
+            )
+            while True:
+                m = _STRUCTURE.search(buf, scan_pos)
+                if m is None:
+                    self._scan = [len(buf), depth]
+                    return None
+                ch = buf[m.start()]
+                if ch == ord('"'):
+                    end = _STRING_END.match(buf, m.end())
+                    if end is None:
+                        # resume from the opening quote once more bytes arrive
+                        self._scan = [m.start(), depth]
+                        return None
+                    scan_pos = end.end()
+                    continue
+                depth += 1 if ch in b"{[" else -1
+                scan_pos = m.end()
+                if depth == 0:
+                    break
+            end = scan_pos
+        elif first == ord('"'):
+            m = _STRING_END.match(buf, start + 1)
+            if m is None:
+                return None
+            end = m.end()
+        else:
+            m = _SCALAR_END.search(buf, start)
+            if m is None:
+                return None
+            end = m.start()
+        self._scan = None
+        self._pos = end
+        return bytes(buf[start:end])
+
+
+async def iter_json_items(chunks: AsyncIterator[bytes]):
+    """
+    Parse a JSON body from an async byte stream, yielding ItemStream events
+
+    Args:
+      chunks: The body, e.g. httpx.Response.aiter_bytes()
+
+    Yields:
+      tuple: ("item", key, element), ("end", key, count) or ("value", key, value)
+    """
+    parser = ItemStream()
+    async for chunk in chunks:
+        for event in parser.feed(chunk):
+            yield event
+        if parser.done:
+            return
+    parser.close()
@@ -0,0 +1,377 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from kg_client import AsyncKgClient
+from metrics import get_metrics
+from relation_catalog import CATALOG
+from resources import REGISTRY
+
+# endpoints the Neo4j backend answers with Cypher; the rest stay on REST
+NEO4J_ENDPOINTS = ("subgraph", "entity_relationships", "check_relationship")
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class KgBackend:
+    """
+    Source of raw KG responses behind EvoKgAgent.api_call.
+
+    query() takes an endpoint name and its REST query parameters and returns the
+    body the REST service would return, so caching, shaping and the AI functions
+    are the same whichever backend answers. `endpoints` lists what a backend can
+    serve (None: everything).
+    """
+
+    endpoints: Optional[tuple] = None
+
+    def serves(self, endpoint) -> bool:
+        return self.endpoints is None or endpoint in self.endpoints
+
+    async def query(self, endpoint, params, timeout=None):
+        raise NotImplementedError
+
+    async def query_many(self, endpoint, queries: List[dict], timeout=None) -> list:
+        """Answer several queries to one endpoint, concurrently by default."""
+        return await asyncio.gather(
+            *(self.query(endpoint, params, timeout=timeout) for params in queries)
+        )
+
+
+class RestBackend(KgBackend):
+    """The EvoKG REST service, through the shared pooled AsyncKgClient."""
+
+    def __init__(self, client: AsyncKgClient):
+        self.client = client
+
+    async def query(self, endpoint, params, timeout=None):
+        return await self.client.get_json(endpoint, params=params, timeout=timeout)
+
+
+@dataclass
+class Neo4jConfig:
+    """Connection, pool and batching settings for the direct Neo4j backend."""
+
+    uri: str = "bolt://localhost:7687"
+    user: str = "neo4j"
+    password: str = ""
+    database: Optional[str] = None
+    max_pool_size: int = 50
+    connection_timeout: float = 5.0
+    query_timeout: float = 30.0
+    # lookups to the same query template arriving within this window are sent
+    # together as one UNWIND query, up to max_batch rows
+    batch_window: float = 0.002
+    max_batch: int = 100
+    # most relationships returned per entity (counts are still exact)
+    max_neighbours: int = 5000
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a config from EVOKG_NEO4J_* environment variables
+
+        Returns:
+          Neo4jConfig: The resolved configuration
+        """
+        return cls(
+            uri=os.environ.get("EVOKG_NEO4J_URI", "bolt://localhost:7687"),
+            user=os.environ.get("EVOKG_NEO4J_USER", "neo4j"),
+            password=os.environ.get("EVOKG_NEO4J_PASSWORD", ""),
+            database=os.environ.get("EVOKG_NEO4J_DATABASE") or None,
+            max_pool_size=int(os.environ.get("EVOKG_NEO4J_POOL_SIZE", 50)),
+            query_timeout=float(os.environ.get("EVOKG_NEO4J_TIMEOUT", 30)),
+            batch_window=float(os.environ.get("EVOKG_NEO4J_BATCH_WINDOW_MS", 2)) / 1000,
+            max_batch=int(os.environ.get("EVOKG_NEO4J_MAX_BATCH", 100)),
+            max_neighbours=int(os.environ.get("EVOKG_NEO4J_MAX_NEIGHBOURS", 5000)),
+        )
+
+
+def _identifier(name) -> str:
+    # labels and property keys cannot be Cypher parameters, so they are checked
+    # and quoted before going into the query text
+    if not IDENTIFIER.match(str(name)):
+        raise ValueError(f"Invalid property or label name: {name!r}")
+    return f"`{name}`"
+
+
+def _label(entity_type) -> str:
+    # same mapping as the agent applies before any backend (graph_label)
+    label = CATALOG.graph_label(entity_type)
+    if label not in CATALOG.entity_types:
+        raise ValueError(
+            f"Unknown entity type '{entity_type}'. Valid types: "
+            f"{', '.join(CATALOG.entity_types)}"
+        )
+    _identifier(label)
+    return label
+
+
+def _node_map(var) -> str:
+    return f"{var} {{.*, label: labels({var})[0]}}"
+
+
+def subgraph_query(property_name) -> str:
+    key = _identifier(property_name)
+    return f"""// evokg:subgraph property={property_name}
+UNWIND $rows AS row
+CALL {{
+  WITH row
+  MATCH (n {{{key}: row.value}})
+  RETURN n LIMIT 1
+}}
+OPTIONAL MATCH (n)-[r]-(m)
+WITH row, n, collect(DISTINCT m)[..$max_neighbours] AS nodes,
+     collect(r)[..$max_neighbours] AS rels
+RETURN row.i AS i, {_node_map("n")} AS start_node,
+       [x IN nodes | {_node_map("x")}] AS nodes,
+       [r IN rels | {{type: type(r), start: startNode(r).id, end: endNode(r).id}}]
+         AS relationships"""
+
+
+def entity_relationships_query(entity_type, property_name) -> str:
+    label, key = _label(entity_type), _identifier(property_name)
+    return f"""// evokg:entity_relationships label={label} property={property_name}
+UNWIND $rows AS row
+MATCH (n:`{label}` {{{key}: row.value}})
+OPTIONAL MATCH (n)-[r]-(m)
+WHERE row.relationship_type IS NULL OR type(r) = row.relationship_type
+WITH row, n, collect(CASE WHEN r IS NULL THEN NULL ELSE {{
+  relationship_type: type(r),
+  direction: CASE WHEN startNode(r) = n THEN 'outgoing' ELSE 'incoming' END,
+  related_entity: {_node_map("m")}
+}} END) AS relationships
+RETURN row.i AS i, coalesce(n.name, n.id) AS entity, size(relationships) AS count,
+       relationships[..$max_neighbours] AS relationships"""
+
+
+def check_relationship_query(type1, property1, type2, property2) -> str:
+    label1, key1 = _label(type1), _identifier(property1)
+    label2, key2 = _label(type2), _identifier(property2)
+    return f"""// evokg:check_relationship label1={label1} property1={property1} \
+label2={label2} property2={property2}
+UNWIND $rows AS row
+OPTIONAL MATCH (a:`{label1}` {{{key1}: row.value1}})
+               -[r]-(b:`{label2}` {{{key2}: row.value2}})
+RETURN row.i AS i, collect(DISTINCT type(r)) AS relationship_types"""
+
+
+def default_driver_factory(config: Neo4jConfig):
+    """Open a pooled neo4j.AsyncDriver (imported here so REST-only installs work)."""
+    from neo4j import AsyncGraphDatabase
+
+    return AsyncGraphDatabase.driver(
+        config.uri,
+        auth=(config.user, config.password),
+        max_connection_pool_size=config.max_pool_size,
+        connection_timeout=config.connection_timeout,
+    )
+
+
+class Neo4jBackend(KgBackend):
+    """
+    Answers the graph-lookup endpoints with Cypher over the Neo4j Bolt driver.
+
+    Drivers, like httpx clients, are bound to the event loop that opened them, so
+    one pooled driver is kept per running loop and shared by every agent on it.
+    Queries are fixed templates per (label, property) with values passed as
+    parameters, so the server's plan cache is reused. Each template takes a list
+    of rows and UNWINDs it: lookups issued together (e.g. parallel tool calls in
+    one round, or query_many) are coalesced within batch_window into one round
+    trip; lookups with different timeouts are batched separately, and each
+    round trip is cancelled after its timeout (default config.query_timeout).
+    `driver_factory` may return any object with the AsyncDriver
+    execute_query/close API, e.g. benchmarks.mock_neo4j.InMemoryNeo4jDriver.
+    """
+
+    endpoints = NEO4J_ENDPOINTS
+
+    def __init__(
+        self,
+        config: Neo4jConfig,
+        driver_factory: Optional[Callable] = None,
+    ):
+        self.config = config
+        self.driver_factory = driver_factory or default_driver_factory
+        self._lock = threading.Lock()
+        self._loop_state = weakref.WeakKeyDictionary()
+        self._queries = 0
+        self._round_trips = 0
+
+    def _state(self) -> dict:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loop_state.get(loop)
+            if state is None:
+                state = {
+                    "driver": self.driver_factory(self.config),
+                    "pending": {},
+                    "tasks": set(),
+                }
+                self._loop_state[loop] = state
+            return state
+
+    def _template(self, endpoint, params) -> tuple:
+        # (query text, row) for one lookup
+        if endpoint == "subgraph":
+            query = subgraph_query(params["property_name"])
+            return query, {"value": params["property_value"]}
+        if endpoint == "entity_relationships":
+            query = entity_relationships_query(
+                params["entity_type"], params["property_name"]
+            )
+            row = {
+                "value": params["property_value"],
+                "relationship_type": params.get("relationship_type") or None,
+            }
+            return query, row
+        if endpoint == "check_relationship":
+            query = check_relationship_query(
+                params["entity1_type"],
+                params["entity1_property_name"],
+                params["entity2_type"],
+                params["entity2_property_name"],
+            )
+            row = {
+                "value1": params["entity1_property_value"],
+                "value2": params["entity2_property_value"],
+            }
+            return query, row
+        raise ValueError(f"Endpoint {endpoint} is not served by the Neo4j backend")
+
+    async def query(self, endpoint, params, timeout=None):
+        query, row = self._template(endpoint, params)
+        key = (query, timeout or self.config.query_timeout)
+        state = self._state()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = state["pending"].setdefault(key, (endpoint, []))[1]
+        batch.append((params, row, future))
+        with self._lock:
+            self._queries += 1
+        if len(batch) >= self.config.max_batch:
+            self._schedule(state, key, loop)
+        elif len(batch) == 1:
+            loop.call_later(self.config.batch_window, self._schedule, state, key, loop)
+        return await future
+
+    def _schedule(self, state, key, loop):
+        pending = state["pending"].pop(key, None)
+        if pending is None:
+            return
+        task = loop.create_task(self._flush(state["driver"], *key, *pending))
+        state["tasks"].add(task)
+        task.add_done_callback(state["tasks"].discard)
+
+    async def _flush(self, driver, query, timeout, endpoint, batch):
+        rows = [dict(row, i=i) for i, (_, row, _) in enumerate(batch)]
+        metrics = get_metrics()
+        metrics.observe("evokg_neo4j_batch_rows", len(rows), endpoint=endpoint)
+        with self._lock:
+            self._round_trips += 1
+        try:
+            records, _, _ = await asyncio.wait_for(
+                driver.execute_query(
+                    query,
+                    parameters_={
+                        "rows": rows,
+                        "max_neighbours": self.config.max_neighbours,
+                    },
+                    database_=self.config.database,
+                    routing_="r",
+                ),
+                timeout,
+            )
+        except Exception as e:
+            logging.error(f"Neo4j {endpoint} batch of {len(rows)} failed: {str(e)}")
+            metrics.inc("evokg_kg_errors_total", endpoint=endpoint)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_row = {}
+        for record in records:
+            data = record.data()
+            by_row.setdefault(data["i"], data)
+        for i, (params, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            try:
+                future.set_result(self._response(endpoint, params, by_row.get(i)))
+            except Exception as e:
+                future.set_exception(e)
+
+    @staticmethod
+    def _response(endpoint, params, data):
+        # the REST service's body for one row's record (None: no match)
+        if endpoint == "check_relationship":
+            types = sorted((data or {}).get("relationship_types") or [])
+            return {"exists": bool(types), "relationship_types": types}
+        if data is None:
+            raise LookupError(
+                f"No entity with {params['property_name']}={params['property_value']!r}"
+            )
+        if endpoint == "subgraph":
+            return {
+                "start_node": data["start_node"],
+                "nodes": data["nodes"],
+                "relationships": data["relationships"],
+            }
+        return {
+            "entity": data["entity"],
+            "count": data["count"],
+            "relationships": data["relationships"],
+        }
+
+    def stats(self) -> dict:
+        """
+        Report how well lookups were coalesced
+
+        Returns:
+          dict: Lookups, round trips, mean rows per round trip and open drivers
+        """
+        with self._lock:
+            return {
+                "queries": self._queries,
+                "round_trips": self._round_trips,
+                "rows_per_round_trip": (
+                    round(self._queries / self._round_trips, 2)
+                    if self._round_trips
+                    else 0.0
+                ),
+                "drivers": len(self._loop_state),
+            }
+
+    async def aclose(self):
+        """Close the current event loop's driver."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loop_state.pop(loop, None)
+        if state is not None:
+            await state["driver"].close()
+
+
+def get_graph_backend() -> Optional[KgBackend]:
+    """
+    Return the process-wide graph backend selected by EVOKG_BACKEND
+
+    Returns:
+      Optional[KgBackend]: The shared Neo4jBackend when EVOKG_BACKEND=neo4j, or
+                           None to send every endpoint to the REST service
+    """
+    if os.environ.get("EVOKG_BACKEND", "rest") != "neo4j":
+        return None
+
+    def create():
+        config = Neo4jConfig.from_env()
+        logging.info(
+            f"Using Neo4j backend at {config.uri} for {', '.join(NEO4J_ENDPOINTS)}"
+        )
+        return Neo4jBackend(config)
+
+    return REGISTRY.get("graph_backend", create)
@@ -0,0 +1,343 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from resources import REGISTRY
+
+# TTL in seconds per cacheable endpoint; endpoints not listed are never cached
+DEFAULT_TTLS = {
+    "search_biological_entities": 6 * 3600,
+    "get_nodes_by_label": 6 * 3600,
+    "sample_triples": 6 * 3600,
+    "subgraph": 3600,
+    "entity_relationships": 3600,
+    "find_paths": 3600,
+    "predict_tail": 24 * 3600,
+    "get_prediction_rank": 24 * 3600,
+    "prediction_rank_batch": 24 * 3600,
+}
+
+# endpoints whose answers depend on the KGE model rather than only the graph
+MODEL_ENDPOINTS = {"predict_tail", "get_prediction_rank", "prediction_rank_batch"}
+
+
+@dataclass
+class CacheConfig:
+    """Size and freshness limits for the shared response cache."""
+
+    enabled: bool = True
+    max_entries: int = 4096
+    max_bytes: int = 64 * 1024 * 1024
+    ttls: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_TTLS))
+    kg_version: str = "default"
+    model_version: str = "default"
+    # seconds an expired entry is kept to answer when the backend is failing
+    stale_seconds: float = 3600
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a config from EVOKG_CACHE_* / version environment variables
+
+        Returns:
+          CacheConfig: The resolved configuration
+        """
+        return cls(
+            enabled=os.environ.get("EVOKG_CACHE", "1") != "0",
+            max_entries=int(os.environ.get("EVOKG_CACHE_MAX_ENTRIES", 4096)),
+            max_bytes=int(os.environ.get("EVOKG_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+            kg_version=os.environ.get("EVOKG_KG_VERSION", "default"),
+            model_version=os.environ.get("EVOKG_MODEL_VERSION", "default"),
+            stale_seconds=float(os.environ.get("EVOKG_CACHE_STALE_SECONDS", 3600)),
+        )
+
+
+def normalize_params(params) -> tuple:
+    """Sorted (name, value) pairs with None dropped and whitespace collapsed."""
+    items = []
+    for name, value in (params or {}).items():
+        if value is None:
+            continue
+        items.append((name, " ".join(str(value).split())))
+    return tuple(sorted(items))
+
+
+class ResponseCache:
+    """
+    In-process TTL + LRU cache for read-only KG endpoints, shared by all sessions.
+
+    Entries are stored as JSON text so every hit hands out a fresh object and the
+    byte bound is exact. Keys combine the endpoint, normalized params and the KG
+    version (plus the model version for prediction endpoints). Concurrent misses
+    on the same key are coalesced: one caller fetches, the rest wait for it, even
+    when they run on different event loops. Expired entries are kept for
+    stale_seconds more and served if the refetch fails.
+    """
+
+    def __init__(self, config: CacheConfig, clock=time.monotonic):
+        self.config = config
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+        self._bytes = 0
+        self._inflight: Dict[tuple, concurrent.futures.Future] = {}
+        self._hits = {}
+        self._misses = {}
+        self._coalesced = 0
+        self._evictions = 0
+        self._expired = 0
+        self._stale = 0
+
+    def is_cacheable(self, endpoint):
+        return self.config.enabled and endpoint in self.config.ttls
+
+    def make_key(self, endpoint, params) -> tuple:
+        version = self.config.kg_version
+        if endpoint in MODEL_ENDPOINTS:
+            version = f"{version}/{self.config.model_version}"
+        return (endpoint, version, normalize_params(params))
+
+    def get(self, key):
+        """
+        Look up a key; past its TTL it is a miss, and dropped once stale too
+
+        Args:
+          key: A key produced by make_key
+
+        Returns:
+          tuple: (hit, value) where value is a freshly decoded JSON object
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            now = self._clock()
+            if entry is not None and entry[0] <= now:
+                if entry[0] + self.config.stale_seconds <= now:
+                    self._remove(key)
+                    self._expired += 1
+                entry = None
+            if entry is None:
+                self._misses[key[0]] = self._misses.get(key[0], 0) + 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits[key[0]] = self._hits.get(key[0], 0) + 1
+            text = entry[1]
+        return True, json.loads(text)
+
+    def get_stale(self, key):
+        """
+        Look up a key whose TTL may have passed, without counting a hit or miss
+
+        Returns:
+          tuple: (hit, value) for an entry within its TTL plus stale_seconds
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] + self.config.stale_seconds <= self._clock():
+                return False, None
+            text = entry[1]
+        return True, json.loads(text)
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.config.ttls.get(key[0], 0)
+        text = value if isinstance(value, str) else json.dumps(value)
+        size = len(text)
+        if ttl <= 0 or size > self.config.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._clock() + ttl, text)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.config.max_entries
+                or self._bytes > self.config.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def _remove(self, key):
+        _, text = self._entries.pop(key)
+        self._bytes -= len(text)
+
+    async def get_or_fetch(self, endpoint, params, fetch, store=None):
+        """
+        Return a cached response or await fetch() to produce and store one
+
+        Args:
+          endpoint: Backend endpoint name
+          params: Request parameters
+          fetch: Zero-argument coroutine function that calls the backend
+          store: Optional PersistentCache consulted on a memory miss and written
+                 through on a backend fetch
+
+        Returns:
+          The decoded JSON response
+        """
+        if not self.is_cacheable(endpoint):
+            return await fetch()
+
+        key = self.make_key(endpoint, params)
+        hit, value = self.get(key)
+        if hit:
+            return value
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = concurrent.futures.Future()
+                self._inflight[key] = pending
+                leader = True
+            else:
+                self._coalesced += 1
+                leader = False
+
+        if not leader:
+            text = await asyncio.wrap_future(pending)
+            return json.loads(text)
+
+        try:
+            text = None
+            if store is not None:
+                text = await asyncio.to_thread(store.get, key)
+            if text is not None:
+                value = json.loads(text)
+            else:
+                try:
+                    value = await fetch()
+                except Exception as e:
+                    hit, value = self.get_stale(key)
+                    if not hit:
+                        raise
+                    logging.warning(f"Serving stale {endpoint} response: {str(e)}")
+                    with self._lock:
+                        self._stale += 1
+                    pending.set_result(json.dumps(value))
+                    return value
+                text = json.dumps(value)
+                if store is not None:
+                    await self._write_through(store, key, text)
+            self.set(key, text)
+            pending.set_result(text)
+            return value
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        except BaseException:
+            # the leader was cancelled; don't leave followers waiting forever
+            pending.set_exception(RuntimeError(f"{endpoint} request was cancelled"))
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def get_many(self, endpoint, params_list, fetch_many, store=None):
+        """
+        Resolve many requests to one endpoint, fetching all misses in a single call
+
+        Args:
+          endpoint: Backend endpoint whose per-request results are cached
+          params_list: Request parameters, one dict per request
+          fetch_many: Coroutine function taking the list of missing params and
+                      returning their results in the same order
+          store: Optional PersistentCache tier
+
+        Returns:
+          list: Results aligned with params_list
+        """
+        cacheable = self.is_cacheable(endpoint)
+        results = [None] * len(params_list)
+        missing = []
+        for i, params in enumerate(params_list):
+            if cacheable:
+                key = self.make_key(endpoint, params)
+                hit, value = self.get(key)
+                if not hit and store is not None:
+                    text = await asyncio.to_thread(store.get, key)
+                    if text is not None:
+                        self.set(key, text)
+                        hit, value = True, json.loads(text)
+                if hit:
+                    results[i] = value
+                    continue
+            missing.append(i)
+
+        if missing:
+            fetched = await fetch_many([params_list[i] for i in missing])
+            for i, value in zip(missing, fetched):
+                results[i] = value
+                # per-request failures inside a batch are returned, not cached
+                if not cacheable or (isinstance(value, dict) and "error" in value):
+                    continue
+                key = self.make_key(endpoint, params_list[i])
+                text = json.dumps(value)
+                self.set(key, text)
+                if store is not None:
+                    await self._write_through(store, key, text)
+        return results
+
+    async def _write_through(self, store, key, text):
+        try:
+            await asyncio.to_thread(store.set, key, text, self.config.ttls[key[0]])
+        except Exception as e:
+            logging.warning(f"Failed to persist {key[0]} response: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Report cache occupancy and hit/miss counters
+
+        Returns:
+          dict: Totals plus per-endpoint hits and misses
+        """
+        with self._lock:
+            hits = sum(self._hits.values())
+            misses = sum(self._misses.values())
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "expired": self._expired,
+                "stale": self._stale,
+                "hits_by_endpoint": dict(self._hits),
+                "misses_by_endpoint": dict(self._misses),
+            }
+
+
+def get_response_cache(config: Optional[CacheConfig] = None) -> ResponseCache:
+    """
+    Return the process-wide response cache, creating it on first use
+
+    Args:
+      config: Cache settings; only used on first call
+
+    Returns:
+      ResponseCache: The shared cache
+    """
+
+    def create():
+        resolved = config or CacheConfig.from_env()
+        logging.info(
+            f"Creating KG response cache (max_entries={resolved.max_entries}, "
+            f"max_bytes={resolved.max_bytes}, kg_version={resolved.kg_version}, "
+            f"model_version={resolved.model_version})"
+        )
+        return ResponseCache(resolved)
+
+    return REGISTRY.get("response_cache", create)
@@ -0,0 +1,451 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import httpx
+
+from json_stream import iter_json_items
+from kg_traffic import TrafficConfig, TrafficController
+from metrics import get_metrics
+from resources import REGISTRY
+
+DEFAULT_API_BASE = "http://192.168.24.13:1026"
+
+# (connect, read) timeouts in seconds; endpoints not listed use the default
+DEFAULT_ENDPOINT_TIMEOUTS = {
+    "hello_world": (3.05, 5),
+    "search_biological_entities": (3.05, 15),
+    "get_nodes_by_label": (3.05, 15),
+    "sample_triples": (3.05, 15),
+    "check_relationship": (3.05, 20),
+    "subgraph": (3.05, 30),
+    "entity_relationships": (3.05, 30),
+    "find_paths": (3.05, 30),
+    "predict_tail": (3.05, 30),
+    "get_prediction_rank": (3.05, 30),
+}
+
+
+@dataclass
+class ClientConfig:
+    """Connection pool settings for the EvoKG REST backend."""
+
+    api_base: str = DEFAULT_API_BASE
+    pool_maxsize: int = 32
+    keep_alive: bool = True
+    keepalive_expiry: float = 30
+    default_timeout: float = 30
+    endpoint_timeouts: Dict[str, tuple] = field(
+        default_factory=lambda: dict(DEFAULT_ENDPOINT_TIMEOUTS)
+    )
+    max_retries: int = 2
+    backoff_factor: float = 0.3
+    retry_statuses: tuple = (502, 503, 504)
+    # endpoints whose bodies are parsed incrementally (json_stream) instead of being
+    # decoded whole, and the most list elements read from one such body
+    stream_endpoints: tuple = ()
+    stream_max_items: int = 5000
+    # api bases of interchangeable backend replicas for the async client; empty
+    # means api_base alone
+    replicas: tuple = ()
+    traffic: TrafficConfig = field(default_factory=TrafficConfig)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a config from EVOKG_* environment variables, falling back to defaults
+
+        Returns:
+          ClientConfig: The resolved configuration
+        """
+        return cls(
+            api_base=os.environ.get("EVOKG_API_BASE", DEFAULT_API_BASE),
+            pool_maxsize=int(os.environ.get("EVOKG_POOL_MAXSIZE", 32)),
+            keep_alive=os.environ.get("EVOKG_KEEP_ALIVE", "1") != "0",
+            keepalive_expiry=float(os.environ.get("EVOKG_KEEPALIVE_EXPIRY", 30)),
+            default_timeout=float(os.environ.get("EVOKG_TIMEOUT", 30)),
+            max_retries=int(os.environ.get("EVOKG_HTTP_RETRIES", 2)),
+            backoff_factor=float(os.environ.get("EVOKG_HTTP_BACKOFF", 0.3)),
+            stream_endpoints=tuple(
+                e for e in os.environ.get("EVOKG_STREAM_ENDPOINTS", "").split(",") if e
+            ),
+            stream_max_items=int(os.environ.get("EVOKG_STREAM_MAX_ITEMS", 5000)),
+            replicas=tuple(
+                r.rstrip("/")
+                for r in os.environ.get("EVOKG_API_REPLICAS", "").split(",")
+                if r
+            ),
+            traffic=TrafficConfig.from_env(),
+        )
+
+    def timeout_for(self, endpoint):
+        return self.endpoint_timeouts.get(endpoint, self.default_timeout)
+
+    def read_timeout_for(self, endpoint) -> float:
+        timeout = self.timeout_for(endpoint)
+        return timeout[1] if isinstance(timeout, tuple) else timeout
+
+    def httpx_timeout_for(self, endpoint):
+        timeout = self.timeout_for(endpoint)
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(timeout)
+
+
+class AsyncKgClient:
+    """
+    Pooled async HTTP client for the EvoKG backend, built on httpx.
+
+    httpx connections are bound to the event loop that opened them, so one
+    httpx.AsyncClient (and connection pool) is kept per running loop and shared
+    by every agent whose tool calls run on that loop. It is closed when its loop
+    shuts down (asyncio.run cancels the pending closer task), by aclose() on that
+    loop, or by close() at shutdown. GETs are retried with exponential backoff on
+    transport errors and 502/503/504 responses.
+    Every attempt goes through a kg_traffic.TrafficController, which spreads
+    requests over config.replicas, bounds them with adaptive in-flight limits and
+    circuit breakers, and hedges slow lookups.
+    """
+
+    def __init__(self, config: ClientConfig, transport=None):
+        self.config = config
+        # optional httpx transport, e.g. httpx.MockTransport(LocalKgBackend().handle)
+        self.transport = transport
+        self.traffic = TrafficController(
+            config.traffic,
+            config.replicas or (config.api_base,),
+            config.read_timeout_for,
+            config.pool_maxsize,
+        )
+        # endpoints the server answered 404/405 for (e.g. batch endpoints of an
+        # older EvoKG server), so callers can switch to their fallback at once
+        self.unsupported = set()
+        self._lock = threading.Lock()
+        # loop -> (httpx.AsyncClient, task closing it when the loop shuts down)
+        self._loop_clients = weakref.WeakKeyDictionary()
+        self._requests = 0
+        self._retries = 0
+        self._errors = 0
+        self._connections = 0
+
+    def url_for(self, endpoint):
+        return f"{self.config.api_base}/{endpoint}"
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # clients of loops closed without shutting down can no longer be
+            # closed; drop them (and their pools) instead of keeping them around,
+            # along with their closer task, which that loop will never run
+            for closed in [other for other in self._loop_clients if other.is_closed()]:
+                _, closer = self._loop_clients.pop(closed)
+                closer._log_destroy_pending = False
+            entry = self._loop_clients.get(loop)
+            if entry is None:
+                config = self.config
+                max_keepalive = config.pool_maxsize if config.keep_alive else 0
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.config.pool_maxsize,
+                        max_keepalive_connections=max_keepalive,
+                        keepalive_expiry=self.config.keepalive_expiry,
+                    ),
+                    timeout=self.config.default_timeout,
+                    transport=self.transport,
+                )
+                closer = loop.create_task(self._close_at_shutdown(loop, client))
+                entry = self._loop_clients[loop] = (client, closer)
+            return entry[0]
+
+    async def _close_at_shutdown(self, loop, client):
+        # waits until cancelled, which asyncio.run does to every pending task
+        # before closing its loop, then closes the loop's client
+        try:
+            await asyncio.Event().wait()
+        finally:
+            with self._lock:
+                entry = self._loop_clients.get(loop)
+                if entry is not None and entry[0] is client:
+                    del self._loop_clients[loop]
+            await client.aclose()
+
+    async def aclose(self):
+        """Close the current event loop's httpx client."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._loop_clients.pop(loop, None)
+        if entry is not None:
+            client, closer = entry
+            closer.cancel()
+            await client.aclose()
+
+    def close(self, timeout: float = 5.0):
+        """
+        Close the httpx clients of every event loop, e.g. at process shutdown
+
+        Clients of loops running in other threads are closed on their loop, and
+        those of idle loops by running the loop until closed.
+
+        Args:
+          timeout: Seconds to wait for each running loop's client to close
+        """
+        with self._lock:
+            entries = list(self._loop_clients.items())
+            self._loop_clients.clear()
+        for loop, (client, closer) in entries:
+            if loop.is_closed():
+                continue
+            try:
+                if loop.is_running():
+                    loop.call_soon_threadsafe(closer.cancel)
+                    asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(
+                        timeout
+                    )
+                else:
+                    closer.cancel()
+                    loop.run_until_complete(client.aclose())
+            except Exception as e:
+                logging.warning(f"Failed to close KG client pool: {str(e)}")
+
+    async def _trace(self, event_name, info):
+        # httpcore emits this once per newly established TCP connection
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self._connections += 1
+
+    async def get_json(self, endpoint, params=None, timeout=None):
+        """
+        GET an endpoint on the backend and decode the JSON body
+
+        Args:
+          endpoint: Endpoint path relative to api_base
+          params: Query parameters
+          timeout: Override for the per-endpoint timeout, in seconds
+
+        Returns:
+          The decoded JSON response
+        """
+        return await self._request("GET", endpoint, params=params, timeout=timeout)
+
+    async def post_json(self, endpoint, payload, timeout=None):
+        """
+        POST a JSON payload to an endpoint (used for batched requests); not retried
+
+        Args:
+          endpoint: Endpoint path relative to api_base
+          payload: JSON-serializable request body
+          timeout: Override for the per-endpoint timeout, in seconds
+
+        Returns:
+          The decoded JSON response
+        """
+        return await self._request("POST", endpoint, payload=payload, timeout=timeout)
+
+    async def stream_items(self, endpoint, params=None, timeout=None):
+        """
+        GET an endpoint and parse its JSON body incrementally as it arrives
+
+        Closing the generator early (e.g. once a node/edge budget is reached) closes
+        the response, dropping the connection instead of reading the rest of the
+        body. Not retried, since events may already have been consumed.
+
+        Args:
+          endpoint: Endpoint path relative to api_base
+          params: Query parameters
+          timeout: Override for the per-endpoint timeout, in seconds
+
+        Yields:
+          tuple: json_stream.ItemStream events for the body
+        """
+        client = self._client()
+        if timeout is None:
+            timeout = self.config.httpx_timeout_for(endpoint)
+        replica = self.traffic.choose(endpoint)
+        await self.traffic.acquire(replica, endpoint)
+        with self._lock:
+            self._requests += 1
+        received = 0
+        start = time.perf_counter()
+        ok = None
+
+        async def body(response):
+            nonlocal received
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                yield chunk
+
+        try:
+            async with client.stream(
+                "GET",
+                f"{replica}/{endpoint}",
+                params=params,
+                timeout=timeout,
+                extensions={"trace": self._trace},
+            ) as response:
+                # the response's status is the outcome; reading is up to the caller
+                ok = response.status_code < 500
+                self.traffic.release(replica, endpoint, ok, time.perf_counter() - start)
+                response.raise_for_status()
+                async for event in iter_json_items(body(response)):
+                    yield event
+        except Exception as e:
+            if ok is None:
+                ok = not isinstance(e, httpx.TransportError)
+                self.traffic.release(replica, endpoint, ok, time.perf_counter() - start)
+            with self._lock:
+                self._errors += 1
+            get_metrics().inc("evokg_kg_errors_total", endpoint=endpoint)
+            raise
+        except BaseException:
+            if ok is None:
+                self.traffic.release(replica, endpoint, None, 0.0)
+            raise
+        finally:
+            # bytes actually read, which is less than the body when closed early
+            get_metrics().observe(
+                "evokg_kg_response_bytes", received, endpoint=endpoint
+            )
+
+    async def _request(self, method, endpoint, params=None, payload=None, timeout=None):
+        client = self._client()
+        if timeout is None:
+            timeout = self.config.httpx_timeout_for(endpoint)
+        args = (client, method, endpoint, params, payload, timeout)
+        try:
+            delay = self.traffic.hedge_delay(endpoint) if method == "GET" else None
+            if delay is None:
+                response = await self._send(*args)
+            else:
+                response = await self._hedged(delay, *args)
+            response.raise_for_status()
+            get_metrics().observe(
+                "evokg_kg_response_bytes", len(response.content), endpoint=endpoint
+            )
+            return response.json()
+        except Exception:
+            with self._lock:
+                self._errors += 1
+            get_metrics().inc("evokg_kg_errors_total", endpoint=endpoint)
+            raise
+
+    async def _send(self, client, method, endpoint, params, payload, timeout):
+        # one request with its retries; each attempt picks a replica and holds an
+        # in-flight slot on it, and its outcome feeds the limiter and breaker
+        max_retries = self.config.max_retries if method == "GET" else 0
+        attempt = 0
+        while True:
+            replica = self.traffic.choose(endpoint)
+            await self.traffic.acquire(replica, endpoint)
+            start = time.perf_counter()
+            ok = None
+            try:
+                response = await client.request(
+                    method,
+                    f"{replica}/{endpoint}",
+                    params=params,
+                    json=payload,
+                    timeout=timeout,
+                    extensions={"trace": self._trace},
+                )
+                ok = response.status_code < 500
+                retryable = response.status_code in self.config.retry_statuses
+            except httpx.TransportError:
+                ok = False
+                if attempt >= max_retries:
+                    raise
+                retryable = True
+                response = None
+            finally:
+                # every attempt counts, including a last one that raised
+                with self._lock:
+                    self._requests += 1
+                self.traffic.release(replica, endpoint, ok, time.perf_counter() - start)
+
+            if not retryable or attempt >= max_retries:
+                return response
+            with self._lock:
+                self._retries += 1
+            await asyncio.sleep(self.config.backoff_factor * (2**attempt))
+            attempt += 1
+
+    async def _hedged(self, delay, client, method, endpoint, *args):
+        # if the first request has not answered within delay, send a second one
+        # (to the least-loaded replica, usually another) and keep the first answer
+        primary = asyncio.ensure_future(self._send(client, method, endpoint, *args))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self.traffic.can_hedge(endpoint):
+                return await primary
+            hedge = asyncio.ensure_future(self._send(client, method, endpoint, *args))
+            tasks.add(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        winner = "primary" if task is primary else "hedge"
+                        get_metrics().inc(
+                            "evokg_kg_hedged_total", endpoint=endpoint, winner=winner
+                        )
+                        return task.result()
+            # both failed; report the first request's error
+            return primary.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def pool_stats(self) -> dict:
+        """
+        Report connection reuse across all per-loop pools
+
+        Returns:
+          dict: Request, connection, retry and error counts plus the reuse rate
+        """
+        with self._lock:
+            stats = {
+                "requests": self._requests,
+                "retries": self._retries,
+                "errors": self._errors,
+                "connections_opened": self._connections,
+                "event_loops": len(self._loop_clients),
+            }
+        requests_sent = stats["requests"]
+        stats["reuse_rate"] = (
+            1 - stats["connections_opened"] / requests_sent if requests_sent else 0.0
+        )
+        return stats
+
+
+def get_async_client(
+    config: Optional[ClientConfig] = None, transport=None
+) -> AsyncKgClient:
+    """
+    Return the shared async client for config.api_base, creating it on first use
+
+    Args:
+      config: Pool settings; only used the first time a given api_base is requested
+      transport: Optional httpx transport for the client, e.g. a local stand-in backend
+
+    Returns:
+      AsyncKgClient: The process-wide async client for that backend
+    """
+    if config is None:
+        config = ClientConfig.from_env()
+
+    def create():
+        logging.info(
+            f"Creating async KG client for {config.api_base} "
+            f"(pool_maxsize={config.pool_maxsize})"
+        )
+        return AsyncKgClient(config, transport=transport)
+
+    return REGISTRY.get(f"async_kg_client:{config.api_base}", create)
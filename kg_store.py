@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    endpoint TEXT NOT NULL,
+    version TEXT NOT NULL,
+    params TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (endpoint, version, params)
+)
+"""
+
+
+class PersistentCache:
+    """
+    SQLite-backed tier under the in-memory ResponseCache that survives restarts.
+
+    Rows are keyed the same way as ResponseCache keys: endpoint, version tag
+    (KG version, plus model version for prediction endpoints) and normalized
+    params. The database runs in WAL mode so several Streamlit worker processes
+    can share one file; each thread gets its own connection.
+    """
+
+    def __init__(self, directory, filename="kg_responses.sqlite3"):
+        self.path = pathlib.Path(directory) / filename
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_key(key):
+        endpoint, version, params = key
+        return endpoint, version, json.dumps(params)
+
+    def get(self, key) -> Optional[str]:
+        """
+        Fetch the stored JSON text for a ResponseCache key
+
+        Args:
+          key: A key produced by ResponseCache.make_key
+
+        Returns:
+          Optional[str]: The JSON body, or None if missing or expired
+        """
+        row = (
+            self._conn()
+            .execute(
+                "SELECT body FROM responses WHERE endpoint = ? AND version = ? "
+                "AND params = ? AND expires_at > ?",
+                (*self._row_key(key), time.time()),
+            )
+            .fetchone()
+        )
+        with self._lock:
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+        return row[0]
+
+    def set(self, key, text: str, ttl: float):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            (*self._row_key(key), text, now, now + ttl),
+        )
+        conn.commit()
+        with self._lock:
+            self._writes += 1
+
+    def prune(self):
+        """Delete expired rows."""
+        conn = self._conn()
+        deleted = conn.execute(
+            "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+        conn.commit()
+        return deleted
+
+    def load_into(self, cache, limit=1000):
+        """
+        Copy the most recently stored live rows into the in-memory cache
+
+        Args:
+          cache: The ResponseCache to populate
+          limit: Maximum number of rows to load
+
+        Returns:
+          int: Number of entries loaded
+        """
+        now = time.time()
+        rows = (
+            self._conn()
+            .execute(
+                "SELECT endpoint, version, params, body, expires_at FROM responses "
+                "WHERE expires_at > ? ORDER BY created_at DESC LIMIT ?",
+                (now, limit),
+            )
+            .fetchall()
+        )
+        loaded = 0
+        for endpoint, version, params, body, expires_at in rows:
+            key = (endpoint, version, tuple(tuple(p) for p in json.loads(params)))
+            # rows written under another KG/model version are left on disk
+            if key != cache.make_key(endpoint, dict(key[2])):
+                continue
+            cache.set(key, body, ttl=expires_at - now)
+            loaded += 1
+        return loaded
+
+    async def prewarm(self, queries: List[dict], cache, client):
+        """
+        Make sure each popular query is on disk and in memory, fetching misses
+
+        Args:
+          queries: Dicts with "endpoint" and "params" keys
+          cache: The ResponseCache whose keys and TTLs are used
+          client: The AsyncKgClient used to fetch missing responses
+
+        Returns:
+          int: Number of queries warmed
+        """
+        warmed = 0
+        for query in queries:
+            endpoint, params = query["endpoint"], query.get("params", {})
+            if not cache.is_cacheable(endpoint):
+                continue
+            key = cache.make_key(endpoint, params)
+            ttl = cache.config.ttls[endpoint]
+            text = self.get(key)
+            if text is None:
+                try:
+                    text = json.dumps(await client.get_json(endpoint, params=params))
+                except Exception as e:
+                    logging.warning(f"Failed to prewarm {endpoint} {params}: {str(e)}")
+                    continue
+                self.set(key, text, ttl)
+            cache.set(key, text)
+            warmed += 1
+        return warmed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "hits": self._hits,
+                "misses": self._misses,
+                "writes": self._writes,
+            }
+
+
+def load_warm_queries(path) -> List[dict]:
+    """Read a JSON list of {"endpoint": ..., "params": {...}} queries."""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
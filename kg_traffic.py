@@ -0,0 +1,440 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence
+
+from metrics import get_metrics
+
+# quick, idempotent lookups for which a second request beats waiting on a slow one
+DEFAULT_HEDGE_ENDPOINTS = (
+    "search_biological_entities",
+    "get_nodes_by_label",
+    "check_relationship",
+)
+
+
+class BackendUnavailable(Exception):
+    """A KG request refused by the traffic layer without reaching the backend."""
+
+
+class CircuitOpen(BackendUnavailable):
+    pass
+
+
+class Overloaded(BackendUnavailable):
+    pass
+
+
+@dataclass
+class TrafficConfig:
+    """Concurrency limits, circuit breaking and hedging for KG requests."""
+
+    enabled: bool = True
+    # in-flight requests per (replica, endpoint): start (0: the client's
+    # connection pool size), floor and ceiling
+    initial_limit: float = 0
+    min_limit: float = 1
+    max_limit: float = 64
+    # multiplicative decrease on congestion, at most once per decrease_interval
+    backoff: float = 0.5
+    decrease_interval: float = 1.0
+    # a request slower than this fraction of its read timeout signals congestion
+    slow_fraction: float = 0.25
+    # longest wait for an in-flight slot while the limit was cut within the last
+    # congestion_window seconds; otherwise callers wait up to the endpoint's
+    # read timeout, as they would for the backend itself
+    max_wait: float = 2.0
+    congestion_window: float = 10.0
+    # consecutive failures opening a circuit, and how long it stays open
+    failure_threshold: int = 5
+    open_seconds: float = 10.0
+    hedge_endpoints: tuple = DEFAULT_HEDGE_ENDPOINTS
+    # a hedge is sent once the first request is slower than this quantile of the
+    # endpoint's recent latencies (hedge_delay until enough are known)
+    hedge_quantile: float = 0.95
+    hedge_delay: float = 0.3
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a config from EVOKG_TRAFFIC* / EVOKG_LIMIT_* / EVOKG_CIRCUIT_* /
+        EVOKG_HEDGE_* environment variables
+
+        Returns:
+          TrafficConfig: The resolved configuration
+        """
+        hedge_endpoints = os.environ.get("EVOKG_HEDGE_ENDPOINTS")
+        return cls(
+            enabled=os.environ.get("EVOKG_TRAFFIC", "1") != "0",
+            initial_limit=float(os.environ.get("EVOKG_LIMIT_INITIAL", 0)),
+            min_limit=float(os.environ.get("EVOKG_LIMIT_MIN", 1)),
+            max_limit=float(os.environ.get("EVOKG_LIMIT_MAX", 64)),
+            max_wait=float(os.environ.get("EVOKG_LIMIT_MAX_WAIT", 2.0)),
+            failure_threshold=int(os.environ.get("EVOKG_CIRCUIT_FAILURES", 5)),
+            open_seconds=float(os.environ.get("EVOKG_CIRCUIT_OPEN_SECONDS", 10.0)),
+            hedge_endpoints=(
+                DEFAULT_HEDGE_ENDPOINTS
+                if hedge_endpoints is None
+                else tuple(e for e in hedge_endpoints.split(",") if e)
+            ),
+            hedge_delay=float(os.environ.get("EVOKG_HEDGE_DELAY", 0.3)),
+        )
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "granted", "abandoned")
+
+    def __init__(self, loop, future):
+        self.loop = loop
+        self.future = future
+        self.granted = False
+        self.abandoned = False
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AimdLimiter:
+    """
+    Adaptive in-flight limit for one (replica, endpoint).
+
+    Additive increase, multiplicative decrease: each fast success raises the
+    limit by 1/limit (about one per round trip at full use), and a failure or a
+    request slower than slow_after cuts it by `backoff`, at most once per
+    decrease_interval so one burst of timeouts is a single signal. Callers over
+    the limit queue in FIFO order: for at most max_wait while the endpoint is
+    congested (the limit was cut within congestion_window), else for up to the
+    request timeout, so healthy but slow traffic is queued, never dropped.
+    Thread-safe; waiters may belong to different event loops.
+    """
+
+    def __init__(
+        self,
+        config: TrafficConfig,
+        timeout: float,
+        pool_size: Optional[int] = None,
+    ):
+        self.config = config
+        self.timeout = timeout
+        self.slow_after = config.slow_fraction * timeout
+        # start at the configured limit, else at the connection pool size
+        start = config.initial_limit or pool_size or config.max_limit
+        self.limit = min(max(start, config.min_limit), config.max_limit)
+        self.inflight = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._last_decrease = None
+
+    def congested(self) -> bool:
+        last = self._last_decrease
+        return (
+            last is not None and time.monotonic() - last < self.config.congestion_window
+        )
+
+    async def acquire(self):
+        """Take an in-flight slot; raises Overloaded if none frees up in time."""
+        with self._lock:
+            if self.inflight < int(self.limit) and not self._waiters:
+                self.inflight += 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = _Waiter(loop, loop.create_future())
+            self._waiters.append(waiter)
+            wait = self.config.max_wait if self.congested() else self.timeout
+        try:
+            await asyncio.wait_for(waiter.future, wait)
+        except BaseException as e:
+            with self._lock:
+                waiter.abandoned = True
+                granted = waiter.granted
+            if granted:
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise Overloaded(
+                    f"{self.inflight} requests in flight (limit {int(self.limit)})"
+                ) from None
+            raise
+
+    def release(self):
+        """Free a slot, handing it to the oldest live waiter if under the limit."""
+        with self._lock:
+            if self.inflight <= int(self.limit):
+                while self._waiters:
+                    waiter = self._waiters.popleft()
+                    if waiter.abandoned:
+                        continue
+                    try:
+                        waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+                    except RuntimeError:
+                        # the waiter's event loop is closed
+                        continue
+                    waiter.granted = True
+                    return
+            self.inflight -= 1
+
+    def feedback(self, ok: bool, latency: float):
+        """Adjust the limit from the outcome of a request that held a slot."""
+        with self._lock:
+            if ok and latency <= self.slow_after:
+                self.limit = min(self.config.max_limit, self.limit + 1 / self.limit)
+                return
+            now = time.monotonic()
+            last = self._last_decrease
+            if last is None or now - last >= self.config.decrease_interval:
+                self._last_decrease = now
+                self.limit = max(
+                    self.config.min_limit, self.limit * self.config.backoff
+                )
+
+
+class CircuitBreaker:
+    """
+    Closed, open or half-open state of one (replica, endpoint).
+
+    failure_threshold consecutive failures open the circuit: requests are
+    refused without I/O for open_seconds, then one probe is let through
+    (half-open) and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, config: TrafficConfig, on_change: Optional[Callable] = None):
+        self.config = config
+        self.on_change = on_change
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; claims the probe when half-open."""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.config.open_seconds:
+                    return False
+                self._set("half_open")
+            if self.state == "half_open":
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def retry_after(self) -> float:
+        with self._lock:
+            elapsed = time.monotonic() - self._opened_at
+            return max(self.config.open_seconds - elapsed, 0.0)
+
+    def record(self, ok: Optional[bool]):
+        """Record an outcome: True, False, or None (cancelled, no signal)."""
+        with self._lock:
+            self._probing = False
+            if ok is None:
+                return
+            if ok:
+                self.failures = 0
+                if self.state != "closed":
+                    self._set("closed")
+                return
+            self.failures += 1
+            if self.state == "half_open" or (
+                self.state == "closed"
+                and self.failures >= self.config.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
+                self._set("open")
+
+    def _set(self, state):
+        self.state = state
+        if self.on_change is not None:
+            self.on_change(state)
+
+
+class TrafficController:
+    """
+    Client-side traffic layer between AsyncKgClient and the backend replicas.
+
+    Every request attempt picks the least-loaded replica (lowest in-flight /
+    limit, then lowest recent latency) among those whose circuit for the
+    endpoint admits it, takes a slot from that (replica, endpoint)'s AIMD
+    limiter, and reports its outcome back to both. When every circuit is open,
+    or the endpoint is congested and no slot frees up within max_wait, the
+    request fails fast with a BackendUnavailable error instead of queueing
+    behind a struggling backend for the full timeout; the response cache then
+    answers from a stale entry if it has one. Slow idempotent lookups
+    (hedge_endpoints) may be hedged (see hedge_delay). With enabled=False
+    requests go to the first replica unlimited.
+    """
+
+    def __init__(
+        self,
+        config: TrafficConfig,
+        replicas: Sequence[str],
+        timeout_for: Callable[[str], float],
+        pool_size: Optional[int] = None,
+    ):
+        self.config = config
+        self.replicas = tuple(replicas)
+        self.timeout_for = timeout_for
+        # starting limit when config.initial_limit is 0
+        self.pool_size = pool_size
+        self.metrics = get_metrics()
+        self._lock = threading.Lock()
+        self._limiters: Dict[tuple, AimdLimiter] = {}
+        self._breakers: Dict[tuple, CircuitBreaker] = {}
+        self._latency: Dict[str, float] = {r: 0.0 for r in self.replicas}
+        self._samples: Dict[str, deque] = {}
+
+    def _limiter(self, replica, endpoint) -> AimdLimiter:
+        key = (replica, endpoint)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    limiter = AimdLimiter(
+                        self.config, self.timeout_for(endpoint), self.pool_size
+                    )
+                    self._limiters[key] = limiter
+        return limiter
+
+    def _breaker(self, replica, endpoint) -> CircuitBreaker:
+        key = (replica, endpoint)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+
+                    def on_change(state):
+                        logging.warning(f"KG circuit {replica}/{endpoint} is {state}")
+                        self.metrics.inc(
+                            "evokg_kg_circuit_transitions_total",
+                            replica=replica,
+                            endpoint=endpoint,
+                            state=state,
+                        )
+
+                    breaker = CircuitBreaker(self.config, on_change)
+                    self._breakers[key] = breaker
+        return breaker
+
+    def _load(self, replica, endpoint) -> tuple:
+        limiter = self._limiter(replica, endpoint)
+        return (limiter.inflight / limiter.limit, self._latency[replica])
+
+    def choose(self, endpoint) -> str:
+        """
+        The replica to send a request for endpoint to
+
+        Raises:
+          CircuitOpen: Every replica's circuit for the endpoint is open
+        """
+        if not self.config.enabled:
+            return self.replicas[0]
+        for replica in sorted(self.replicas, key=lambda r: self._load(r, endpoint)):
+            if self._breaker(replica, endpoint).allow():
+                return replica
+        retry_after = min(
+            self._breaker(r, endpoint).retry_after() for r in self.replicas
+        )
+        self.metrics.inc("evokg_kg_rejected_total", endpoint=endpoint, reason="open")
+        raise CircuitOpen(
+            f"EvoKG backend is failing for {endpoint}; retry in {retry_after:.0f} s"
+        )
+
+    async def acquire(self, replica, endpoint):
+        """
+        Take an in-flight slot on a replica; release() must follow
+
+        Raises:
+          Overloaded: No slot freed up within max_wait
+        """
+        if not self.config.enabled:
+            return
+        try:
+            await self._limiter(replica, endpoint).acquire()
+        except BaseException as e:
+            # the half-open probe, if this was it, was never sent
+            self._breaker(replica, endpoint).record(None)
+            if isinstance(e, Overloaded):
+                self.metrics.inc(
+                    "evokg_kg_rejected_total", endpoint=endpoint, reason="overloaded"
+                )
+                raise Overloaded(
+                    f"EvoKG backend is saturated for {endpoint}: {str(e)}"
+                ) from None
+            raise
+
+    def release(self, replica, endpoint, ok: Optional[bool], latency: float):
+        """
+        Return a slot and report the attempt's outcome
+
+        Args:
+          replica: The replica from choose()
+          endpoint: Endpoint requested
+          ok: True for a response below 500, False for a 5xx or transport error,
+              None if the attempt was cancelled (e.g. a losing hedge)
+          latency: Seconds from sending to the outcome
+        """
+        if not self.config.enabled:
+            return
+        limiter = self._limiter(replica, endpoint)
+        limiter.release()
+        self._breaker(replica, endpoint).record(ok)
+        if ok is None:
+            return
+        limiter.feedback(ok, latency)
+        with self._lock:
+            self._latency[replica] = 0.8 * self._latency[replica] + 0.2 * latency
+            if ok:
+                samples = self._samples.setdefault(endpoint, deque(maxlen=200))
+                samples.append(latency)
+
+    def hedge_delay(self, endpoint) -> Optional[float]:
+        """Seconds before a GET to endpoint is hedged, or None if it is not."""
+        if not self.config.enabled or endpoint not in self.config.hedge_endpoints:
+            return None
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if len(samples) < 20:
+            return self.config.hedge_delay
+        return samples[int(self.config.hedge_quantile * (len(samples) - 1))]
+
+    def can_hedge(self, endpoint) -> bool:
+        """Hedge only while some replica has spare capacity for the endpoint."""
+        return any(
+            self._load(r, endpoint)[0] < 0.5
+            and self._breaker(r, endpoint).state == "closed"
+            for r in self.replicas
+        )
+
+    def stats(self) -> dict:
+        """
+        Report limits, load and circuit states
+
+        Returns:
+          dict: Per "replica endpoint": limit, in-flight requests and circuit
+                state; per replica: smoothed latency in seconds
+        """
+        with self._lock:
+            limiters = dict(self._limiters)
+            breakers = dict(self._breakers)
+            latency = dict(self._latency)
+        return {
+            "endpoints": {
+                f"{replica} {endpoint}": {
+                    "limit": round(limiter.limit, 2),
+                    "inflight": limiter.inflight,
+                    "circuit": breakers[(replica, endpoint)].state
+                    if (replica, endpoint) in breakers
+                    else "closed",
+                }
+                for (replica, endpoint), limiter in sorted(limiters.items())
+            },
+            "latency": {r: round(s, 4) for r, s in latency.items()},
+        }
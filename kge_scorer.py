@@ -0,0 +1,433 @@
+import json
+import logging
+import os
+import pathlib
+from typing import List, Optional
+
+import numpy as np
+
+from ann_index import IvfIndex
+from relation_catalog import CATALOG
+from resources import REGISTRY
+
+MODELS = ("TransE", "DistMult", "ComplEx")
+
+# backend endpoints the scorer can answer; each maps to the method of the same name
+ENDPOINTS = {
+    "predict_tail",
+    "get_prediction_rank",
+    "predict_tail_batch",
+    "prediction_rank_batch",
+}
+
+ENTITY_EMBEDDINGS = "entity_embeddings.npy"
+RELATION_EMBEDDINGS = "relation_embeddings.npy"
+ENTITY_IDS = "entity_ids.json"
+RELATION_IDS = "relation_ids.json"
+META = "meta.json"
+
+
+class EmbeddingScorer:
+    """
+    In-process tail scorer over exported KGE embeddings.
+
+    Embeddings are opened with np.load(mmap_mode="r"), i.e. as numpy.memmap views,
+    so every Streamlit worker process maps the same page-cache pages instead of
+    holding its own copy. Scores follow PyKEEN's conventions:
+
+    - TransE: -||h + r - t||_p (closer to zero is a stronger prediction)
+    - DistMult: sum(h * r * t)
+    - ComplEx: Re(sum(h * r * conj(t))), with complex embeddings stored either as
+      a complex dtype or as [real | imaginary] halves of a real array
+
+    All entities are scored with one vectorized pass and top-k is taken with
+    np.argpartition, so only k scores are ever sorted. With an IVF index attached
+    and mode="ann", predict_tail only scores the tails in the probed clusters.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        entity_ids: List[str],
+        entity_embeddings: np.ndarray,
+        relations: List[str],
+        relation_embeddings: np.ndarray,
+        norm: int = 1,
+        chunk_size: int = 65536,
+        ann=None,
+        mode: str = "exact",
+    ):
+        if model not in MODELS:
+            raise ValueError(f"Unsupported model {model!r}; expected one of {MODELS}")
+        if model == "TransE" and norm not in (1, 2):
+            raise ValueError(f"Unsupported TransE norm {norm!r}; expected 1 or 2")
+        # tail_matrix() reinterprets complex rows as float32 (re, im) pairs without
+        # copying, which is only correct for complex64
+        if (
+            np.iscomplexobj(entity_embeddings)
+            and entity_embeddings.dtype != np.complex64
+        ):
+            raise ValueError(
+                f"Complex entity embeddings must be complex64, got "
+                f"{entity_embeddings.dtype}; re-export them with export_embeddings"
+            )
+        self.model = model
+        self.norm = norm
+        self.chunk_size = chunk_size
+        self.entity_ids = list(entity_ids)
+        self.entity_index = {eid: i for i, eid in enumerate(self.entity_ids)}
+        self.relations = list(relations)
+        self.relation_index = {rel: i for i, rel in enumerate(self.relations)}
+
+        self.entity_embeddings = entity_embeddings
+        self.relation_embeddings = relation_embeddings
+        self._entity_sq_norms = None
+        # optional ann_index.IvfIndex; predict_tail uses it when mode == "ann"
+        self.ann = ann
+        self.mode = mode
+
+    @classmethod
+    def load(cls, directory, model: Optional[str] = None, **kwargs):
+        """
+        Open an exported embedding directory (see export_embeddings)
+
+        Args:
+          directory: Directory holding the .npy arrays and id lists
+          model: Scoring model; defaults to the one recorded in meta.json
+
+        Returns:
+          EmbeddingScorer: A scorer backed by memory-mapped arrays
+        """
+        directory = pathlib.Path(directory)
+        meta = {}
+        if (directory / META).exists():
+            meta = json.loads((directory / META).read_text())
+        model = model or meta.get("model", "TransE")
+        kwargs.setdefault("norm", meta.get("norm", 1))
+        return cls(
+            model,
+            json.loads((directory / ENTITY_IDS).read_text()),
+            np.load(directory / ENTITY_EMBEDDINGS, mmap_mode="r"),
+            json.loads((directory / RELATION_IDS).read_text()),
+            np.load(directory / RELATION_EMBEDDINGS, mmap_mode="r"),
+            **kwargs,
+        )
+
+    def _resolve(self, query):
+        head = self.entity_index.get(str(query.get("head")))
+        relation = self.relation_index.get(query.get("relation"))
+        if head is None:
+            return None, None, f"Unknown head entity: {query.get('head')}"
+        if relation is None:
+            return None, None, f"Unknown relation: {query.get('relation')}"
+        return head, relation, None
+
+    def _sq_norms(self):
+        if self._entity_sq_norms is None:
+            sq = np.empty(len(self.entity_ids), dtype=np.float32)
+            for start in range(0, len(sq), self.chunk_size):
+                block = np.asarray(
+                    self.entity_embeddings[start : start + self.chunk_size]
+                )
+                sq[start : start + len(block)] = np.einsum("ij,ij->i", block, block)
+            self._entity_sq_norms = sq
+        return self._entity_sq_norms
+
+    @property
+    def metric(self):
+        """ "l2" when tails are ranked by distance (TransE), "ip" for dot products."""
+        return "l2" if self.model == "TransE" else "ip"
+
+    def tail_matrix(self):
+        """Real-valued (n_entities, D) view of the tail embeddings, without copying."""
+        entities = self.entity_embeddings
+        if self.model == "ComplEx" and np.iscomplexobj(entities):
+            return entities.view(np.float32)
+        return entities
+
+    def query_vectors(self, heads, relations) -> np.ndarray:
+        """
+        Combine head and relation embeddings into one real query vector per row
+
+        For "ip" models the score is query @ tail; for TransE it is the negative
+        p-norm distance between query and tail.
+
+        Args:
+          heads: Entity indices, one per row
+          relations: Relation indices, one per row
+
+        Returns:
+          np.ndarray: A (rows, D) float32 matrix matching tail_matrix()
+        """
+        h = np.asarray(self.entity_embeddings[heads])
+        r = np.asarray(self.relation_embeddings[relations])
+        if self.model == "DistMult":
+            return h * r
+        if self.model == "ComplEx":
+            # Re(<q, conj(t)>) is a real dot product over (re, im) components
+            q = _as_complex(h) * _as_complex(r)
+            if np.iscomplexobj(self.entity_embeddings):
+                return q.astype(np.complex64).view(np.float32)
+            return np.concatenate([q.real, q.imag], axis=1).astype(np.float32)
+        return h + r
+
+    def score_tails(self, heads, relations) -> np.ndarray:
+        """
+        Score every entity as the tail of each (head, relation) row
+
+        Args:
+          heads: Entity indices, one per row
+          relations: Relation indices, one per row
+
+        Returns:
+          np.ndarray: A (rows, n_entities) float32 score matrix
+        """
+        q = self.query_vectors(heads, relations)
+        tails = self.tail_matrix()
+        if self.metric == "ip":
+            return q @ tails.T
+
+        # TransE: distance between h + r and every t
+        if self.norm == 2:
+            sq = (q * q).sum(axis=1)[:, None] - 2 * (q @ tails.T) + self._sq_norms()
+            return -np.sqrt(np.maximum(sq, 0))
+        # L1: |q - t| is computed one query row at a time into a reused
+        # (chunk_size, D) buffer, so memory stays at chunk_size x D floats
+        # whatever the number of rows
+        n = len(self.entity_ids)
+        scores = np.empty((len(q), n), dtype=np.float32)
+        buffer = np.empty((min(self.chunk_size, n), q.shape[1]), dtype=np.float32)
+        for start in range(0, n, self.chunk_size):
+            block = np.asarray(tails[start : start + self.chunk_size])
+            diff = buffer[: len(block)]
+            for row, query in enumerate(q):
+                np.subtract(block, query, out=diff)
+                np.abs(diff, out=diff)
+                np.sum(diff, axis=1, out=scores[row, start : start + len(block)])
+        np.negative(scores, out=scores)
+        return scores
+
+    def score_candidates(self, query, candidates) -> np.ndarray:
+        """
+        Exactly score a subset of tails for one query vector
+
+        Args:
+          query: A (D,) row of query_vectors()
+          candidates: Sorted entity indices to score
+
+        Returns:
+          np.ndarray: One score per candidate
+        """
+        block = np.asarray(self.tail_matrix()[candidates])
+        if self.metric == "ip":
+            return block @ query
+        return -np.linalg.norm(block - query, ord=self.norm, axis=1)
+
+    def predict_tail_batch(self, queries: List[dict]) -> List[dict]:
+        """
+        Score every query in one vectorized pass and return the top-k tails of each
+
+        Args:
+          queries: Dicts with head, relation and optional top_k_predictions
+
+        Returns:
+          List[dict]: One predict_tail-shaped result (or error) per query
+        """
+        results: List[Optional[dict]] = [None] * len(queries)
+        rows, heads, rels, ks = [], [], [], []
+        for i, query in enumerate(queries):
+            head, relation, error = self._resolve(query)
+            if error:
+                results[i] = {"head": query.get("head"), "error": error}
+                continue
+            rows.append(i)
+            heads.append(head)
+            rels.append(relation)
+            ks.append(max(1, int(query.get("top_k_predictions", 10))))
+
+        if rows and self.ann is not None and self.mode == "ann":
+            q = self.query_vectors(heads, rels)
+            for row, i in enumerate(rows):
+                relation = queries[i]["relation"]
+                top, top_scores = self.ann.search(
+                    self, q[row], ks[row], tail_type=CATALOG.tail_type(relation)
+                )
+                results[i] = self._prediction(queries[i], top, top_scores)
+        elif rows:
+            scores = self.score_tails(heads, rels)
+            k = min(max(ks), scores.shape[1])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for row, i in enumerate(rows):
+                k = ks[row]
+                results[i] = self._prediction(
+                    queries[i], top[row, :k], top_scores[row, :k]
+                )
+        return results
+
+    def _prediction(self, query, top, top_scores) -> dict:
+        return {
+            "head": query["head"],
+            "relation": query["relation"],
+            "predictions": [
+                {"entity": self.entity_ids[t], "score": float(s)}
+                for t, s in zip(top, top_scores)
+            ],
+        }
+
+    def prediction_rank_batch(self, queries: List[dict]) -> List[dict]:
+        """
+        Rank many tails per (head, relation), scoring each pair only once
+
+        Args:
+          queries: Dicts with head, relation and a list of tails
+
+        Returns:
+          List[dict]: Per query, the max score and the rank and score of each tail
+        """
+        results: List[Optional[dict]] = [None] * len(queries)
+        rows, heads, rels = [], [], []
+        for i, query in enumerate(queries):
+            head, relation, error = self._resolve(query)
+            if error:
+                results[i] = {"head": query.get("head"), "error": error}
+                continue
+            rows.append(i)
+            heads.append(head)
+            rels.append(relation)
+
+        if rows:
+            scores = self.score_tails(heads, rels)
+            max_scores = scores.max(axis=1)
+            for row, i in enumerate(rows):
+                query = queries[i]
+                ranks = []
+                known = [t for t in query["tails"] if str(t) in self.entity_index]
+                indices = np.array(
+                    [self.entity_index[str(t)] for t in known], dtype=np.int64
+                )
+                tail_scores = scores[row, indices]
+                # rank = 1 + number of entities scoring strictly higher
+                ordered = np.sort(scores[row])
+                higher = len(ordered) - np.searchsorted(ordered, tail_scores, "right")
+                tail_ranks = higher + 1
+                for tail, rank, score in zip(known, tail_ranks, tail_scores):
+                    ranks.append(
+                        {"tail": tail, "rank": int(rank), "score": float(score)}
+                    )
+                for tail in query["tails"]:
+                    if str(tail) not in self.entity_index:
+                        ranks.append(
+                            {"tail": tail, "error": f"Unknown tail entity: {tail}"}
+                        )
+                results[i] = {
+                    "head": query["head"],
+                    "relation": query["relation"],
+                    "max_score": float(max_scores[row]),
+                    "ranks": ranks,
+                }
+        return results
+
+    def predict_tail(self, head, relation, top_k_predictions=10) -> dict:
+        query = {
+            "head": head,
+            "relation": relation,
+            "top_k_predictions": top_k_predictions,
+        }
+        return self.predict_tail_batch([query])[0]
+
+    def get_prediction_rank(self, head, relation, tail) -> dict:
+        query = {"head": head, "relation": relation, "tails": [tail]}
+        result = self.prediction_rank_batch([query])[0]
+        if "error" in result:
+            return result
+        rank = result["ranks"][0]
+        return {
+            "head": head,
+            "relation": relation,
+            "max_score": result["max_score"],
+            **rank,
+        }
+
+
+def _as_complex(rows):
+    if np.iscomplexobj(rows):
+        return rows
+    half = rows.shape[1] // 2
+    return rows[:, :half] + 1j * rows[:, half:]
+
+
+def export_embeddings(
+    directory,
+    entity_ids,
+    entity_embeddings,
+    relations,
+    relation_embeddings,
+    model="TransE",
+    norm=1,
+):
+    """
+    Write embeddings in the layout EmbeddingScorer.load expects
+
+    For a trained PyKEEN model, pass the id lists from its triples factory and
+    model.entity_representations[0]() / model.relation_representations[0]()
+    converted to numpy.
+
+    Args:
+      directory: Output directory
+      entity_ids: Entity model_ids in embedding-row order
+      entity_embeddings: (n_entities, dim) array; complex arrays are stored as
+                         complex64
+      relations: Relation names in embedding-row order
+      relation_embeddings: (n_relations, dim) array
+      model: One of TransE, DistMult, ComplEx
+      norm: p of the TransE distance (1 or 2)
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if np.iscomplexobj(entity_embeddings):
+        entity_embeddings = np.asarray(entity_embeddings, dtype=np.complex64)
+    if np.iscomplexobj(relation_embeddings):
+        relation_embeddings = np.asarray(relation_embeddings, dtype=np.complex64)
+    np.save(directory / ENTITY_EMBEDDINGS, np.ascontiguousarray(entity_embeddings))
+    np.save(directory / RELATION_EMBEDDINGS, np.ascontiguousarray(relation_embeddings))
+    (directory / ENTITY_IDS).write_text(json.dumps([str(e) for e in entity_ids]))
+    (directory / RELATION_IDS).write_text(json.dumps(list(relations)))
+    (directory / META).write_text(json.dumps({"model": model, "norm": norm}))
+
+
+def get_local_scorer() -> Optional[EmbeddingScorer]:
+    """
+    Return the process-wide local scorer if EVOKG_LOCAL_KGE_DIR is set
+
+    EVOKG_ANN_DIR attaches a prebuilt IVF index and EVOKG_PREDICT_MODE=ann makes
+    predict_tail use it.
+
+    Returns:
+      Optional[EmbeddingScorer]: The shared scorer, or None to use the remote server
+    """
+    directory = os.environ.get("EVOKG_LOCAL_KGE_DIR")
+    if not directory:
+        return None
+
+    def load():
+        scorer = EmbeddingScorer.load(
+            directory,
+            model=os.environ.get("EVOKG_LOCAL_KGE_MODEL"),
+            mode=os.environ.get("EVOKG_PREDICT_MODE", "exact"),
+        )
+        ann_dir = os.environ.get("EVOKG_ANN_DIR")
+        if ann_dir:
+            scorer.ann = IvfIndex.load(ann_dir)
+        logging.info(
+            f"Loaded local {scorer.model} scorer from {directory} "
+            f"({len(scorer.entity_ids)} entities, "
+            f"{len(scorer.relations)} relations)"
+        )
+        return scorer
+
+    return REGISTRY.get("local_scorer", load)
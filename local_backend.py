@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+
+import httpx
+import numpy as np
+
+from kge_scorer import EmbeddingScorer
+
+
+class LocalKgBackend:
+    """
+    In-process stand-in for the EvoKG prediction and rank endpoints.
+
+    Wraps an EmbeddingScorer, so a whole predict_tail_batch or
+    prediction_rank_batch request is scored with one matrix product followed by a
+    row-wise argpartition. Mount it on the async client with
+    httpx.MockTransport(backend.handle) to exercise the agent's batch path without
+    the real server; `latency` adds a simulated network/queueing delay per HTTP
+    request.
+    """
+
+    def __init__(self, scorer: EmbeddingScorer, latency: float = 0.0):
+        self.scorer = scorer
+        self.latency = latency
+        self.requests = 0
+
+    @property
+    def entity_ids(self):
+        return self.scorer.entity_ids
+
+    @classmethod
+    def random(cls, n_entities, dim, relations, latency=0.0, seed=0, model="DistMult"):
+        """
+        Build a backend with random embeddings, for benchmarks
+
+        Args:
+          n_entities: Number of entities
+          dim: Embedding dimension
+          relations: Relation names
+          latency: Simulated per-request delay in seconds
+          seed: RNG seed
+          model: Scoring model for the random embeddings
+
+        Returns:
+          LocalKgBackend: The backend
+        """
+        rng = np.random.default_rng(seed)
+        entity_ids = [f"E{i}" for i in range(n_entities)]
+        entities = rng.standard_normal((n_entities, dim), dtype=np.float32)
+        rels = rng.standard_normal((len(relations), dim), dtype=np.float32)
+        scorer = EmbeddingScorer(model, entity_ids, entities, relations, rels)
+        return cls(scorer, latency=latency)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        """httpx.MockTransport handler routing requests to the local endpoints."""
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        endpoint = request.url.path.strip("/")
+        params = dict(request.url.params)
+        scorer = self.scorer
+        try:
+            if endpoint == "predict_tail":
+                body = scorer.predict_tail(
+                    params["head"],
+                    params["relation"],
+                    int(params.get("top_k_predictions", 10)),
+                )
+            elif endpoint == "predict_tail_batch":
+                queries = json.loads(request.content)["queries"]
+                body = {"results": scorer.predict_tail_batch(queries)}
+            elif endpoint == "get_prediction_rank":
+                body = scorer.get_prediction_rank(
+                    params["head"], params["relation"], params["tail"]
+                )
+            elif endpoint == "prediction_rank_batch":
+                queries = json.loads(request.content)["queries"]
+                body = {"results": scorer.prediction_rank_batch(queries)}
+            else:
+                return httpx.Response(
+                    404, json={"detail": f"Unknown endpoint {endpoint}"}
+                )
+        except (KeyError, ValueError) as e:
+            logging.error(f"Bad request to local backend {endpoint}: {str(e)}")
+            return httpx.Response(422, json={"detail": str(e)})
+        return httpx.Response(200, json=body)
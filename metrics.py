@@ -0,0 +1,442 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from resources import REGISTRY
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+# name -> (type, help, buckets); every metric recorded must be declared here
+METRICS = {
+    "evokg_tool_duration_seconds": (
+        "histogram",
+        "Latency of AI function calls, by tool",
+        LATENCY_BUCKETS,
+    ),
+    "evokg_tool_result_bytes": (
+        "histogram",
+        "Size of AI function results added to the LLM context, by tool",
+        BYTES_BUCKETS,
+    ),
+    "evokg_tool_result_tokens": (
+        "histogram",
+        "Estimated tokens of AI function results before and after encoding, by "
+        "tool and stage (raw, encoded)",
+        TOKEN_BUCKETS,
+    ),
+    "evokg_tool_result_tokens_saved_total": (
+        "counter",
+        "Estimated tokens removed from AI function results by encoding, by tool",
+        None,
+    ),
+    "evokg_tool_calls_total": (
+        "counter",
+        "AI function calls, by tool and status (ok, error)",
+        None,
+    ),
+    "evokg_kg_request_duration_seconds": (
+        "histogram",
+        "Latency of KG requests seen by the agent, by endpoint and source "
+        "(cache, remote, local, stream)",
+        LATENCY_BUCKETS,
+    ),
+    "evokg_kg_response_bytes": (
+        "histogram",
+        "Size of KG HTTP response bodies, by endpoint",
+        BYTES_BUCKETS,
+    ),
+    "evokg_kg_errors_total": ("counter", "Failed KG requests, by endpoint", None),
+    "evokg_kg_rejected_total": (
+        "counter",
+        "KG requests failed fast by the traffic layer, by endpoint and reason "
+        "(open, overloaded)",
+        None,
+    ),
+    "evokg_kg_hedged_total": (
+        "counter",
+        "Hedged KG requests, by endpoint and winner (primary, hedge)",
+        None,
+    ),
+    "evokg_kg_circuit_transitions_total": (
+        "counter",
+        "KG circuit breaker state changes, by replica, endpoint and new state",
+        None,
+    ),
+    "evokg_neo4j_batch_rows": (
+        "histogram",
+        "Lookups sent per UNWIND query by the Neo4j backend, by endpoint",
+        BATCH_BUCKETS,
+    ),
+    "evokg_prefetch_jobs_total": (
+        "counter",
+        "Speculative predict_tail calls, by status (queued, done, failed, "
+        "dropped, cancelled)",
+        None,
+    ),
+    "evokg_prefetch_lookups_total": (
+        "counter",
+        "predict_tail calls made by the model, by prefetch result (hit, "
+        "inflight, queued, miss)",
+        None,
+    ),
+    "evokg_answer_cache_lookups_total": (
+        "counter",
+        "Answer cache lookups of opening questions, by result (hit, miss)",
+        None,
+    ),
+    "evokg_answer_cache_llm_calls_saved_total": (
+        "counter",
+        "LLM completions replayed from the answer cache instead of requested",
+        None,
+    ),
+    "evokg_llm_duration_seconds": (
+        "histogram",
+        "Latency of LLM completions",
+        LATENCY_BUCKETS,
+    ),
+    "evokg_llm_tokens_total": (
+        "counter",
+        "LLM tokens used, by kind (prompt, completion)",
+        None,
+    ),
+    "evokg_turn_tokens": (
+        "histogram",
+        "LLM tokens used per chat turn, by kind (prompt, completion)",
+        TOKEN_BUCKETS,
+    ),
+    "evokg_context_tokens": (
+        "histogram",
+        "Estimated chat history tokens per LLM request, by stage (raw, compacted)",
+        TOKEN_BUCKETS,
+    ),
+    "evokg_context_tokens_saved_total": (
+        "counter",
+        "Estimated chat history tokens removed by context compaction",
+        None,
+    ),
+    "evokg_turn_duration_seconds": (
+        "histogram",
+        "Time per chat turn, by phase (total, llm, tools)",
+        LATENCY_BUCKETS,
+    ),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+
+def _labels_key(labels) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    Thread-safe, in-process store of counters and histograms.
+
+    Series are keyed by metric name and label set. render() produces the
+    Prometheus text exposition format; snapshot() the same data as plain rows
+    for the Streamlit admin page. Collectors add values owned by other
+    components (e.g. the response cache's hit/miss counters) at render time.
+    """
+
+    def __init__(self, metrics=METRICS):
+        self.metrics = dict(metrics)
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = {}
+        self._histograms: Dict[tuple, Histogram] = {}
+        self._collectors: List[Callable] = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(self.metrics[name][2])
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of the enclosed block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_collector(self, collector: Callable):
+        """
+        Register a callable returning (name, type, help, [(labels, value), ...])
+        tuples, evaluated on every render
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Render all series in the Prometheus text exposition format
+
+        Returns:
+          str: The exposition, one sample per line
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (list(h.counts), h.sum, h.count, h.buckets)
+                for key, h in self._histograms.items()
+            }
+            collectors = list(self._collectors)
+
+        lines = []
+        for name, (kind, help_text, _) in self.metrics.items():
+            if kind == "counter":
+                series = [(k, v) for (n, k), v in counters.items() if n == name]
+            else:
+                series = [(k, h) for (n, k), h in histograms.items() if n == name]
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(series):
+                if kind == "counter":
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+                    continue
+                counts, total, count, buckets = value
+                cumulative = 0
+                for bound, n in zip(list(buckets) + ["+Inf"], counts):
+                    cumulative += n
+                    le = _format_labels(key, [("le", bound)])
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+        for collector in collectors:
+            try:
+                collected = collector()
+            except Exception as e:
+                logging.warning(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, help_text, samples in collected:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(_labels_key(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """
+        Summarize every series for display
+
+        Returns:
+          dict: "counters" rows (name, labels, value) and "histograms" rows
+                (name, labels, count, sum, mean, p50, p95, p99)
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(key), "value": value}
+                for (name, key), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(key),
+                    "count": h.count,
+                    "sum": round(h.sum, 4),
+                    "mean": round(h.sum / h.count, 4) if h.count else None,
+                    **{
+                        f"p{round(q * 100)}": _round(h.quantile(q))
+                        for q in (0.5, 0.95, 0.99)
+                    },
+                }
+                for (name, key), h in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def cache_collector(cache):
+    """Collector exposing a kg_cache.ResponseCache's occupancy and hit/miss counts."""
+
+    def collect():
+        stats = cache.stats()
+        lookups = [
+            ({"endpoint": endpoint, "result": "hit"}, n)
+            for endpoint, n in stats["hits_by_endpoint"].items()
+        ] + [
+            ({"endpoint": endpoint, "result": "miss"}, n)
+            for endpoint, n in stats["misses_by_endpoint"].items()
+        ]
+        return [
+            (
+                "evokg_cache_lookups_total",
+                "counter",
+                "Response cache lookups, by endpoint and result (hit, miss)",
+                sorted(lookups, key=lambda s: sorted(s[0].items())),
+            ),
+            (
+                "evokg_cache_entries",
+                "gauge",
+                "Entries in the response cache",
+                [({}, stats["entries"])],
+            ),
+            (
+                "evokg_cache_bytes",
+                "gauge",
+                "Bytes held by the response cache",
+                [({}, stats["bytes"])],
+            ),
+            (
+                "evokg_cache_stale_total",
+                "counter",
+                "Expired responses served because the KG request failed",
+                [({}, stats["stale"])],
+            ),
+        ]
+
+    return collect
+
+
+def traffic_collector(traffic):
+    """Collector exposing a kg_traffic.TrafficController's limits and circuits."""
+
+    def collect():
+        stats = traffic.stats()["endpoints"]
+        samples = {"limit": [], "inflight": [], "open": []}
+        for key, endpoint_stats in sorted(stats.items()):
+            replica, endpoint = key.rsplit(" ", 1)
+            labels = {"replica": replica, "endpoint": endpoint}
+            samples["limit"].append((labels, endpoint_stats["limit"]))
+            samples["inflight"].append((labels, endpoint_stats["inflight"]))
+            is_open = endpoint_stats["circuit"] != "closed"
+            samples["open"].append((labels, int(is_open)))
+        return [
+            (
+                "evokg_kg_concurrency_limit",
+                "gauge",
+                "Adaptive in-flight limit, by replica and endpoint",
+                samples["limit"],
+            ),
+            (
+                "evokg_kg_inflight",
+                "gauge",
+                "KG requests in flight, by replica and endpoint",
+                samples["inflight"],
+            ),
+            (
+                "evokg_kg_circuit_open",
+                "gauge",
+                "1 while a circuit is open or half-open, by replica and endpoint",
+                samples["open"],
+            ),
+        ]
+
+    return collect
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: "MetricsRegistry" = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int, registry=None, host: str = "0.0.0.0"):
+    """
+    Serve GET /metrics for Prometheus from a daemon thread
+
+    Args:
+      port: TCP port to listen on
+      registry: Registry to expose (default: the process-wide one)
+      host: Interface to bind
+
+    Returns:
+      ThreadingHTTPServer: The running server
+    """
+    handler = type(
+        "MetricsHandler", (_MetricsHandler,), {"registry": registry or get_metrics()}
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-http", daemon=True
+    ).start()
+    logging.info(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Return the process-wide metrics registry, creating it on first use
+
+    Returns:
+      MetricsRegistry: The shared registry
+    """
+    return REGISTRY.get("metrics", MetricsRegistry)
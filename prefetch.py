@@ -0,0 +1,320 @@
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import weakref
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from metrics import get_metrics
+from relation_catalog import CATALOG
+from resources import REGISTRY
+
+
+@dataclass
+class PrefetchConfig:
+    """Size of the speculative predict_tail work done after an entity lookup."""
+
+    enabled: bool = True
+    # concurrent prefetches per event loop, shared by every session on it
+    workers: int = 2
+    # queued prefetches per event loop; more are dropped
+    max_queue: int = 64
+    # relations prefetched per resolved entity
+    relations: int = 3
+    # top_k_predictions of the prefetched calls (predict_tail's default)
+    top_k: int = 10
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a config from EVOKG_PREFETCH_* environment variables
+
+        Returns:
+          PrefetchConfig: The resolved configuration
+        """
+        return cls(
+            enabled=os.environ.get("EVOKG_PREFETCH", "1") != "0",
+            workers=int(os.environ.get("EVOKG_PREFETCH_WORKERS", 2)),
+            max_queue=int(os.environ.get("EVOKG_PREFETCH_MAX_QUEUE", 64)),
+            relations=int(os.environ.get("EVOKG_PREFETCH_RELATIONS", 3)),
+            top_k=int(os.environ.get("EVOKG_PREFETCH_TOP_K", 10)),
+        )
+
+
+def resolved_entity(term: str, response) -> Optional[dict]:
+    """
+    The entity a search_biological_entities response resolves a term to
+
+    Only an entity whose id or name equals the term (ignoring case), or the
+    single entity of an unambiguous response, counts as resolved.
+
+    Args:
+      term: The search term
+      response: The search result, a list of {"label", "entities"} groups
+
+    Returns:
+      Optional[dict]: The entity with its "label", or None
+    """
+    if not isinstance(response, list):
+        return None
+    key = " ".join(str(term).split()).lower()
+    candidates = [
+        dict(entity, label=group.get("label"))
+        for group in response
+        if isinstance(group, dict)
+        for entity in group.get("entities") or []
+        if isinstance(entity, dict)
+    ]
+    for entity in candidates:
+        names = (entity.get("id"), entity.get("name"))
+        if any(str(name).lower() == key for name in names if name is not None):
+            return entity
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def _discard_workers(workers):
+    # the tasks of a closed loop can never run again; close their coroutines here,
+    # where queue.get() failing to reach the closed loop can be ignored, rather
+    # than leave it to garbage collection, which reports it
+    for worker in workers:
+        worker._log_destroy_pending = False
+        try:
+            worker.get_coro().close()
+        except RuntimeError:
+            pass
+
+
+class _Job:
+    __slots__ = ("head", "relation", "fetch", "state")
+
+    def __init__(self, head, relation, fetch):
+        self.head = head
+        self.relation = relation
+        self.fetch = fetch
+        self.state = "queued"
+
+
+class Prefetcher:
+    """
+    Process-wide, bounded pool running speculative predict_tail calls.
+
+    After an entity lookup the follow-up guidelines have the model offer tail
+    predictions for the entity's relations, and users usually accept. Sessions
+    queue those predictions here (see PrefetchSession); a few workers per event
+    loop run them through the agent's api_call, so results land in the shared
+    response cache and the accepted call is a cache hit, or joins the in-flight
+    request. The queue is ordered by priority and bounded, and the pool is small,
+    so prefetching never takes more than `workers` backend connections. Relations
+    are chosen by how often users went on to predict with them. A loop's workers
+    are cancelled when it shuts down (asyncio.run cancels pending tasks), when
+    its state is replaced, or by close(); states of loops closed without a
+    shutdown are dropped.
+    """
+
+    def __init__(self, config: Optional[PrefetchConfig] = None, catalog=CATALOG):
+        self.config = config or PrefetchConfig.from_env()
+        self.catalog = catalog
+        self.metrics = get_metrics()
+        self._lock = threading.Lock()
+        self._loop_state = weakref.WeakKeyDictionary()
+        self._seq = itertools.count()
+        # relation -> predict_tail calls the model made with it
+        self.accepted = Counter()
+
+    def relations_for(self, entity_type) -> list:
+        """The relations to prefetch for an entity type, most accepted first."""
+        relations = self.catalog.relations_for(entity_type, "head")
+        with self._lock:
+            ranked = sorted(relations, key=lambda r: -self.accepted[r])
+        return ranked[: self.config.relations]
+
+    def _queue(self) -> asyncio.PriorityQueue:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # workers of loops closed without shutting down can never run or be
+            # cancelled; drop them with their state
+            for closed in [other for other in self._loop_state if other.is_closed()]:
+                _discard_workers(self._loop_state.pop(closed)["workers"])
+            state = self._loop_state.get(loop)
+            if state is not None and any(w.done() for w in state["workers"]):
+                # a worker died (e.g. cancelled by hand): start the pool afresh
+                for worker in state["workers"]:
+                    worker.cancel()
+                state = None
+            if state is None:
+                queue = asyncio.PriorityQueue(self.config.max_queue)
+                workers = [
+                    loop.create_task(self._work(queue))
+                    for _ in range(self.config.workers)
+                ]
+                state = {"queue": queue, "workers": workers}
+                self._loop_state[loop] = state
+            return state["queue"]
+
+    def submit(self, job: _Job, priority: int = 0) -> bool:
+        """Queue a job on the running loop; False if the queue is full."""
+        try:
+            self._queue().put_nowait((priority, next(self._seq), job))
+        except asyncio.QueueFull:
+            job.state = "dropped"
+            self.metrics.inc("evokg_prefetch_jobs_total", status="dropped")
+            return False
+        self.metrics.inc("evokg_prefetch_jobs_total", status="queued")
+        return True
+
+    async def _work(self, queue: asyncio.PriorityQueue):
+        try:
+            await self._run_jobs(queue)
+        except asyncio.CancelledError:
+            # the loop is shutting down or the pool was closed: forget its state,
+            # and stop the other workers, so neither the queue nor the loop
+            # outlives it
+            loop = asyncio.get_running_loop()
+            with self._lock:
+                state = self._loop_state.get(loop)
+                if state is not None and state["queue"] is queue:
+                    del self._loop_state[loop]
+                    for worker in state["workers"]:
+                        worker.cancel()
+            raise
+
+    async def _run_jobs(self, queue: asyncio.PriorityQueue):
+        while True:
+            _, _, job = await queue.get()
+            try:
+                if job.state != "queued":
+                    continue
+                job.state = "running"
+                await job.fetch()
+                job.state = "done"
+            except Exception as e:
+                job.state = "failed"
+                logging.warning(
+                    f"Prefetch of {job.relation} for {job.head} failed: {str(e)}"
+                )
+            finally:
+                if job.state in ("done", "failed"):
+                    self.metrics.inc("evokg_prefetch_jobs_total", status=job.state)
+                queue.task_done()
+
+    def close(self):
+        """Cancel the workers of every event loop, e.g. at process shutdown."""
+        with self._lock:
+            states = list(self._loop_state.items())
+            self._loop_state.clear()
+        for loop, state in states:
+            if loop.is_closed():
+                _discard_workers(state["workers"])
+                continue
+            for worker in state["workers"]:
+                if loop.is_running():
+                    loop.call_soon_threadsafe(worker.cancel)
+                else:
+                    worker.cancel()
+
+    def observe_lookup(self, relation, result):
+        with self._lock:
+            self.accepted[relation] += 1
+        self.metrics.inc("evokg_prefetch_lookups_total", result=result)
+
+    def stats(self) -> dict:
+        """
+        Report the pool's backlog and the relations users accept most
+
+        Returns:
+          dict: Queued jobs per event loop and the accepted relation counts
+        """
+        with self._lock:
+            return {
+                "queued": [s["queue"].qsize() for s in self._loop_state.values()],
+                "accepted": dict(self.accepted.most_common(10)),
+            }
+
+
+class PrefetchSession:
+    """
+    One agent's prefetches: what was queued for its last resolved entity.
+
+    Resolving a new entity means the conversation moved on, so the jobs still
+    queued for the previous one are cancelled; running jobs finish, since other
+    sessions may be waiting on the same in-flight request. lookup() classifies
+    each predict_tail the model actually makes (hit, inflight, queued, miss) for
+    the hit-rate metric, evokg_prefetch_lookups_total.
+    """
+
+    def __init__(self, prefetcher: Prefetcher):
+        self.prefetcher = prefetcher
+        self.jobs = {}  # (head, relation, top_k) -> _Job
+
+    def schedule(self, entity: dict, fetch: Callable):
+        """
+        Queue predict_tail for the relations about to be suggested for an entity
+
+        Args:
+          entity: The resolved entity, with "model_id" and "label"
+          fetch: Coroutine function (head, relation, top_k) calling predict_tail
+        """
+        head, label = entity.get("model_id"), entity.get("label")
+        if head is None or not label:
+            return
+        head = str(head)
+        top_k = self.prefetcher.config.top_k
+        relations = self.prefetcher.relations_for(label)
+        if all((head, r, top_k) in self.jobs for r in relations):
+            return
+        self.cancel()
+        for priority, relation in enumerate(relations):
+            job = _Job(
+                head,
+                relation,
+                lambda relation=relation: fetch(head, relation, top_k),
+            )
+            if self.prefetcher.submit(job, priority):
+                self.jobs[(head, relation, top_k)] = job
+
+    def cancel(self):
+        """Cancel this session's queued prefetches."""
+        for job in self.jobs.values():
+            if job.state == "queued":
+                job.state = "cancelled"
+                self.prefetcher.metrics.inc(
+                    "evokg_prefetch_jobs_total", status="cancelled"
+                )
+        self.jobs = {}
+
+    def lookup(self, head, relation, top_k) -> str:
+        """
+        Record a predict_tail made by the model against this session's prefetches
+
+        Returns:
+          str: "hit" (prefetched), "inflight" (joins the running prefetch),
+               "queued" (not started yet; the job is cancelled) or "miss"
+        """
+        job = self.jobs.get((str(head), relation, int(top_k)))
+        if job is None or job.state in ("failed", "dropped", "cancelled"):
+            result = "miss"
+        elif job.state == "done":
+            result = "hit"
+        elif job.state == "running":
+            result = "inflight"
+        else:
+            job.state = "cancelled"
+            result = "queued"
+        self.prefetcher.observe_lookup(relation, result)
+        return result
+
+
+def get_prefetcher() -> Optional[Prefetcher]:
+    """
+    Return the process-wide prefetcher, or None if EVOKG_PREFETCH=0
+
+    Returns:
+      Optional[Prefetcher]: The shared prefetcher
+    """
+    config = PrefetchConfig.from_env()
+    if not config.enabled:
+        return None
+    return REGISTRY.get("prefetcher", lambda: Prefetcher(config))
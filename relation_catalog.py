@@ -0,0 +1,264 @@
+import difflib
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Relation(NamedTuple):
+    name: str
+    head: str
+    tail: str
+
+
+ENTITY_TYPES = (
+    "Gene",
+    "Protein",
+    "Disease",
+    "ChemicalEntity",
+    "Phenotype",
+    "Tissue",
+    "Anatomy",
+    "BiologicalProcess",
+    "MolecularFunction",
+    "CellularComponent",
+    "Pathway",
+    "Mutation",
+)
+
+# every (relation, head type, tail type) in EvoKG; names are exactly as stored in
+# the graph and the KGE model, including the odd-cased Gene_BiologicalProcess
+RELATIONS = (
+    Relation("DISEASE_DISEASE", "Disease", "Disease"),
+    Relation("DISEASE_CHEMICALENTITY", "Disease", "ChemicalEntity"),
+    Relation("DISEASE_GENE", "Disease", "Gene"),
+    Relation("DISEASE_PHENOTYPE", "Disease", "Phenotype"),
+    Relation("DISEASE_PROTEIN", "Disease", "Protein"),
+    Relation("DISEASE_ANATOMY", "Disease", "Anatomy"),
+    Relation("CHEMICALENTITY_DISEASE", "ChemicalEntity", "Disease"),
+    Relation("CHEMICALENTITY_CHEMICALENTITY", "ChemicalEntity", "ChemicalEntity"),
+    Relation("CHEMICALENTITY_GENE", "ChemicalEntity", "Gene"),
+    Relation("CHEMICALENTITY_PROTEIN", "ChemicalEntity", "Protein"),
+    Relation("CHEMICALENTITY_PATHWAY", "ChemicalEntity", "Pathway"),
+    Relation("GENE_DISEASE", "Gene", "Disease"),
+    Relation("GENE_CHEMICALENTITY", "Gene", "ChemicalEntity"),
+    Relation("GENE_GENE", "Gene", "Gene"),
+    Relation("GENE_PHENOTYPE", "Gene", "Phenotype"),
+    Relation("GENE_PROTEIN", "Gene", "Protein"),
+    Relation("GENE_TISSUE", "Gene", "Tissue"),
+    Relation("GENE_ANATOMY", "Gene", "Anatomy"),
+    Relation("Gene_BiologicalProcess", "Gene", "BiologicalProcess"),
+    Relation("GENE_CELLULARCOMPONENT", "Gene", "CellularComponent"),
+    Relation("GENE_PATHWAY", "Gene", "Pathway"),
+    Relation("GENE_MOLECULARFUNCTION", "Gene", "MolecularFunction"),
+    Relation("PHENOTYPE_PHENOTYPE", "Phenotype", "Phenotype"),
+    Relation("PHENOTYPE_CHEMICALENTITY", "Phenotype", "ChemicalEntity"),
+    Relation("PHENOTYPE_GENE", "Phenotype", "Gene"),
+    Relation("PHENOTYPE_DISEASE", "Phenotype", "Disease"),
+    Relation("CELLULARCOMPONENT_CHEMICALENTITY", "CellularComponent", "ChemicalEntity"),
+    Relation("CELLULARCOMPONENT_GENE", "CellularComponent", "Gene"),
+    Relation(
+        "CELLULARCOMPONENT_CELLULARCOMPONENT", "CellularComponent", "CellularComponent"
+    ),
+    Relation(
+        "MOLECULARFUNCTION_MOLECULARFUNCTION", "MolecularFunction", "MolecularFunction"
+    ),
+    Relation("MOLECULARFUNCTION_CHEMICALENTITY", "MolecularFunction", "ChemicalEntity"),
+    Relation(
+        "MOLECULARFUNCTION_BIOLOGICALPROCESS", "MolecularFunction", "BiologicalProcess"
+    ),
+    Relation("PROTEIN_DISEASE", "Protein", "Disease"),
+    Relation("PROTEIN_CHEMICALENTITY", "Protein", "ChemicalEntity"),
+    Relation("PROTEIN_GENE", "Protein", "Gene"),
+    Relation("PROTEIN_PROTEIN", "Protein", "Protein"),
+    Relation("PROTEIN_TISSUE", "Protein", "Tissue"),
+    Relation("PROTEIN_PHENOTYPE", "Protein", "Phenotype"),
+    Relation("PROTEIN_MOLECULARFUNCTION", "Protein", "MolecularFunction"),
+    Relation("PROTEIN_PATHWAY", "Protein", "Pathway"),
+    Relation("PROTEIN_BIOLOGICALPROCESS", "Protein", "BiologicalProcess"),
+    Relation("BIOLOGICALPROCESS_CHEMICALENTITY", "BiologicalProcess", "ChemicalEntity"),
+    Relation("BIOLOGICALPROCESS_GENE", "BiologicalProcess", "Gene"),
+    Relation(
+        "BIOLOGICALPROCESS_BIOLOGICALPROCESS", "BiologicalProcess", "BiologicalProcess"
+    ),
+    Relation("ANATOMY_GENE", "Anatomy", "Gene"),
+    Relation("ANATOMY_ANATOMY", "Anatomy", "Anatomy"),
+    Relation("PATHWAY_GENE", "Pathway", "Gene"),
+    Relation("PATHWAY_PATHWAY", "Pathway", "Pathway"),
+    Relation("MUTATION_PROTEIN", "Mutation", "Protein"),
+)
+
+# entity labels that appear under a different spelling in prompts and dumps
+TYPE_ALIASES = {"CHEMICAL": "CHEMICALENTITY", "CELLULARCOMPONENTS": "CELLULARCOMPONENT"}
+
+
+def type_key(label: str) -> str:
+    """Normalize an entity label ("Chemical", "Biological Process") for matching."""
+    key = label.replace(" ", "").replace("_", "").upper()
+    return TYPE_ALIASES.get(key, key)
+
+
+class RelationCatalog:
+    """
+    In-memory (head_type, relation, tail_type) schema of EvoKG.
+
+    Used by the agent to validate relation names and entity types before any
+    backend I/O, and to produce corrective errors that list the valid choices.
+    """
+
+    def __init__(self, relations=RELATIONS, entity_types=ENTITY_TYPES):
+        self.relations: Dict[str, Relation] = {r.name: r for r in relations}
+        self.entity_types = tuple(entity_types)
+        self._types = {type_key(t): t for t in self.entity_types}
+        self._by_upper = {name.upper(): name for name in self.relations}
+
+    def canonical_type(self, label: str) -> Optional[str]:
+        """The catalog's spelling of an entity label, or None if unknown."""
+        return self._types.get(type_key(label)) if label else None
+
+    def graph_label(self, entity_type: str) -> str:
+        """
+        The label an entity type is stored under in EvoKG, sent to every backend
+
+        The REST service and the Neo4j backend both receive this spelling, so
+        aliases the model uses (TYPE_ALIASES, e.g. "Chemical" for ChemicalEntity,
+        and variants like "biological process") query the same nodes whichever
+        backend answers. Unknown types are returned unchanged for the backend to
+        reject.
+        """
+        return self.canonical_type(entity_type) or entity_type
+
+    def get(self, name: str) -> Optional[Relation]:
+        return self.relations.get(name)
+
+    def tail_type(self, name: str) -> Optional[str]:
+        relation = self.relations.get(name)
+        return relation.tail if relation else None
+
+    def relations_for(self, entity_type: str, direction: str = "head") -> List[str]:
+        """
+        Relation names that start (direction="head") or end (direction="tail")
+        at an entity type; direction="any" returns both
+
+        Args:
+          entity_type: Entity label, any spelling accepted by canonical_type
+          direction: "head", "tail" or "any"
+
+        Returns:
+          List[str]: Matching relation names in catalog order
+        """
+        entity_type = self.canonical_type(entity_type)
+        return [
+            r.name
+            for r in self.relations.values()
+            if (direction in ("head", "any") and r.head == entity_type)
+            or (direction in ("tail", "any") and r.tail == entity_type)
+        ]
+
+    def schema_lines(self) -> List[str]:
+        """
+        Compact schema for the system prompt: one line per head type listing the
+        relations that start at it (the tail type is the part after the first
+        underscore)
+        """
+        by_head = {}
+        for r in self.relations.values():
+            by_head.setdefault(r.head, []).append(r.name)
+        return [
+            f"{head}: {', '.join(by_head[head])}"
+            for head in self.entity_types
+            if head in by_head
+        ]
+
+    def describe(self, entity_type: str) -> dict:
+        """
+        Relations starting and ending at an entity type, with their other end
+
+        Args:
+          entity_type: Entity label, any spelling accepted by canonical_type
+
+        Returns:
+          dict: The canonical type and its outgoing and incoming relations
+        """
+        canonical = self.canonical_type(entity_type)
+        relations = self.relations.values()
+        return {
+            "entity_type": canonical,
+            "outgoing": [
+                {"relation": r.name, "tail": r.tail}
+                for r in relations
+                if r.head == canonical
+            ],
+            "incoming": [
+                {"relation": r.name, "head": r.head}
+                for r in relations
+                if r.tail == canonical
+            ],
+        }
+
+    def suggest(self, name: str, n: int = 3) -> List[str]:
+        """Closest valid relation names to a misspelled one."""
+        upper = str(name).upper()
+        if upper in self._by_upper:
+            return [self._by_upper[upper]]
+        matches = difflib.get_close_matches(
+            upper, list(self._by_upper), n=n, cutoff=0.6
+        )
+        return [self._by_upper[m] for m in matches]
+
+    def check_relation(self, name, head_type: Optional[str] = None) -> Optional[dict]:
+        """
+        Validate a relation name, and optionally that it starts at head_type
+
+        Args:
+          name: Relation name as given by the model
+          head_type: Type of the head entity, if known
+
+        Returns:
+          Optional[dict]: None when valid, otherwise an error with suggestions
+        """
+        relation = self.relations.get(name)
+        if relation is None:
+            return {
+                "error": f"Unknown relation '{name}'. Relation names are case-sensitive.",
+                "suggested_relations": self.suggest(name),
+            }
+        head = self.canonical_type(head_type) if head_type else None
+        if head and relation.head != head:
+            return {
+                "error": f"Relation '{name}' goes from {relation.head} to "
+                f"{relation.tail}, but the head entity is a {head}.",
+                "suggested_relations": self.relations_for(head),
+            }
+        return None
+
+    def check_entity_relation(self, entity_type, name=None) -> Optional[dict]:
+        """
+        Validate an entity type and, optionally, a relation touching it
+
+        Args:
+          entity_type: Entity label as given by the model
+          name: Relation name that must start or end at entity_type
+
+        Returns:
+          Optional[dict]: None when valid, otherwise an error with suggestions
+        """
+        canonical = self.canonical_type(entity_type)
+        if canonical is None:
+            return {
+                "error": f"Unknown entity type '{entity_type}'.",
+                "valid_entity_types": list(self.entity_types),
+            }
+        if not name:
+            return None
+        error = self.check_relation(name)
+        if error:
+            return error
+        relation = self.relations[name]
+        if canonical not in (relation.head, relation.tail):
+            return {
+                "error": f"Relation '{name}' connects {relation.head} and "
+                f"{relation.tail}, not {canonical}.",
+                "suggested_relations": self.relations_for(canonical, "any"),
+            }
+        return None
+
+
+CATALOG = RelationCatalog()
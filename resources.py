@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+_MISSING = object()
+
+
+class ResourceRegistry:
+    """
+    Process-wide registry of heavy objects shared by every agent and session.
+
+    HTTP pools, caches, local indexes and the system prompt are built once, on
+    first use, by the factory passed to get(), and returned to every later
+    caller, so an EvoKgAgent instance holds only its conversation state. Each
+    name has its own lock: concurrent first calls build a resource once, while a
+    slow load (e.g. an entity index) does not block unrelated ones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resources: Dict[str, Any] = {}
+        self._name_locks: Dict[str, threading.Lock] = {}
+        self._init_seconds: Dict[str, float] = {}
+
+    def get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return the resource registered under name, building it on first use
+
+        Args:
+          name: Registry key
+          factory: Called with no arguments to build the resource if missing
+
+        Returns:
+          The shared resource
+        """
+        resource = self._resources.get(name, _MISSING)
+        if resource is not _MISSING:
+            return resource
+        with self._lock:
+            name_lock = self._name_locks.setdefault(name, threading.Lock())
+        with name_lock:
+            resource = self._resources.get(name, _MISSING)
+            if resource is not _MISSING:
+                return resource
+            start = time.perf_counter()
+            resource = factory()
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._resources[name] = resource
+                self._init_seconds[name] = seconds
+            logging.info(f"Initialized shared resource {name} in {seconds:.3f} s")
+            return resource
+
+    def peek(self, name: str) -> Optional[Any]:
+        """The resource registered under name, or None if not built yet."""
+        return self._resources.get(name)
+
+    def set(self, name: str, resource: Any):
+        """Register a prebuilt resource, e.g. a stand-in for tests or benchmarks."""
+        with self._lock:
+            self._resources[name] = resource
+            self._init_seconds[name] = 0.0
+
+    def discard(self, name: str) -> Optional[Any]:
+        """
+        Forget a resource so the next get() rebuilds it
+
+        The old resource is closed first if it has a close() method (e.g. the
+        async KG client's per-loop connection pools).
+
+        Args:
+          name: Registry key
+
+        Returns:
+          The old resource, or None if none was registered
+        """
+        with self._lock:
+            self._init_seconds.pop(name, None)
+            resource = self._resources.pop(name, None)
+        close = getattr(resource, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logging.warning(f"Failed to close shared resource {name}: {str(e)}")
+        return resource
+
+    def stats(self) -> dict:
+        """
+        Describe the resources built so far
+
+        Returns:
+          dict: name -> type and initialization time in seconds
+        """
+        with self._lock:
+            return {
+                name: {
+                    "type": type(resource).__name__,
+                    "init_seconds": round(self._init_seconds.get(name, 0.0), 4),
+                }
+                for name, resource in sorted(self._resources.items())
+            }
+
+
+REGISTRY = ResourceRegistry()
@@ -0,0 +1,189 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from result_shaping import HandleStore
+
+# fields the system prompt forbids showing; the model reads model_ids from
+# search_biological_entities only, as the prompt tells it to
+STRIP_FIELDS = {"model_id"}
+KEEP_FIELDS = {"search_biological_entities": {"model_id"}}
+
+# estimated tokens of one tool result added to the LLM context; rows beyond the
+# budget are left behind a fetch_more cursor
+DEFAULT_BUDGETS = {
+    "search_biological_entities": 1500,
+    "get_nodes_by_label": 1500,
+    "get_sample_triples": 1500,
+    "get_subgraph": 3000,
+    "get_entity_relationships": 3000,
+    "fetch_more": 3000,
+    "find_paths": 2000,
+    "check_relationship": 500,
+    "predict_tail": 800,
+    "predict_tails": 4000,
+    "get_prediction_rank": 300,
+    "get_prediction_ranks": 3000,
+}
+
+# a list of dicts becomes a table when at least this share of its cells is set
+MIN_TABLE_FILL = 0.5
+
+
+@dataclass
+class EncodingConfig:
+    """Precision and per-tool token budgets of tool results sent to the LLM."""
+
+    enabled: bool = True
+    # decimal places kept for floats (scores)
+    score_digits: int = 4
+    budgets: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_BUDGETS))
+    default_budget: int = 2000
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a config from EVOKG_RESULT_* environment variables
+
+        EVOKG_RESULT_BUDGETS overrides single budgets, e.g.
+        "get_subgraph=4000,predict_tails=6000".
+
+        Returns:
+          EncodingConfig: The resolved configuration
+        """
+        budgets = dict(DEFAULT_BUDGETS)
+        for item in os.environ.get("EVOKG_RESULT_BUDGETS", "").split(","):
+            tool, _, tokens = item.partition("=")
+            if tool.strip() and tokens.strip():
+                budgets[tool.strip()] = int(tokens)
+        return cls(
+            enabled=os.environ.get("EVOKG_RESULT_ENCODING", "1") != "0",
+            score_digits=int(os.environ.get("EVOKG_SCORE_DIGITS", 4)),
+            budgets=budgets,
+            default_budget=int(os.environ.get("EVOKG_RESULT_BUDGET", 2000)),
+        )
+
+    def budget_for(self, tool) -> int:
+        return self.budgets.get(tool, self.default_budget)
+
+
+def estimate_tokens(value) -> int:
+    """Rough token count of a value as kani serializes it: characters / 4."""
+    return len(json.dumps(value)) // 4
+
+
+def is_table(value) -> bool:
+    return isinstance(value, dict) and "columns" in value and "rows" in value
+
+
+def _flat(item: dict) -> dict:
+    # nested dicts (e.g. related_entity) become "key.field" columns; elided values
+    # keep their {"preview", "length", "cursor"} form
+    flat = {}
+    for key, value in item.items():
+        if isinstance(value, dict) and value and "cursor" not in value:
+            for field_name, field_value in value.items():
+                flat[f"{key}.{field_name}"] = field_value
+        else:
+            flat[key] = value
+    return flat
+
+
+class ResultEncoder:
+    """
+    Compact form of a tool result for the LLM context.
+
+    kani adds every tool result to the chat history as JSON, resent with each
+    later request. Lists of dicts repeat their keys on every item, so they are
+    encoded as a table, {"columns": [...], "rows": [[...], ...]}, with nested
+    dicts flattened into "key.field" columns. Floats are rounded to
+    score_digits, and fields the system prompt forbids showing (STRIP_FIELDS)
+    are dropped except from the tools the model must read them from. If the
+    result is still over the tool's token budget, the largest table keeps its
+    first rows (results are ranked) and gets a next_cursor for fetch_more, so
+    the rest stays reachable. Error results are returned as they are.
+    """
+
+    def __init__(self, config: Optional[EncodingConfig] = None):
+        self.config = config or EncodingConfig.from_env()
+
+    def encode(self, tool: str, value, handles: HandleStore):
+        """
+        Encode the result of a tool call
+
+        Args:
+          tool: The AI function's name
+          value: The decoded result, as the function would return it
+          handles: The session's HandleStore, for rows cut by the budget
+
+        Returns:
+          The encoded result
+        """
+        if not self.config.enabled or (isinstance(value, dict) and "error" in value):
+            return value
+        strip = STRIP_FIELDS - KEEP_FIELDS.get(tool, set())
+        # id(table) -> (table, source list) of every table built, for the budget
+        tables = {}
+        encoded = self._encode(value, strip, tables)
+        return self._fit(encoded, self.config.budget_for(tool), tables, handles)
+
+    def _encode(self, value, strip, tables):
+        if isinstance(value, dict):
+            return {
+                k: self._encode(v, strip, tables)
+                for k, v in value.items()
+                if k not in strip
+            }
+        if isinstance(value, list):
+            table = self._table(value, strip, tables)
+            if table is not None:
+                return table
+            return [self._encode(v, strip, tables) for v in value]
+        if isinstance(value, float):
+            return round(value, self.config.score_digits)
+        return value
+
+    def _table(self, items, strip, tables) -> Optional[dict]:
+        if len(items) < 2 or not all(isinstance(i, dict) for i in items):
+            return None
+        flat = [_flat(i) for i in items]
+        columns = {}
+        for item in flat:
+            for key, value in item.items():
+                if isinstance(value, list):
+                    return None
+                if key.rsplit(".", 1)[-1] not in strip:
+                    columns.setdefault(key, None)
+        if not columns:
+            return None
+        cells = sum(1 for item in flat for key in item if key in columns)
+        if cells < MIN_TABLE_FILL * len(columns) * len(flat):
+            return None
+        table = {
+            "columns": list(columns),
+            "rows": [
+                [self._encode(item.get(c), strip, tables) for c in columns]
+                for item in flat
+            ],
+        }
+        tables[id(table)] = (table, items)
+        return table
+
+    def _fit(self, encoded, budget, tables, handles):
+        tokens = estimate_tokens(encoded)
+        if tokens <= budget or not tables:
+            return encoded
+        table, items = max(tables.values(), key=lambda t: estimate_tokens(t[0]))
+        rows = table["rows"]
+        excess = tokens - budget
+        kept, cut = len(rows), 0
+        while kept > 1 and cut < excess:
+            kept -= 1
+            cut += estimate_tokens(rows[kept]) + 1
+        if kept == len(rows):
+            return encoded
+        table["rows"] = rows[:kept]
+        table["total"] = len(rows)
+        table["next_cursor"] = f"{handles.put(items)}:{kept}"
+        return encoded
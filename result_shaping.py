@@ -0,0 +1,233 @@
+import itertools
+import threading
+from collections import Counter, OrderedDict
+from typing import Optional
+
+# page size of list results returned to the model, unless the tool call asks
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 200
+# characters of a large value returned per fetch_more page
+TEXT_PAGE_CHARS = 2000
+
+# properties the system prompt already treats as large (sequences, SMILES); they
+# are replaced by a cursor as soon as they exceed PREVIEW_CHARS, any other string
+# only past LARGE_VALUE_CHARS
+LARGE_FIELDS = {"sequence", "protein_sequence", "gene_sequence", "smiles"}
+LARGE_VALUE_CHARS = 1000
+PREVIEW_CHARS = 80
+
+# keys that may carry the relationship (or node) type of a list item
+TYPE_KEYS = ("relationship_type", "rel_type", "relationship", "relation", "type")
+
+
+class HandleStore:
+    """
+    Per-session store of the full values behind truncated tool results.
+
+    Long lists and large strings are kept here and referred to by cursors of the
+    form "h<id>:<offset>", which the fetch_more tool pages through without another
+    backend call. Bounded LRU: the oldest handles are dropped beyond max_entries.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def put(self, value) -> str:
+        with self._lock:
+            handle = f"h{next(self._ids)}"
+            self._values[handle] = value
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+            return handle
+
+    def get(self, handle):
+        with self._lock:
+            value = self._values.get(handle)
+            if value is not None:
+                self._values.move_to_end(handle)
+            return value
+
+    def page(self, cursor: str, limit: Optional[int] = None) -> dict:
+        """
+        The page of a stored list or string starting at a cursor
+
+        Args:
+          cursor: A cursor returned with a truncated result ("h<id>:<offset>")
+          limit: Items (lists) or characters (strings) to return
+
+        Returns:
+          dict: The page and the cursor of the next one, or an error
+        """
+        handle, _, offset = str(cursor).partition(":")
+        value = self.get(handle)
+        if value is None:
+            return {"error": f"Unknown or expired cursor '{cursor}'"}
+        try:
+            offset = min(max(int(offset or 0), 0), len(value))
+        except ValueError:
+            return {"error": f"Malformed cursor '{cursor}'"}
+
+        if isinstance(value, str):
+            limit = limit or TEXT_PAGE_CHARS
+            end = min(offset + limit, len(value))
+            page = {"text": value[offset:end], "offset": offset, "length": len(value)}
+        else:
+            limit = clamp_limit(limit)
+            end = min(offset + limit, len(value))
+            page = {
+                "items": [elide(item, self) for item in value[offset:end]],
+                "offset": offset,
+                "total": len(value),
+            }
+        page["next_cursor"] = f"{handle}:{end}" if end < len(value) else None
+        return page
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    return min(max(int(limit or DEFAULT_LIMIT), 1), MAX_LIMIT)
+
+
+def elide(value, store: HandleStore, key: Optional[str] = None):
+    """Replace large strings inside a value by a preview and a fetch_more cursor."""
+    if isinstance(value, dict):
+        return {k: elide(v, store, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [elide(v, store, key) for v in value]
+    if isinstance(value, str):
+        threshold = PREVIEW_CHARS if str(key).lower() in LARGE_FIELDS else None
+        if len(value) > (threshold or LARGE_VALUE_CHARS):
+            return {
+                "preview": value[:PREVIEW_CHARS],
+                "length": len(value),
+                "cursor": f"{store.put(value)}:0",
+            }
+    return value
+
+
+def relationship_type(item) -> Optional[str]:
+    if not isinstance(item, dict):
+        return None
+    for key in TYPE_KEYS:
+        value = item.get(key)
+        if isinstance(value, dict):
+            value = value.get("type") or value.get("name")
+        if isinstance(value, str):
+            return value
+    return None
+
+
+def shape_result(response, store: HandleStore, limit=None, offset: int = 0):
+    """
+    Page and summarize a backend response before it reaches the LLM context
+
+    Every list in the response is cut to `limit` items from `offset`; the full list
+    stays in the store and a next_cursor is returned for fetch_more. Each list gets
+    a summary with its total length and, where items carry one, counts per
+    relationship (or node) type. Large strings are replaced by a preview and a cursor.
+
+    Args:
+      response: The decoded JSON response
+      store: The session's HandleStore
+      limit: Items returned per list (default DEFAULT_LIMIT, at most MAX_LIMIT)
+      offset: Index of the first item returned
+
+    Returns:
+      dict: The shaped response, with a "summary" entry per list
+    """
+    if isinstance(response, list):
+        response = {"results": response}
+    if not isinstance(response, dict):
+        return response
+
+    limit = clamp_limit(limit)
+    offset = max(int(offset or 0), 0)
+    shaped, summary = {}, {}
+    for key, value in response.items():
+        if not isinstance(value, list):
+            shaped[key] = elide(value, store, key)
+            continue
+
+        start = min(offset, len(value))
+        end = min(start + limit, len(value))
+        shaped[key] = [elide(item, store) for item in value[start:end]]
+        entry = {"total": len(value), "offset": start, "returned": end - start}
+        if end < len(value):
+            entry["next_cursor"] = f"{store.put(value)}:{end}"
+        counts = Counter(filter(None, map(relationship_type, value)))
+        if counts:
+            entry["by_type"] = dict(counts.most_common())
+        summary[key] = entry
+
+    if summary:
+        shaped["summary"] = summary
+    return shaped
+
+
+async def shape_stream(events, store: HandleStore, limit=None, offset=0, max_items=0):
+    """
+    shape_result for a body parsed incrementally (json_stream events)
+
+    Only the requested page of each list is kept; the other elements are counted
+    and dropped as they are parsed. Reading stops once max_items list elements
+    have been seen, closing the stream early, so memory is bounded by the page
+    and the work by max_items whatever the size of the neighbourhood. Lists cut
+    off this way report how many elements were seen rather than a total, and the
+    next page is requested again with offset instead of a cursor.
+
+    Args:
+      events: Async iterator of ItemStream events, e.g. AsyncKgClient.stream_items
+      store: The session's HandleStore, for large strings
+      limit: Items returned per list (default DEFAULT_LIMIT, at most MAX_LIMIT)
+      offset: Index of the first item returned
+      max_items: List elements read before the stream is closed (0 for no limit)
+
+    Returns:
+      dict: The shaped response, with a "summary" entry per list
+    """
+    limit = clamp_limit(limit)
+    offset = max(int(offset or 0), 0)
+    shaped, seen, counts, complete = {}, {}, {}, set()
+    scanned = 0
+    try:
+        async for kind, key, value in events:
+            if kind == "value":
+                shaped[key] = elide(value, store, key)
+            elif kind == "end":
+                complete.add(key)
+                shaped.setdefault(key, [])
+                seen.setdefault(key, 0)
+            else:
+                index = seen.get(key, 0)
+                seen[key] = index + 1
+                page = shaped.setdefault(key, [])
+                if offset <= index < offset + limit:
+                    page.append(elide(value, store))
+                rel_type = relationship_type(value)
+                if rel_type:
+                    counts.setdefault(key, Counter())[rel_type] += 1
+                scanned += 1
+                if max_items and scanned >= max_items:
+                    break
+    finally:
+        await events.aclose()
+
+    summary = {}
+    for key, total in seen.items():
+        start = min(offset, total)
+        entry = {"offset": start, "returned": len(shaped[key])}
+        if key in complete:
+            entry["total"] = total
+        else:
+            entry["seen"] = total
+            entry["complete"] = False
+        if total > offset + limit or key not in complete:
+            entry["next_offset"] = offset + limit
+        if key in counts:
+            entry["by_type"] = dict(counts[key].most_common())
+        summary[key] = entry
+    if summary:
+        shaped["summary"] = summary
+    return shaped
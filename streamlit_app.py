@@ -3,8 +3,15 @@ import os
 import dotenv
 from kani.engines.openai import OpenAIEngine
 from agents import EvoKgAgent
+from kg_cache import get_response_cache
+from kg_client import get_async_client
+from kg_store import PersistentCache, load_warm_queries
+from metrics import cache_collector, get_metrics, serve_metrics, traffic_collector
+from resources import REGISTRY
+import asyncio
 import pathlib
 import logging
+import threading
 import streamlit as st
 
 dotenv.load_dotenv()
@@ -99,6 +106,56 @@ def render_evokg_intro():
             st.rerun()
 
 
+def render_metrics_page():
+    logger.info("Rendering Metrics page")
+
+    def rows(series):
+        return [
+            {
+                **row,
+                "labels": ", ".join(f"{k}={v}" for k, v in row["labels"].items()),
+            }
+            for row in series
+        ]
+
+    metrics = get_metrics()
+    snapshot = metrics.snapshot()
+    st.title("Metrics")
+    st.caption(
+        "Per-tool and per-endpoint latency (seconds), payload sizes (bytes) and LLM "
+        "token usage since this process started."
+    )
+    st.subheader("Latency and size histograms")
+    st.dataframe(rows(snapshot["histograms"]), use_container_width=True)
+    st.subheader("Counters")
+    st.dataframe(rows(snapshot["counters"]), use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Response cache")
+        st.json(get_response_cache().stats())
+    with col2:
+        st.subheader("KG connection pool")
+        st.json(get_async_client().pool_stats())
+
+    st.subheader("KG traffic (limits, circuits, replica latency)")
+    st.json(get_async_client().traffic.stats())
+
+    if REGISTRY.peek("prefetcher") is not None:
+        st.subheader("Follow-up prefetching")
+        st.json(REGISTRY.peek("prefetcher").stats())
+
+    if REGISTRY.peek("answer_cache") is not None:
+        st.subheader("Answer cache")
+        st.json(REGISTRY.peek("answer_cache").stats())
+
+    st.subheader("Shared resources")
+    st.json(REGISTRY.stats())
+
+    with st.expander("Prometheus exposition"):
+        st.code(metrics.render(), language="text")
+
+
 # Define custom pages dict with tuples of (page_name, render_function, icon)
 custom_pages = {
     "intro": ("Introduction", render_evokg_intro, "🏠"),
@@ -106,6 +163,9 @@ custom_pages = {
     # Chat page is handled separately by the framework
     "chat": ("Chatbot", None, "💬"),
 }
+# Operator-only metrics page, shown when EVOKG_ADMIN_PAGE=1
+if os.environ.get("EVOKG_ADMIN_PAGE") == "1":
+    custom_pages["metrics"] = ("Metrics", render_metrics_page, "📊")
 
 # initialize the application and set some page settings
 # parameters here are passed to streamlit.set_page_config,
@@ -134,12 +194,54 @@ engine = OpenAIEngine(os.environ["OPENAI_API_KEY"], model="gpt-4o-mini")
 # )
 
 
+# Metrics are recorded in-process; expose the response cache's counters too and,
+# when EVOKG_METRICS_PORT is set, serve GET /metrics for Prometheus.
+def init_metrics():
+    metrics = get_metrics()
+    metrics.add_collector(cache_collector(get_response_cache()))
+    metrics.add_collector(traffic_collector(get_async_client().traffic))
+    port = os.environ.get("EVOKG_METRICS_PORT")
+    if port:
+        serve_metrics(int(port), metrics)
+    return metrics
+
+
+REGISTRY.get("metrics_exporter", init_metrics)
+
+
+# Optional on-disk response cache, created once per process. Set EVOKG_CACHE_DIR to
+# enable it; popular queries listed in EVOKG_WARM_QUERIES are warmed in the background.
+def open_persistent_cache():
+    cache_dir = os.environ.get("EVOKG_CACHE_DIR")
+    if not cache_dir:
+        return None
+
+    store = PersistentCache(cache_dir)
+    cache = get_response_cache()
+    logger.info(f"Loaded {store.load_into(cache)} cached responses from {store.path}")
+
+    queries = load_warm_queries(
+        os.environ.get("EVOKG_WARM_QUERIES", str(current_dir / "warm_queries.json"))
+    )
+    if queries:
+        # the thread runs its own event loop; the async client's pool for it is
+        # closed when asyncio.run shuts the loop down
+        threading.Thread(
+            target=asyncio.run,
+            args=(store.prewarm(queries, cache, get_async_client()),),
+            name="kg-prewarm",
+            daemon=True,
+        ).start()
+    return store
+
+
 # We also have to define a function that returns a dictionary of agents to serve
 # Agents are keyed by their name, which is what the user will see in the UI
 def get_agents():
     return {
         "EvoLLM (4o-mini)": EvoKgAgent(
-            engine
+            engine,
+            persistent_cache=REGISTRY.get("persistent_cache", open_persistent_cache),
         ),  # prompt_tokens_cost = 0.005, completion_tokens_cost = 0.015),
         # "EvoLLM (Mistral)": EvoKgAgent(mistralEngine),
     }